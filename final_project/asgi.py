@@ -3,6 +3,10 @@ ASGI config for final_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site with an ASGI server (e.g. ``uvicorn final_project.asgi:application``)
+so the live message notifications of ``/messages/events/`` are streamed without
+holding a worker thread per connected user.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -14,3 +18,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'final_project.settings')
 
 application = get_asgi_application()
+
+from sell_it_app.bloom import build_bloom_filters  # noqa: E402
+
+build_bloom_filters()
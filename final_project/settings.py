@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,7 +44,9 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'sell_it_app.middleware.IdentityMapMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'sell_it_app.rate_limit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +87,56 @@ WSGI_APPLICATION = 'final_project.wsgi.application'
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# In-process LRU cache in front of a cache shared by all processes.
+# For production set SHARED_BACKEND to 'django.core.cache.backends.redis.RedisCache'
+# and LOCATION to the Redis server, e.g. 'redis://127.0.0.1:6379'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'sell_it_app.cache_backends.TwoTierCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'sell_it_cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'SHARED_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            # Sized for the pages, cards, objects and query results of the site, the
+            # default of 300 entries would be culled at random all the time.
+            'SHARED_OPTIONS': {'MAX_ENTRIES': 100000},
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'LOCK_TIMEOUT': 10,
+            'EARLY_REFRESH_BETA': 1.0,
+        },
+    },
+    # Version counters making the entries of the default cache valid, kept apart so they are
+    # never culled with the entries. In production use Redis with the noeviction policy.
+    'versions': {
+        'BACKEND': 'sell_it_app.cache_backends.TwoTierCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'sell_it_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'SHARED_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'SHARED_OPTIONS': {'MAX_ENTRIES': 10000000},
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    # Rate limit counters, kept apart so filling the default cache never evicts them. Entries
+    # never expire by default: the windows of the limits set their own timeout and the
+    # monitoring counters are kept. The file-based cache increments by reading and writing the
+    # count, so in production use Redis or Memcached, whose increments are atomic, with a
+    # maxmemory policy evicting only keys with a timeout (e.g. volatile-ttl) or none.
+    'rate_limit': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'sell_it_rate_limit'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -104,6 +157,10 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'sell_it_app.User'
 
+AUTHENTICATION_BACKENDS = [
+    'sell_it_app.auth_backends.CachedModelBackend',
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -128,6 +185,136 @@ LOGIN_URL = '/login/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Read messages older than MESSAGE_ARCHIVE_AFTER_DAYS are moved to the archive by the
+# archive_messages management command, in batches of MESSAGE_ARCHIVE_BATCH_SIZE messages
+# with a pause of MESSAGE_ARCHIVE_BATCH_PAUSE seconds between them.
+
+MESSAGE_ARCHIVE_AFTER_DAYS = 90
+MESSAGE_ARCHIVE_BATCH_SIZE = 500
+MESSAGE_ARCHIVE_BATCH_PAUSE = 0.5
+
+# Broker delivering live message notifications to the event streams of the users, shared by
+# all processes through PostgreSQL LISTEN/NOTIFY. The in-process broker
+# (sell_it_app.notifications.InProcessBroker) only works when the site runs as one process.
+
+NOTIFICATIONS_BROKER = 'sell_it_app.notifications.PostgresBroker'
+
+# Notifications are streamed as Server-Sent Events only when the site is served by ASGI (e.g.
+# uvicorn final_project.asgi:application), where an open stream doesn't hold a worker. Under
+# WSGI, pages poll the unread count every NOTIFICATIONS_POLL_INTERVAL seconds instead, each
+# poll answered at once, and no events are published.
+
+NOTIFICATIONS_STREAMING = False
+NOTIFICATIONS_POLL_INTERVAL = 30
+
+# Background jobs, run by the run_workers management command. Failed jobs are retried
+# up to JOBS_MAX_ATTEMPTS times, JOBS_RETRY_DELAY seconds after the first failure and
+# twice as long after every next one, up to JOBS_MAX_RETRY_DELAY seconds. A running job
+# holds a lease of JOBS_LEASE_DURATION seconds, renewed by its worker every
+# JOBS_HEARTBEAT_INTERVAL seconds. Jobs whose lease expired, e.g. as their worker was killed,
+# are considered lost and queued again, which counts as a failed attempt.
+
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_MAX_RETRY_DELAY = 60 * 60
+JOBS_LEASE_DURATION = 60
+JOBS_HEARTBEAT_INTERVAL = 20
+
+# Newsletter campaigns are sent in batches of NEWSLETTER_BATCH_SIZE emails over one SMTP
+# connection, at most NEWSLETTER_SEND_RATE emails per second. A sender holds the campaign
+# for NEWSLETTER_CAMPAIGN_LEASE seconds after each batch, so no other sender starts it meanwhile.
+
+NEWSLETTER_BATCH_SIZE = 100
+NEWSLETTER_SEND_RATE = 20
+NEWSLETTER_CAMPAIGN_LEASE = 60 * 5
+DEFAULT_FROM_EMAIL = 'Sell-It! <newsletter@sell-it.example>'
+
+# Bloom filters over usernames and newsletter emails let registrations and subscriptions
+# skip the existence query for values certainly not taken. Filters are sized for twice the
+# current number of values, at least BLOOM_FILTER_MIN_CAPACITY, and are built at startup.
+# With BLOOM_FILTER_SHARED they are built in shared memory, so worker processes forked by
+# the server (e.g. gunicorn --preload) share them and see each other's inserts; only the
+# process that built them rebuilds them.
+
+BLOOM_FILTER_MIN_CAPACITY = 100000
+BLOOM_FILTER_ERROR_RATE = 0.01
+BLOOM_FILTER_SHARED = False
+
+# Limits of submissions to expensive views, by URL name. Every limit is charged per 'ip', per
+# logged-in 'user' or per submitted 'username', and is given as (capacity, period): capacity
+# requests per sliding period of seconds. Limits are sliding window counters, not token
+# buckets, see take_token(). Requests over the limit get a 429 response, the
+# numbers of allowed and limited requests are shown by the rate_limit_stats management command.
+
+RATE_LIMITS = {
+    'login': {'ip': (20, 60), 'username': (5, 60)},
+    'register': {'ip': (5, 60 * 10)},
+    'contact': {'ip': (5, 60 * 10)},
+    'send-new-message': {'ip': (30, 60), 'user': (10, 60)},
+    'send-message': {'ip': (30, 60), 'user': (10, 60)},
+    'favourite-toggle': {'user': (60, 60)},
+}
+
+# Saved searches: maximum number of searches per user, and number of matches delivered
+# by one run of the deliver_saved_search_matches job.
+SAVED_SEARCHES_PER_USER = 20
+SAVED_SEARCH_NOTIFICATION_BATCH = 500
+
+# Price-drop alerts of favourited listings: number of alerts inserted, and of users whose
+# digest is delivered, per batch, and number of seconds drops are collected into one digest.
+PRICE_ALERT_BATCH_SIZE = 1000
+PRICE_ALERT_DIGEST_DELAY = 60 * 60
+
+# Search suggestions: file of the memory-mapped index, shared by all worker processes, number
+# of seconds between checks for a rebuilt file, and number of seconds changed listings are
+# collected before the file is rebuilt. Words shorter than SUGGEST_MIN_TERM_LENGTH aren't
+# suggested, a search counts SUGGEST_SEARCH_WEIGHT times a listing, and the SUGGEST_TOP_COUNT
+# best suggestions of every prefix of up to SUGGEST_PREFIX_LENGTH characters are precomputed.
+# Every process buffers the counts of searches and queues them to be saved once
+# SUGGEST_SEARCH_FLUSH_SIZE distinct queries are buffered or every SUGGEST_SEARCH_FLUSH_INTERVAL seconds.
+SUGGEST_INDEX_PATH = os.path.join(BASE_DIR, 'var', 'suggest.idx')
+SUGGEST_INDEX_REFRESH_INTERVAL = 5
+SUGGEST_INDEX_BUILD_DELAY = 60
+SUGGEST_MIN_TERM_LENGTH = 2
+SUGGEST_SEARCH_WEIGHT = 5
+SUGGEST_TOP_COUNT = 20
+SUGGEST_PREFIX_LENGTH = 3
+SUGGEST_MAX_RESULTS = 10
+SUGGEST_SEARCH_FLUSH_SIZE = 1000
+SUGGEST_SEARCH_FLUSH_INTERVAL = 60
+
+# Typo-tolerant search: lowest trigram similarity of a correction of a misspelled word, number
+# of corrections suggested, and number of seconds between reloads and maximum number of words
+# of the in-process trigram index, used where pg_trgm isn't installed.
+FUZZY_SEARCH_THRESHOLD = 0.25
+FUZZY_SEARCH_SUGGESTIONS = 3
+FUZZY_INDEX_REFRESH_INTERVAL = 5 * 60
+FUZZY_INDEX_MAX_TERMS = 200000
+
+# In-process columnar index of the active listings, serving the filters, counts and sorting
+# of the category pages from memory. Requires NumPy (pip install numpy). Changes of the
+# listings are logged to ListingChange only while the index is enabled. Every process
+# checks the ListingChange log for changes every LISTING_INDEX_REFRESH_INTERVAL seconds,
+# re-reading changes from the LISTING_INDEX_CHANGE_GRACE seconds before its last refresh.
+# The index is disabled above LISTING_INDEX_MAX_LISTINGS active listings, and built again
+# every LISTING_INDEX_RETRY_INTERVAL seconds until there are fewer listings. Run the
+# prune_listing_changes management command periodically to delete changes older than
+# LISTING_CHANGE_RETENTION seconds.
+
+LISTING_INDEX_ENABLED = False
+LISTING_INDEX_MAX_LISTINGS = 1000000
+LISTING_INDEX_REFRESH_INTERVAL = 5
+LISTING_INDEX_CHANGE_GRACE = 60
+LISTING_INDEX_RETRY_INTERVAL = 60 * 10
+LISTING_CHANGE_RETENTION = 60 * 60 * 24
+
+# Offline gazetteer locating addresses by postal code and city, in the format of the
+# GeoNames postal code dumps (https://download.geonames.org/export/zip/). The bundled file
+# only covers the largest Polish cities, replace it with a full dump, e.g. PL.txt, and run
+# the geocode_addresses management command.
+
+GAZETTEER_PATH = os.path.join(BASE_DIR, 'sell_it_app', 'data', 'gazetteer.tsv')
+
 try:
     from .local_settings import *
 except ImportError:
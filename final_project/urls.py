@@ -26,6 +26,10 @@ from sell_it_app.views import (IndexView,
                                SearchView,
                                MyListingsView,
                                MessagesView,
+                               ConversationView,
+                               MessagesBulkActionView,
+                               MessageEventsView,
+                               MessageUnreadCountView,
                                AddListingView,
                                SendMessageView,
                                ProfileView,
@@ -35,7 +39,10 @@ from sell_it_app.views import (IndexView,
                                MyAddressView,
                                PaymentsView,
                                FavouritesView,
+                               FavouriteToggleView,
                                SavedSearchesView,
+                               DeleteSavedSearchView,
+                               SearchSuggestView,
                                AboutUsView,
                                PublicProfileView,
                                MessageStatusUpdateView,
@@ -53,7 +60,9 @@ from sell_it_app.views import (IndexView,
                                CategoryView,
                                FaqView,
                                DeleteListingPicture,
-                               ListingGoogleMapsView)
+                               ListingGoogleMapsView,
+                               ListingsMapView,
+                               MapMarkersView)
 
 
 urlpatterns = [
@@ -70,8 +79,11 @@ urlpatterns = [
     path('update-profile/avatar/', UpdateProfileAvatarView.as_view(), name='update-profile-avatar'),  # OK
     path('public-profile/', PublicProfileView.as_view(), name='public-profile'),  # OK
     path('search/', SearchView.as_view(), name='search'),  # OK
+    path('search/suggest/', SearchSuggestView.as_view(), name='search-suggest'),
     path('listings/', MyListingsView.as_view(), name='listings'),  # OK
     path('listing/map/<int:listing_id>/', ListingGoogleMapsView.as_view(), name='google-maps'),  # OK
+    path('listings/map/', ListingsMapView.as_view(), name='listings-map'),
+    path('listings/map/markers/', MapMarkersView.as_view(), name='map-markers'),
     path('listing-details/<int:listing_id>/', ListingView.as_view(), name='listing-details'),  # OK
     path('add-listing/', AddListingView.as_view(), name='add-listing'),  # OK
     path('edit-listing/<int:listing_id>/', EditListingView.as_view(), name='edit-listing'),  # OK
@@ -80,6 +92,10 @@ urlpatterns = [
     path('listing/update-status/<int:listing_id>/', UpdateListingStatusView.as_view(), name='update-listing-status'),  # OK
     path('delete-listing/<int:listing_id>/', DeleteListingView.as_view(), name='delete-listing'),  # OK
     path('messages/', MessagesView.as_view(), name='messages'),  # OK
+    path('conversation/<int:thread_id>/', ConversationView.as_view(), name='conversation'),
+    path('messages/bulk/', MessagesBulkActionView.as_view(), name='messages-bulk'),
+    path('messages/events/', MessageEventsView.as_view(), name='message-events'),
+    path('messages/unread-count/', MessageUnreadCountView.as_view(), name='message-unread-count'),
     path('message/update-status/<int:message_id>/', MessageStatusUpdateView.as_view(), name='message-update-status'),  # OK
     path('message/delete/<int:message_id>/', MessageDeleteView.as_view(), name='message-delete'),  # OK
     path('send-message/<int:message_id>/', SendMessageView.as_view(), name='send-message'),  # OK
@@ -90,8 +106,10 @@ urlpatterns = [
     path('faq/', FaqView.as_view(), name='faq'),  # NOT NOW
     path('address/', MyAddressView.as_view(), name='address'),  # NOT NOW
     path('payments/', PaymentsView.as_view(), name='payments'),  # NOT NOW
-    path('favourites/', FavouritesView.as_view(), name='favourites'),  # NOT NOW
-    path('saved-searches/', SavedSearchesView.as_view(), name='saved-searches'),  # NOT NOW
+    path('favourites/', FavouritesView.as_view(), name='favourites'),
+    path('favourites/toggle/<int:listing_id>/', FavouriteToggleView.as_view(), name='favourite-toggle'),
+    path('saved-searches/', SavedSearchesView.as_view(), name='saved-searches'),
+    path('saved-searches/delete/<int:saved_search_id>/', DeleteSavedSearchView.as_view(), name='delete-saved-search'),
     path('newsletter/', NewsletterView.as_view(), name='newsletter'),  # OK
 ]
 
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'final_project.settings')
 
 application = get_wsgi_application()
+
+from sell_it_app.bloom import build_bloom_filters  # noqa: E402
+
+build_bloom_filters()
@@ -1,6 +1,20 @@
+import csv
+import datetime
+import io
+
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.db.models import Count, Q
+from django.utils import timezone
 
-from sell_it_app.models import User, Category, Address, Listings, Messages, Picture, Avatars, Newsletter
+from sell_it_app.models import User, Category, Address, Listings, Messages, Picture, Avatars, Newsletter, Thread, \
+    ArchivedMessage, Job, NewsletterCampaign, CategoryStats, Favourite, SavedSearch, \
+    ListingPrice
+from sell_it_app.subscribers import import_subscribers, iter_subscribers_csv
+from sell_it_app.tasks import send_newsletter_campaign, refresh_category_stats
 
 # Register your models here.
 admin.site.register(User)
@@ -8,6 +22,122 @@ admin.site.register(Category)
 admin.site.register(Address)
 admin.site.register(Listings)
 admin.site.register(Messages)
+admin.site.register(Thread)
+admin.site.register(ArchivedMessage)
 admin.site.register(Picture)
 admin.site.register(Avatars)
-admin.site.register(Newsletter)
\ No newline at end of file
+admin.site.register(Favourite)
+admin.site.register(SavedSearch)
+admin.site.register(ListingPrice)
+
+
+@admin.register(CategoryStats)
+class CategoryStatsAdmin(admin.ModelAdmin):
+    """
+    Admin page of the category statistics, which can be recomputed in the background.
+    """
+
+    list_display = ('category', 'active_count', 'new_count', 'used_count', 'min_price', 'median_price', 'max_price',
+                    'newest_add_date', 'updated_at')
+    actions = ('reconcile_stats',)
+
+    @admin.action(description='Recompute selected statistics')
+    def reconcile_stats(self, request, queryset):
+        for category_id in queryset.values_list('category_id', flat=True):
+            refresh_category_stats.enqueue(category_id, unique=True)
+        self.message_user(request, 'Statistics queued for recomputing.')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Admin monitoring page of the background jobs.
+
+    The job list shows the number of jobs by status and the number of due jobs waiting
+    for a worker for over a minute, failed jobs can be queued again.
+    """
+
+    list_display = ('id', 'task', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'started_at',
+                    'finished_at', 'worker')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'last_error')
+    ordering = ('-id',)
+    actions = ('retry_jobs',)
+
+    @admin.action(description='Queue selected jobs again')
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status='Running').update(status='Queued', attempts=0, run_at=timezone.now(),
+                                                          finished_at=None)
+        self.message_user(request, f'{count} job(s) queued again.')
+
+    def changelist_view(self, request, extra_context=None):
+        status_counts = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+        extra_context = {
+            **(extra_context or {}),
+            'status_counts': [(status, status_counts.get(status, 0)) for status, _ in Job.STATUS_CHOICES],
+            'overdue_count': Job.objects.filter(status='Queued',
+                                                run_at__lt=timezone.now() - datetime.timedelta(minutes=1)).count(),
+        }
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    """
+    Admin page of the newsletter campaigns, showing their progress.
+
+    Campaigns are sent by a background job, an interrupted campaign can be sent again to resume it
+    once the claim of its lost sender expired.
+    """
+
+    list_display = ('subject', 'status', 'sent_count', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    actions = ('send_campaigns',)
+
+    @admin.action(description='Send selected campaigns')
+    def send_campaigns(self, request, queryset):
+        campaigns = queryset.exclude(status='Sent').filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=timezone.now()))
+        for campaign in campaigns:
+            send_newsletter_campaign.enqueue(campaign.id, unique=True)
+        self.message_user(request, f'{len(campaigns)} campaign(s) queued for sending.')
+
+
+@admin.register(Newsletter)
+class NewsletterAdmin(admin.ModelAdmin):
+    """
+    Admin page of the newsletter subscribers, with CSV import and export.
+
+    Both stream the CSV, so files of millions of subscribers are handled in bounded memory.
+    """
+
+    list_display = ('id', 'email')
+    search_fields = ('email',)
+    actions = ('export_csv',)
+    change_list_template = 'admin/sell_it_app/newsletter/change_list.html'
+
+    @admin.action(description='Export selected subscribers as CSV')
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(iter_subscribers_csv(queryset), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="newsletter_subscribers.csv"'
+        return response
+
+    def get_urls(self):
+        urls = [
+            path('import-csv/', self.admin_site.admin_view(self.import_csv_view), name='sell_it_app_newsletter_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_csv_view(self, request):
+        if request.method == 'POST' and request.FILES.get('csv_file'):
+            file = io.TextIOWrapper(request.FILES['csv_file'].file, encoding='utf-8', newline='')
+            valid, skipped = import_subscribers(csv.reader(file))
+            self.message_user(request, f'Processed {valid} valid email(s), skipped {skipped} invalid row(s).')
+            return redirect('admin:sell_it_app_newsletter_changelist')
+
+        ctx = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import subscribers',
+        }
+        return TemplateResponse(request, 'admin/sell_it_app/newsletter/import_csv.html', ctx)
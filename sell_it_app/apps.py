@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SellItAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sell_it_app'
+
+    def ready(self):
+        import sell_it_app.signals  # noqa: F401
+        import sell_it_app.tasks  # noqa: F401
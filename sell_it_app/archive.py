@@ -0,0 +1,70 @@
+import datetime
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from sell_it_app.conversations import delete_messages
+from sell_it_app.models import Messages, ArchivedMessage
+
+ARCHIVED_FIELDS = ('from_user_id', 'from_unregistered_user', 'to_user_id', 'title', 'message', 'date_sent',
+                   'thread_id')
+
+
+def archive_messages_batch(date_sent, batch_size):
+    """
+    Moves one batch of read messages sent before the given date to the archive.
+
+    The batch is copied and deleted in one transaction, using the index on status and date sent.
+    Its rows are locked when they are read, so a message marked unread or deleted meanwhile is
+    either left out of the batch or waits for the batch to be archived; rows locked by another
+    transaction are skipped and archived by the next run.
+
+    Args:
+        date_sent (datetime.datetime): Messages sent before this date are archived.
+        batch_size (int): Maximum number of messages moved.
+
+    Returns:
+        int: The number of archived messages.
+    """
+
+    with transaction.atomic():
+        batch = list(
+            Messages.objects.filter(status='Read', date_sent__lt=date_sent)
+            .select_for_update(skip_locked=True)
+            .order_by('date_sent', 'id')
+            .values('id', *ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not batch:
+            return 0
+        ArchivedMessage.objects.bulk_create(
+            [ArchivedMessage(**{field: message[field] for field in ARCHIVED_FIELDS}) for message in batch]
+        )
+        delete_messages(Messages.objects.filter(id__in=[message['id'] for message in batch]))
+    return len(batch)
+
+
+def archive_messages(days, batch_size, pause=0):
+    """
+    Moves all read messages older than the given number of days to the archive, batch by batch.
+
+    Every batch is a short transaction, followed by a pause so the archiving does not
+    compete with the site for the database.
+
+    Args:
+        days (int): Age in days of the archived messages.
+        batch_size (int): Maximum number of messages moved in one batch.
+        pause (float): Pause in seconds between batches.
+
+    Returns:
+        int: The number of archived messages.
+    """
+
+    date_sent = timezone.now() - datetime.timedelta(days=days)
+    archived = 0
+    while True:
+        count = archive_messages_batch(date_sent, batch_size)
+        archived += count
+        if count < batch_size:
+            return archived
+        time.sleep(pause)
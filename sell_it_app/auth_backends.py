@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import ValidationError
+
+from sell_it_app.object_cache import get_cached_object
+
+UserModel = get_user_model()
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Authentication backend loading the user of every request from the object cache.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = get_cached_object(UserModel, user_id)
+        except (UserModel.DoesNotExist, ValidationError):
+            return None
+        return user if self.user_can_authenticate(user) else None
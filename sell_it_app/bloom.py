@@ -0,0 +1,152 @@
+import hashlib
+import math
+import mmap
+import os
+import threading
+
+from django.conf import settings
+
+from sell_it_app.models import User, Newsletter
+
+
+class BloomFilter:
+    """
+    Bloom filter, a set of strings answering membership with no false negatives and
+    a configurable rate of false positives, in a fixed size bit array.
+
+    Attributes:
+        capacity (int): Number of values the filter is sized for.
+        size (int): Number of bits of the filter.
+        hash_count (int): Number of bits set for every value.
+        count (int): Number of values added.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, shared=False):
+        """
+        Args:
+            capacity (int): Number of values the filter is sized for.
+            error_rate (float): Rate of false positives once the filter holds capacity values.
+            shared (bool): Whether the bits are kept in a shared memory mapping, so the filter
+                is shared by the processes forked after it is built.
+        """
+
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        size_bytes = (self.size + 7) // 8
+        self.bits = mmap.mmap(-1, size_bytes) if shared else bytearray(size_bytes)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + number * second) % self.size for number in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BloomIndex:
+    """
+    Bloom filter over a column of the database, telling which values are certainly missing from it.
+
+    The filter is built from the database at startup with build(), or on first use, and
+    values inserted afterwards are added with add(). A filter in shared memory is only rebuilt
+    by the process that built it: a worker forked from it keeps using the shared filter, as a
+    rebuild would replace it with a filter private to the worker. A value missing from the filter is not
+    in the database, other values may be and have to be checked with a query. The database
+    stays authoritative: the column is unique, so a value inserted by another process after
+    the filter was built can't be inserted twice.
+
+    Attributes:
+        values (callable): Function returning the values of the column.
+        normalize (callable): Function normalizing a value before it is looked up.
+    """
+
+    def __init__(self, values, normalize=str):
+        self.values = values
+        self.normalize = normalize
+        self._filter = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        """
+        Builds the filter from the values in the database, streamed with a server-side cursor.
+        """
+
+        values = self.values()
+        capacity = max(settings.BLOOM_FILTER_MIN_CAPACITY, values.count() * 2)
+        bloom_filter = BloomFilter(capacity, settings.BLOOM_FILTER_ERROR_RATE, settings.BLOOM_FILTER_SHARED)
+        for value in values.iterator(chunk_size=10000):
+            bloom_filter.add(self.normalize(value))
+        self._filter = bloom_filter
+        self._pid = os.getpid()
+
+    def _needs_build(self, bloom_filter):
+        if bloom_filter is None:
+            return True
+        # Shared filters are left to the process that built them, forked workers keep using them.
+        if isinstance(bloom_filter.bits, mmap.mmap) and self._pid != os.getpid():
+            return False
+        # Filters holding more values than they are sized for are rebuilt, as their false positives grow.
+        return bloom_filter.count > bloom_filter.capacity
+
+    def _get_filter(self):
+        bloom_filter = self._filter
+        if self._needs_build(bloom_filter):
+            with self._lock:
+                if self._filter is bloom_filter:
+                    self.build()
+            bloom_filter = self._filter
+        return bloom_filter
+
+    def might_contain(self, value):
+        """
+        Checks the filter for a value.
+
+        Args:
+            value (str): The value.
+
+        Returns:
+            bool: False if the value is certainly not in the database.
+        """
+
+        return self.normalize(value) in self._get_filter()
+
+    def add(self, value):
+        """
+        Adds an inserted value to the filter, if the filter is built.
+
+        Args:
+            value (str): The value.
+        """
+
+        if self._filter is not None:
+            self._filter.add(self.normalize(value))
+
+    def reset(self):
+        """
+        Drops the filter, it is built again on next use.
+        """
+
+        self._filter = None
+        self._pid = None
+
+
+USERNAMES = BloomIndex(lambda: User.objects.values_list('username', flat=True))
+NEWSLETTER_EMAILS = BloomIndex(lambda: Newsletter.objects.values_list('email', flat=True), Newsletter.normalize_email)
+
+
+def build_bloom_filters():
+    """
+    Builds all Bloom filters at startup, before the worker processes are forked.
+    """
+
+    USERNAMES.build()
+    NEWSLETTER_EMAILS.build()
@@ -0,0 +1,348 @@
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.utils.module_loading import import_string
+
+_MISSING = object()
+
+
+class ComputedValue:
+    """
+    Value stored by TwoTierCache with a timeout.
+
+    Keeps the time needed to compute the value, 0 for values which weren't computed by
+    get_or_set(), and its expiry time, which are used for the probabilistic early refresh of
+    hot keys and to keep the value in the local tier no longer than in the shared one.
+
+    Attributes:
+        value: The cached value.
+        delta (float): Number of seconds it took to compute the value.
+        expires (float): Unix time when the value expires, None if it never expires.
+    """
+
+    def __init__(self, value, delta, expires):
+        self.value = value
+        self.delta = delta
+        self.expires = expires
+
+    def should_refresh(self, beta):
+        """
+        Decides if the value should be computed again before it expires.
+
+        The probability of an early refresh grows as the expiry time gets closer
+        and with the time needed to compute the value (XFetch).
+
+        Args:
+            beta (float): Early refresh factor, 0 disables the early refresh.
+
+        Returns:
+            bool: True if the value should be computed again.
+        """
+
+        if self.expires is None or beta <= 0:
+            return False
+        return time.time() - self.delta * beta * math.log(1 - random.random()) >= self.expires
+
+    def remaining(self):
+        """
+        Returns the number of seconds until the value expires, None if it never expires.
+        """
+
+        return None if self.expires is None else max(self.expires - time.time(), 0)
+
+
+class LocalLRUCache:
+    """
+    Size-bounded, thread-safe, in-process LRU cache with per-entry timeouts.
+
+    Values are pickled, so callers never share mutable objects.
+
+    Attributes:
+        max_entries (int): Maximum number of entries, the least recently used entry is evicted first.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            pickled, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (pickled, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache(BaseCache):
+    """
+    Cache backend combining an in-process LRU cache with a shared cache backend.
+
+    Reads are served from the local tier and fall back to the shared tier. Writes go
+    to both tiers. Entries are kept in the local tier for at most LOCAL_TIMEOUT
+    seconds, so other processes see changes with that delay at most, and never beyond
+    their expiry: values with a timeout are stored as ComputedValue with their expiry
+    time, values without one are stored as they are, so the shared backend can increment them.
+
+    get_or_set() protects hot keys against cache stampedes: only one caller per
+    process (single-flight) and one process (lock key in the shared tier) computes
+    a missing value, while the others wait for it or keep serving the stale value.
+    Values are also refreshed early with a probability growing towards their expiry.
+
+    OPTIONS:
+        SHARED_BACKEND (str): Import path of the shared cache backend.
+        SHARED_OPTIONS (dict): OPTIONS passed to the shared cache backend.
+        LOCAL_MAX_ENTRIES (int): Maximum number of entries in the local tier.
+        LOCAL_TIMEOUT (int): Maximum number of seconds an entry is kept in the local tier.
+        LOCK_TIMEOUT (int): Number of seconds a computation may hold the lock of a key.
+        EARLY_REFRESH_BETA (float): Early refresh factor, 0 disables the early refresh.
+    """
+
+    def __init__(self, location, params):
+        params = params.copy()
+        options = params.pop('OPTIONS', {}).copy()
+        shared_backend = options.pop('SHARED_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+        shared_options = options.pop('SHARED_OPTIONS', {})
+        self.local_timeout = options.pop('LOCAL_TIMEOUT', 5)
+        self.lock_timeout = options.pop('LOCK_TIMEOUT', 10)
+        self.beta = options.pop('EARLY_REFRESH_BETA', 1.0)
+        local_max_entries = options.pop('LOCAL_MAX_ENTRIES', 1000)
+        super().__init__(params)
+
+        self.shared = import_string(shared_backend)(location, {**params, 'OPTIONS': shared_options})
+        self.local = LocalLRUCache(local_max_entries)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def _local_key(self, key, version):
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_timeout(self, timeout):
+        timeout = self._timeout(timeout)
+        return self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def _wrap(self, value, timeout):
+        """
+        Returns the entry stored for a value: a ComputedValue keeping its expiry time if it has
+        a timeout, otherwise the value itself.
+        """
+
+        seconds = self._timeout(timeout)
+        if seconds is None or isinstance(value, ComputedValue):
+            return value
+        return ComputedValue(value, 0, time.time() + seconds)
+
+    def _cache_locally(self, local_key, entry):
+        """
+        Keeps an entry read from the shared tier in the local tier, at most until it expires.
+        """
+
+        remaining = entry.remaining() if isinstance(entry, ComputedValue) else None
+        timeout = self.local_timeout if remaining is None else min(remaining, self.local_timeout)
+        self.local.set(local_key, entry, timeout)
+
+    def _get_entry(self, key, version=None):
+        local_key = self._local_key(key, version)
+        entry = self.local.get(local_key, _MISSING)
+        if entry is _MISSING:
+            entry = self.shared.get(key, _MISSING, version=version)
+            if entry is not _MISSING:
+                self._cache_locally(local_key, entry)
+        return entry
+
+    @staticmethod
+    def _unwrap(entry):
+        return entry.value if isinstance(entry, ComputedValue) else entry
+
+    def get(self, key, default=None, version=None):
+        entry = self._get_entry(key, version)
+        return default if entry is _MISSING else self._unwrap(entry)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry = self._wrap(value, timeout)
+        self.shared.set(key, entry, timeout, version=version)
+        self.local.set(self._local_key(key, version), entry, self._local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry = self._wrap(value, timeout)
+        if self.shared.add(key, entry, timeout, version=version):
+            self.local.set(self._local_key(key, version), entry, self._local_timeout(timeout))
+            return True
+        return False
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self._get_entry(key, version) is not _MISSING
+
+    def get_many(self, keys, version=None):
+        result = {}
+        missing = []
+        for key in keys:
+            entry = self.local.get(self._local_key(key, version), _MISSING)
+            if entry is _MISSING:
+                missing.append(key)
+            else:
+                result[key] = self._unwrap(entry)
+        if missing:
+            for key, entry in self.shared.get_many(missing, version=version).items():
+                self._cache_locally(self._local_key(key, version), entry)
+                result[key] = self._unwrap(entry)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        entries = {key: self._wrap(value, timeout) for key, value in data.items()}
+        failed_keys = self.shared.set_many(entries, timeout, version=version)
+        local_timeout = self._local_timeout(timeout)
+        for key, entry in entries.items():
+            if key not in failed_keys:
+                self.local.set(self._local_key(key, version), entry, local_timeout)
+        return failed_keys
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Increments a value, with the increment of the shared backend for values stored without
+        a timeout, otherwise by reading and writing it back with its remaining timeout.
+        """
+
+        entry = self.shared.get(key, _MISSING, version=version)
+        if isinstance(entry, ComputedValue):
+            entry = ComputedValue(entry.value + delta, entry.delta, entry.expires)
+            self.shared.set(key, entry, entry.remaining(), version=version)
+            self._cache_locally(self._local_key(key, version), entry)
+            return entry.value
+        value = self.shared.incr(key, delta, version=version)
+        self.local.set(self._local_key(key, version), value, self.local_timeout)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Returns the value of the key, computing and storing it once if it is missing.
+
+        A value of None returned by the default callable is not stored.
+
+        Args:
+            key (str): Cache key.
+            default: Value or callable returning the value to store.
+            timeout (int): Number of seconds the value is kept in the cache.
+            version (int): Cache key version.
+
+        Returns:
+            The cached or computed value.
+        """
+
+        entry = self._get_entry(key, version)
+        if entry is not _MISSING:
+            if not isinstance(entry, ComputedValue) or not entry.should_refresh(self.beta):
+                return self._unwrap(entry)
+
+        stale = None if entry is _MISSING else entry
+        local_key = self._local_key(key, version)
+        with self._flights_lock:
+            flight = self._flights.get(local_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[local_key] = threading.Event()
+
+        if not leader:
+            if stale is not None:
+                return stale.value
+            flight.wait(self.lock_timeout)
+            entry = self._get_entry(key, version)
+            if entry is not _MISSING:
+                return self._unwrap(entry)
+            return self._compute(key, default, timeout, version)
+
+        try:
+            lock_key = f'{key}:lock'
+            locked = self.shared.add(lock_key, 1, self.lock_timeout, version=version)
+            if not locked:
+                if stale is not None:
+                    return stale.value
+                entry = self._wait_for(key, version)
+                if entry is not _MISSING:
+                    return self._unwrap(entry)
+            try:
+                return self._compute(key, default, timeout, version)
+            finally:
+                # The lock of another process is left to expire, the process may still be computing.
+                if locked:
+                    self.shared.delete(lock_key, version=version)
+        finally:
+            with self._flights_lock:
+                del self._flights[local_key]
+            flight.set()
+
+    def _compute(self, key, default, timeout, version):
+        start = time.time()
+        value = default() if callable(default) else default
+        if value is None:
+            return None
+
+        seconds = self._timeout(timeout)
+        expires = None if seconds is None else time.time() + seconds
+        self.set(key, ComputedValue(value, time.time() - start, expires), timeout, version=version)
+        return value
+
+    def _wait_for(self, key, version):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            entry = self.shared.get(key, _MISSING, version=version)
+            if entry is not _MISSING:
+                self._cache_locally(self._local_key(key, version), entry)
+                return entry
+            time.sleep(0.05)
+        return _MISSING
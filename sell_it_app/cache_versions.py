@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import caches
+
+
+def versions_cache():
+    """
+    Returns the cache holding the version counters of cached entries, shared by all processes.
+
+    It is a dedicated cache, see the 'versions' alias of the CACHES setting, which never culls
+    its entries, so filling the default cache never evicts a counter.
+
+    Returns:
+        BaseCache: The cache backend.
+    """
+
+    return caches['versions']
+
+
+def initial_version():
+    """
+    Returns the first value of a new version counter, the current time in microseconds.
+
+    Should a counter still be lost, e.g. when the cache is flushed, it starts again above any
+    value it had before, so entries cached under an old version are never valid again.
+
+    Returns:
+        int: The initial version.
+    """
+
+    return time.time_ns() // 1000
+
+
+def get_versions(keys):
+    """
+    Returns the current values of version counters, starting the missing ones.
+
+    Args:
+        keys (list): Cache keys of the counters.
+
+    Returns:
+        dict: Versions by key.
+    """
+
+    versions = versions_cache()
+    values = versions.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    for key in missing:
+        versions.add(key, initial_version(), None)
+    if missing:
+        values.update(versions.get_many(missing))
+    return values
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump_version(key):
+    """
+    Moves a version counter to a new value, invalidating the entries cached under the previous one.
+
+    Args:
+        key (str): Cache key of the counter.
+    """
+
+    versions = versions_cache()
+    try:
+        versions.incr(key)
+    except ValueError:
+        versions.add(key, initial_version(), None)
@@ -0,0 +1,141 @@
+import datetime
+import itertools
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.db.models import F, Q
+from django.utils import timezone
+
+from sell_it_app.models import Newsletter, NewsletterCampaign
+
+
+def render_campaign(campaign):
+    """
+    Renders the content of a campaign, once for all subscribers.
+
+    Args:
+        campaign (NewsletterCampaign): The campaign.
+
+    Returns:
+        tuple: The text and the HTML content of the emails.
+    """
+
+    body = Template(campaign.body).render(Context({'campaign': campaign}))
+    html = render_to_string('sell_it_app/emails/newsletter_campaign.html', {'campaign': campaign, 'body': body})
+    return body, html
+
+
+def iter_subscriber_batches(last_subscriber_id, batch_size):
+    """
+    Yields batches of subscribers with IDs greater than last_subscriber_id, in the order of their IDs.
+
+    Subscribers are streamed with a server-side cursor, so only one batch is held in memory.
+
+    Args:
+        last_subscriber_id (int): ID of the last subscriber already sent to.
+        batch_size (int): Number of subscribers in a batch.
+
+    Yields:
+        list: Tuples of subscriber ID and email.
+    """
+
+    subscribers = (
+        Newsletter.objects.filter(id__gt=last_subscriber_id)
+        .order_by('id')
+        .values_list('id', 'email')
+        .iterator(chunk_size=batch_size)
+    )
+    while batch := list(itertools.islice(subscribers, batch_size)):
+        yield batch
+
+
+def claim_campaign(campaign_id):
+    """
+    Claims an unsent campaign for the current sender, unless another sender holds it.
+
+    The claim is made with one conditional UPDATE, so of concurrent senders only one wins. It
+    is a lease of NEWSLETTER_CAMPAIGN_LEASE seconds renewed after every batch, so the campaign
+    of a lost sender can be claimed again once its lease expired.
+
+    Args:
+        campaign_id (int): ID of the campaign.
+
+    Returns:
+        str: The claim token, None if the campaign is sent or held by another sender.
+    """
+
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    claimed = (
+        NewsletterCampaign.objects.filter(id=campaign_id, status__in=['Draft', 'Sending'])
+        .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+        .update(status='Sending', claim_token=token, lease_expires_at=lease_expiry())
+    )
+    if not claimed:
+        return None
+    NewsletterCampaign.objects.filter(id=campaign_id, started_at__isnull=True).update(started_at=now)
+    return token
+
+
+def lease_expiry():
+    return timezone.now() + datetime.timedelta(seconds=settings.NEWSLETTER_CAMPAIGN_LEASE)
+
+
+def send_campaign(campaign_id, batch_size=None, send_rate=None):
+    """
+    Sends a campaign to the subscribers it was not sent to yet.
+
+    Emails are sent in batches over one reused connection, throttled to send_rate emails
+    per second. The campaign is claimed first, see claim_campaign(), so it is never sent by
+    two senders at once. The progress is saved after every batch, only while the claim is
+    held, so calling it again after a crash resumes the campaign. A batch interrupted by a
+    crash may be sent again.
+
+    Args:
+        campaign_id (int): ID of the campaign.
+        batch_size (int): Number of emails in a batch, NEWSLETTER_BATCH_SIZE by default.
+        send_rate (float): Maximum number of emails per second, NEWSLETTER_SEND_RATE by default.
+
+    Returns:
+        int: The number of emails sent, 0 if the campaign is sent or being sent by another sender.
+    """
+
+    batch_size = batch_size or settings.NEWSLETTER_BATCH_SIZE
+    send_rate = send_rate or settings.NEWSLETTER_SEND_RATE
+    token = claim_campaign(campaign_id)
+    if token is None:
+        return 0
+    claimed = NewsletterCampaign.objects.filter(id=campaign_id, claim_token=token)
+    campaign = claimed.get()
+
+    body, html = render_campaign(campaign)
+    started = time.monotonic()
+    sent = 0
+    try:
+        with get_connection() as connection:
+            for batch in iter_subscriber_batches(campaign.last_subscriber_id, batch_size):
+                emails = []
+                for subscriber_id, email in batch:
+                    message = EmailMultiAlternatives(campaign.subject, body, to=[email], connection=connection)
+                    message.attach_alternative(html, 'text/html')
+                    emails.append(message)
+                connection.send_messages(emails)
+
+                sent += len(batch)
+                if not claimed.update(last_subscriber_id=batch[-1][0], sent_count=F('sent_count') + len(batch),
+                                      lease_expires_at=lease_expiry()):
+                    # The lease expired and another sender claimed the campaign, it goes on from here.
+                    return sent
+
+                delay = sent / send_rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+        claimed.update(status='Sent', finished_at=timezone.now())
+    finally:
+        claimed.update(claim_token='', lease_expires_at=None)
+    return sent
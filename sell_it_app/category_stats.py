@@ -0,0 +1,185 @@
+from decimal import Decimal
+
+from django.db.models import Aggregate, Count, DateTimeField, DecimalField, F, Max, Min, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from sell_it_app.models import Category, CategoryStats, Listings
+
+
+class Median(Aggregate):
+    """
+    Median of a price column, computed with PERCENTILE_CONT (PostgreSQL).
+    """
+
+    function = 'PERCENTILE_CONT'
+    name = 'Median'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)::numeric(10, 2)'
+    output_field = DecimalField(max_digits=10, decimal_places=2)
+
+
+# Fields of a listing its contribution to the statistics depends on.
+CONTRIBUTION_FIELDS = ('category_id_id', 'status', 'condition', 'price', 'add_date')
+
+
+def listing_contribution(listing):
+    """
+    Returns what a listing adds to the statistics of its category.
+
+    Args:
+        listing (Listings | dict): The listing, or its values.
+
+    Returns:
+        tuple: The category ID, condition, price and add date of an active listing, None for inactive listings.
+    """
+
+    if not isinstance(listing, dict):
+        listing = {field: getattr(listing, field) for field in CONTRIBUTION_FIELDS}
+    if listing['status'] != 'Active':
+        return None
+    return listing['category_id_id'], listing['condition'], Decimal(str(listing['price'])), listing['add_date']
+
+
+def stats_queryset():
+    """
+    Returns the statistics of the active listings, grouped by category.
+
+    Returns:
+        QuerySet: Dicts with the category ID and its statistics.
+    """
+
+    return (
+        Listings.objects.filter(status='Active')
+        .order_by()
+        .values('category_id')
+        .annotate(
+            active_count=Count('id'),
+            new_count=Count('id', filter=Q(condition='New')),
+            used_count=Count('id', filter=Q(condition='Used')),
+            newest_add_date=Max('add_date'),
+            min_price=Min('price'),
+            max_price=Max('price'),
+            median_price=Median('price'),
+        )
+    )
+
+
+def reconcile_category_stats(category_ids=None):
+    """
+    Recomputes the statistics of categories from their listings, with one grouped query.
+
+    Fixes any drift of the incrementally maintained statistics, e.g. after listings were
+    changed without signals (bulk updates, raw SQL), and refreshes the median prices.
+
+    Args:
+        category_ids (Iterable[int]): IDs of the categories, all categories by default.
+
+    Returns:
+        int: The number of updated categories.
+    """
+
+    categories = Category.objects.all()
+    rows = stats_queryset()
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+        rows = rows.filter(category_id__in=category_ids)
+    rows = {row.pop('category_id'): row for row in rows}
+
+    now = timezone.now()
+    stats = [CategoryStats(category_id=category_id, updated_at=now, **rows.get(category_id, {}))
+             for category_id in categories.values_list('id', flat=True)]
+    CategoryStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=['active_count', 'new_count', 'used_count', 'newest_add_date', 'min_price', 'max_price',
+                       'median_price', 'updated_at'],
+    )
+    return len(stats)
+
+
+def add_contribution(contribution):
+    """
+    Adds an active listing to the statistics of its category, with one UPDATE.
+
+    Args:
+        contribution (tuple): See listing_contribution().
+    """
+
+    category_id, condition, price, add_date = contribution
+    price = Value(price, output_field=DecimalField(max_digits=10, decimal_places=2))
+    add_date = Value(add_date, output_field=DateTimeField())
+    updated = CategoryStats.objects.filter(category_id=category_id).update(
+        active_count=F('active_count') + 1,
+        new_count=F('new_count') + int(condition == 'New'),
+        used_count=F('used_count') + int(condition == 'Used'),
+        newest_add_date=Greatest(Coalesce('newest_add_date', add_date), add_date),
+        min_price=Least(Coalesce('min_price', price), price),
+        max_price=Greatest(Coalesce('max_price', price), price),
+    )
+    if not updated:
+        reconcile_category_stats([category_id])
+
+
+def remove_contribution(contribution):
+    """
+    Removes an active listing from the statistics of its category.
+
+    Counts are decremented with one UPDATE. If the listing held one of the extremes, the
+    statistics of the category are recomputed from the listings in the database instead,
+    so the listing must already be changed or deleted.
+
+    Args:
+        contribution (tuple): See listing_contribution().
+
+    Returns:
+        bool: True if the statistics were recomputed.
+    """
+
+    category_id, condition, price, add_date = contribution
+    held_extreme = Q(newest_add_date__lte=add_date) | Q(min_price__gte=price) | Q(max_price__lte=price)
+    stats = CategoryStats.objects.filter(category_id=category_id)
+    if stats.filter(held_extreme).exists():
+        reconcile_category_stats([category_id])
+        return True
+    stats.update(
+        active_count=F('active_count') - 1,
+        new_count=F('new_count') - int(condition == 'New'),
+        used_count=F('used_count') - int(condition == 'Used'),
+    )
+    return False
+
+
+def apply_listing_change(previous, current):
+    """
+    Updates the statistics of the categories after a listing was created, edited or deleted.
+
+    Must be called once the change is saved, e.g. from post_save and post_delete receivers.
+
+    Args:
+        previous (tuple): Contribution of the listing before the change, see listing_contribution().
+        current (tuple): Contribution of the listing after the change.
+
+    Returns:
+        set: IDs of the categories whose median price is stale.
+    """
+
+    if previous == current:
+        return set()
+    recomputed = set()
+    if previous is not None and remove_contribution(previous):
+        recomputed.add(previous[0])
+    if current is not None and current[0] not in recomputed:
+        add_contribution(current)
+    return {contribution[0] for contribution in (previous, current) if contribution is not None} - recomputed
+
+
+def get_category_stats():
+    """
+    Returns the statistics of all categories, for navigation.
+
+    Returns:
+        dict: CategoryStats by category ID.
+    """
+
+    return {stats.category_id: stats for stats in CategoryStats.objects.all()}
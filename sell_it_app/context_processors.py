@@ -1,3 +1,5 @@
+from django.conf import settings
+
 from sell_it_app.models import Messages, Newsletter
 
 
@@ -10,6 +12,8 @@ def unread_messages(request):
 
         ctx = {
             'user_unread_messages': user_unread_messages,
+            'notifications_streaming': settings.NOTIFICATIONS_STREAMING,
+            'notifications_poll_interval': settings.NOTIFICATIONS_POLL_INTERVAL,
         }
         return ctx
     return ctx
@@ -0,0 +1,146 @@
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from sell_it_app.models import Thread, ThreadParticipant, Messages
+from sell_it_app.notifications import publish_unread_counts
+
+
+def find_listing_thread(listing, *users):
+    """
+    Returns the conversation about a listing between the given users.
+
+    Args:
+        listing (Listings): The listing the conversation is about.
+        *users (User): Participants of the conversation.
+
+    Returns:
+        Thread: The latest matching conversation, or None if there is none.
+    """
+
+    threads = Thread.objects.filter(listing=listing)
+    for user in users:
+        threads = threads.filter(participants__user=user)
+    return threads.order_by('-id').first()
+
+
+def search_messages(user, query):
+    """
+    Returns the messages sent or received by a user matching a full-text search query.
+
+    The search vector is the expression of the GIN index of the Messages table. The received
+    and the sent messages are searched in two branches of a UNION, each combining the GIN index
+    with the index of its user column, so only the matching messages of the user are read
+    rather than the matches of all mailboxes.
+
+    Args:
+        user (User): Owner of the mailbox.
+        query (str): Search query, supporting quoted phrases, "or" and "-" to exclude words.
+
+    Returns:
+        QuerySet: The matching messages, latest first.
+    """
+
+    matching = (
+        Messages.objects.alias(search=SearchVector('title', 'message', config='simple'))
+        .filter(search=SearchQuery(query, config='simple', search_type='websearch'))
+        .select_related('from_user')
+        .order_by()
+    )
+    return matching.filter(to_user=user).union(matching.filter(from_user=user)).order_by('-date_sent')
+
+
+def add_thread_participants(message):
+    """
+    Adds the sender and the recipient of a message to its conversation.
+
+    Args:
+        message (Messages): The message.
+    """
+
+    user_ids = {message.from_user_id, message.to_user_id} - {None}
+    ThreadParticipant.objects.bulk_create(
+        [ThreadParticipant(thread_id=message.thread_id, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_thread_pointers(thread_ids):
+    """
+    Updates the last message and the unread counts of conversations.
+
+    Each pointer is updated with a single UPDATE reading the messages of the conversations
+    through the thread index, whatever the number of conversations. Conversations left
+    without messages are deleted.
+
+    Args:
+        thread_ids (Iterable[int] | QuerySet): IDs of the conversations.
+    """
+
+    latest_messages = Messages.objects.order_by('-date_sent', '-id')
+    unread_messages = (
+        Messages.objects.filter(thread_id=OuterRef('thread_id'), to_user_id=OuterRef('user_id'), status='Unread')
+        .values('to_user_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    ThreadParticipant.objects.filter(thread_id__in=thread_ids).update(
+        last_message_date=Subquery(latest_messages.filter(thread_id=OuterRef('thread_id')).values('date_sent')[:1]),
+        unread_count=Coalesce(Subquery(unread_messages), 0),
+    )
+    Thread.objects.filter(id__in=thread_ids).update(
+        last_message_id=Subquery(latest_messages.filter(thread_id=OuterRef('id')).values('id')[:1]),
+    )
+    Thread.objects.filter(id__in=thread_ids, last_message__isnull=True).delete()
+
+
+def set_messages_status(messages, status):
+    """
+    Sets the status of messages with a single UPDATE and refreshes the unread counts of their conversations.
+
+    Args:
+        messages (QuerySet): The messages to update, already limited to the messages the user may change.
+        status (str): The new status, 'Read' or 'Unread'.
+
+    Returns:
+        int: The number of updated messages.
+    """
+
+    messages = messages.exclude(status=status)
+    threads = list(messages.values_list('thread_id', 'to_user_id').distinct())
+    updated = messages.update(status=status)
+    if updated:
+        refresh_thread_pointers({thread_id for thread_id, _ in threads})
+        publish_unread_counts(user_id for _, user_id in threads)
+    return updated
+
+
+def delete_messages(messages):
+    """
+    Deletes messages with a single DELETE and refreshes the pointers of their conversations.
+
+    The messages are not loaded, so no delete signals are sent for them: the DELETE is run in
+    SQL with the query selecting them as a subquery, after the conversations pointing to them
+    as their last message are detached, the only rows referencing messages.
+
+    Args:
+        messages (QuerySet): The messages to delete, already limited to the messages the user may delete.
+
+    Returns:
+        int: The number of deleted messages.
+    """
+
+    threads = list(messages.values_list('thread_id', 'to_user_id').distinct())
+    if not threads:
+        return 0
+    Thread.objects.filter(last_message__in=messages).update(last_message=None)
+    connection = connections[messages.db]
+    query, params = messages.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {connection.ops.quote_name(Messages._meta.db_table)} WHERE id IN ({query})',
+                       params)
+        deleted = cursor.rowcount
+    refresh_thread_pointers({thread_id for thread_id, _ in threads})
+    publish_unread_counts(user_id for _, user_id in threads)
+    return deleted
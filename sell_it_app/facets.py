@@ -0,0 +1,230 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.http import QueryDict
+
+from sell_it_app.geo import filter_near, get_search_point
+from sell_it_app.models import Listings
+
+# Price ranges of the price facet, as (value, lower bound, upper bound), bounds are inclusive/exclusive.
+PRICE_RANGES = (
+    ('0-100', 0, 100),
+    ('100-500', 100, 500),
+    ('500-1000', 500, 1000),
+    ('1000-5000', 1000, 5000),
+    ('5000-20000', 5000, 20000),
+    ('20000+', 20000, None),
+)
+
+# Facets by query parameter, as (label, grouped column, choices). Facets without choices take
+# their values from the listings, ordered by count.
+FACETS = {
+    'condition': ('Condition', 'condition', Listings.CONDITION_CHOICES),
+    'offer_type': ('Offer type', 'offer_type', Listings.OFFER_CHOICES),
+    'promotion': ('Promotion', 'promotion', Listings.PROMOTION_CHOICES),
+    'city': ('City', 'city', None),
+    'price': ('Price', 'price_range', tuple((value, value) for value, _, _ in PRICE_RANGES)),
+}
+
+# Query parameters of the faceted browse, used in the page cache key.
+FACET_PARAMS = tuple(FACETS) + ('min_price', 'max_price', 'near', 'lat', 'lon', 'radius')
+
+# Maximum number of values shown for facets without choices.
+MAX_FACET_VALUES = 20
+
+
+def price_range_case():
+    """
+    Returns an expression putting the price of a listing in one of the PRICE_RANGES.
+
+    Returns:
+        Case: Expression evaluating to the value of the price range.
+    """
+
+    whens = []
+    for value, lower, upper in PRICE_RANGES:
+        condition = Q(price__gte=lower) if upper is None else Q(price__gte=lower, price__lt=upper)
+        whens.append(When(condition, then=Value(value)))
+    return Case(*whens, output_field=CharField())
+
+
+def parse_price(value):
+    try:
+        return Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+
+
+def get_selected_facets(params):
+    """
+    Reads the selected facet values from the query parameters.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+
+    Returns:
+        dict: Selected value by facet, facets without a valid selected value are left out.
+    """
+
+    selected = {}
+    for name, (_, _, choices) in FACETS.items():
+        value = params.get(name)
+        if value and (choices is None or value in dict(choices)):
+            selected[name] = value
+    return selected
+
+
+def facet_queryset(category, params):
+    """
+    Returns the active listings of a category matching the price bounds and the distance search
+    of the query parameters (see get_search_point()), annotated with the columns of the facets.
+
+    Args:
+        category (Category): The category.
+        params (QueryDict): Query parameters of the request.
+
+    Returns:
+        QuerySet: The listings, before the facet filters are applied.
+    """
+
+    listings = Listings.objects.filter(category_id=category, status='Active')
+    min_price = parse_price(params.get('min_price'))
+    max_price = parse_price(params.get('max_price'))
+    if min_price is not None:
+        listings = listings.filter(price__gte=min_price)
+    if max_price is not None:
+        listings = listings.filter(price__lte=max_price)
+    point = get_search_point(params)
+    if point is not None:
+        listings = filter_near(listings, *point, prefix='address_id__')
+    return listings.annotate(city=F('address_id__city'), price_range=price_range_case())
+
+
+def filter_listings(listings, selected):
+    """
+    Applies the selected facet values to listings returned by facet_queryset().
+
+    The price range is applied as bounds of the price column, so it can use the index.
+
+    Args:
+        listings (QuerySet): The listings.
+        selected (dict): Selected value by facet.
+
+    Returns:
+        QuerySet: The matching listings.
+    """
+
+    selected = selected.copy()
+    price_range = selected.pop('price', None)
+    for value, lower, upper in PRICE_RANGES:
+        if value == price_range:
+            listings = listings.filter(price__gte=lower)
+            if upper is not None:
+                listings = listings.filter(price__lt=upper)
+    return listings.filter(**{FACETS[name][1]: value for name, value in selected.items()})
+
+
+def count_facets(listings, selected):
+    """
+    Counts the listings by facet value, with one grouped query.
+
+    The listings are grouped by the combination of all facet columns, so a single query
+    returns the counts of every combination. The count of a facet value is then the sum
+    over the combinations having the value and matching the values selected in the other
+    facets, so every facet shows how many listings each of its values would give with the
+    current selection of the other facets.
+
+    Args:
+        listings (QuerySet): Listings returned by facet_queryset().
+        selected (dict): Selected value by facet.
+
+    Returns:
+        tuple: The counts as a dict of Counters by facet, and the number of listings matching the selection.
+    """
+
+    columns = [column for _, column, _ in FACETS.values()]
+    rows = listings.order_by().values(*columns).annotate(count=Count('id'))
+
+    counts = {name: Counter() for name in FACETS}
+    total = 0
+    for row in rows:
+        mismatched = [name for name, value in selected.items() if row[FACETS[name][1]] != value]
+        if not mismatched:
+            total += row['count']
+        for name, (_, column, _) in FACETS.items():
+            if not mismatched or mismatched == [name]:
+                counts[name][row[column]] += row['count']
+    return counts, total
+
+
+def facet_params(params):
+    """
+    Returns the query parameters of the faceted browse, the ones in the page cache key.
+
+    Links built from them are the same for every request sharing a cached page.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+
+    Returns:
+        QueryDict: The non-empty FACET_PARAMS of the request, mutable.
+    """
+
+    query = QueryDict(mutable=True)
+    for param in FACET_PARAMS:
+        if params.get(param):
+            query[param] = params[param]
+    return query
+
+
+def facet_url(params, name, value):
+    """
+    Returns the query string selecting a facet value, or clearing the facet if the value is selected.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+        name (str): Name of the facet.
+        value (str): The facet value.
+
+    Returns:
+        str: The query string, starting with '?'.
+    """
+
+    query = facet_params(params)
+    if params.get(name) == value:
+        del query[name]
+    else:
+        query[name] = value
+    return f'?{query.urlencode()}'
+
+
+def build_facets(params, counts, selected):
+    """
+    Builds the facets shown on the category page.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+        counts (dict): Counters by facet returned by count_facets().
+        selected (dict): Selected value by facet.
+
+    Returns:
+        list: Facets as dicts with their 'name', 'label' and 'values', each value being
+            a dict with its 'value', 'label', 'count', 'selected' flag and 'url'.
+    """
+
+    facets = []
+    for name, (label, _, choices) in FACETS.items():
+        if choices is None:
+            choices = [(value, value) for value, _ in counts[name].most_common(MAX_FACET_VALUES) if value]
+            if name in selected and selected[name] not in dict(choices):
+                choices.append((selected[name], selected[name]))
+        values = [{
+            'value': value,
+            'label': value_label,
+            'count': counts[name][value],
+            'selected': selected.get(name) == value,
+            'url': facet_url(params, name, value),
+        } for value, value_label in choices]
+        facets.append({'name': name, 'label': label, 'values': values})
+    return facets
@@ -0,0 +1,153 @@
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from sell_it_app.models import Favourite, Listings
+
+FAVOURITE_IDS_TIMEOUT = 60 * 60 * 24
+FAVOURITE_BUTTON_TEMPLATE = 'sell_it_app/partials/favourite_button.html'
+FAVOURITE_BUTTON_MARKER = '<!--favourite:%d-->'
+FAVOURITE_BUTTON_PATTERN = re.compile(r'<!--favourite:(\d+)-->')
+
+
+def favourite_ids_key(user_id):
+    return f'favourites:{user_id}'
+
+
+def get_favourite_ids(request):
+    """
+    Returns the IDs of the listings favourited by the current user.
+
+    The set is read from the cache, or with a single query on a miss, and kept on the
+    request, so every page looks it up at most once whatever the number of cards.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        frozenset: IDs of the favourited listings, empty for anonymous users.
+    """
+
+    favourite_ids = getattr(request, '_favourite_ids', None)
+    if favourite_ids is None:
+        user = request.user
+        if not user.is_authenticated:
+            favourite_ids = frozenset()
+        else:
+            key = favourite_ids_key(user.id)
+            favourite_ids = cache.get(key)
+            if favourite_ids is None:
+                favourite_ids = frozenset(Favourite.objects.filter(user=user).values_list('listing_id', flat=True))
+                cache.set(key, favourite_ids, FAVOURITE_IDS_TIMEOUT)
+        request._favourite_ids = favourite_ids
+    return favourite_ids
+
+
+def invalidate_favourite_ids(user_id):
+    """
+    Removes the cached favourite IDs of a user, once the current transaction is committed.
+
+    Args:
+        user_id (int): ID of the user.
+    """
+
+    transaction.on_commit(lambda: cache.delete(favourite_ids_key(user_id)))
+
+
+def update_favourite_count(listing_id, delta):
+    """
+    Updates the denormalized favourite count of a listing with one UPDATE.
+
+    Args:
+        listing_id (int): ID of the listing.
+        delta (int): Number of favourites added, negative if removed.
+    """
+
+    Listings.objects.filter(id=listing_id).update(favourite_count=F('favourite_count') + delta)
+
+
+def reconcile_favourite_counts():
+    """
+    Recomputes the favourite counts of the listings from the favourites, with one UPDATE.
+
+    Fixes any drift of the denormalized counts, e.g. after a listing loaded before a favourite
+    was added is saved again, or after favourites were changed without signals.
+
+    Returns:
+        int: The number of listings whose count was fixed.
+    """
+
+    counts = (
+        Favourite.objects.filter(listing=OuterRef('pk'))
+        .order_by()
+        .values('listing')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    count = Coalesce(Subquery(counts), Value(0))
+    drifted = Listings.objects.annotate(actual_count=count).exclude(favourite_count=F('actual_count'))
+    return drifted.update(favourite_count=count)
+
+
+def toggle_favourite(user, listing):
+    """
+    Adds a listing to the favourites of a user, or removes it if it is already there.
+
+    Favourite counts and cached favourite IDs are kept up to date by the Favourite signals.
+
+    Args:
+        user (User): The user.
+        listing (Listings): The listing.
+
+    Returns:
+        bool: True if the listing is now favourited.
+    """
+
+    deleted, _ = Favourite.objects.filter(user=user, listing=listing).delete()
+    if deleted:
+        return False
+    Favourite.objects.get_or_create(user=user, listing=listing)
+    return True
+
+
+def render_favourite_button(listing_id, request):
+    """
+    Renders the favourite button of a listing for the current request.
+
+    Args:
+        listing_id (int): ID of the listing.
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        str: Rendered button.
+    """
+
+    return render_to_string(FAVOURITE_BUTTON_TEMPLATE, {
+        'listing_id': listing_id,
+        'favourited': listing_id in get_favourite_ids(request),
+        'authenticated': request.user.is_authenticated,
+        'next': request.get_full_path(),
+        'csrf_token': get_token(request),
+    })
+
+
+def fill_favourite_buttons(content, request):
+    """
+    Replaces the favourite button markers in a page or card with buttons rendered for the current request.
+
+    Args:
+        content (str): Content with markers, see FAVOURITE_BUTTON_MARKER.
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        str: Content with the buttons.
+    """
+
+    if '<!--favourite:' not in content:
+        return content
+    return FAVOURITE_BUTTON_PATTERN.sub(lambda match: render_favourite_button(int(match.group(1)), request), content)
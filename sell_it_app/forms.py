@@ -1,6 +1,6 @@
 from django import forms
 
-from sell_it_app.models import Avatars, Listings, Picture, Address, User
+from sell_it_app.models import Avatars, Listings, Picture, Address, User, SavedSearch
 
 
 class AvatarForm(forms.ModelForm):
@@ -63,6 +63,37 @@ class ListingsForm(forms.ModelForm):
         fields = ['category_id', 'title', 'description', 'price', 'condition', 'offer_type']
 
 
+class SavedSearchForm(forms.ModelForm):
+    """
+    A form for saving searches.
+
+    Attributes:
+    - query: A field representing the words the listing titles must contain.
+    - category: A field representing the category of the listings.
+    - min_price: A field representing the lowest price of the listings.
+    - max_price: A field representing the highest price of the listings.
+    - city: A field representing the city of the listings.
+    """
+    class Meta:
+        model = SavedSearch
+        fields = ['query', 'category', 'min_price', 'max_price', 'city']
+
+    def clean(self):
+        """
+        Clean method to validate the price range.
+
+        Raises:
+        - ValidationError: If the lowest price is higher than the highest price.
+        """
+        cleaned_data = super().clean()
+        min_price = cleaned_data.get('min_price')
+        max_price = cleaned_data.get('max_price')
+
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise forms.ValidationError('The lowest price is higher than the highest price!')
+        return cleaned_data
+
+
 class ProfileForm(forms.ModelForm):
     """
     A form for updating user profiles.
@@ -104,3 +135,13 @@ class PasswordForm(forms.Form):
         if new_password != new_password_confirm:
             raise forms.ValidationError("Passwords don't match!")
         return cleaned_data
+
+
+class DeleteOlderMessagesForm(forms.Form):
+    """
+    A form for deleting the messages older than a number of days.
+
+    Attributes:
+    - days: A field representing the age in days of the oldest messages kept, from 1 to 10 years.
+    """
+    days = forms.IntegerField(min_value=1, max_value=3650)
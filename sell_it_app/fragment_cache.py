@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from sell_it_app.favourites import FAVOURITE_BUTTON_MARKER, fill_favourite_buttons
+
+# Listing card variants rendered on list pages.
+LISTING_CARD_TEMPLATES = {
+    'index': 'sell_it_app/partials/listing_card_index.html',
+    'category': 'sell_it_app/partials/listing_card_category.html',
+    'search': 'sell_it_app/partials/listing_card_search.html',
+    'my_listings': 'sell_it_app/partials/listing_card_my_listings.html',
+}
+LISTING_CARD_TIMEOUT = 60 * 60 * 24
+CSRF_TOKEN_PLACEHOLDER = '__csrf_token__'
+
+
+def listing_card_key(listing, variant):
+    """
+    Builds the cache key of a rendered listing card.
+
+    The key contains the card version of the listing, so a changed listing never hits an outdated card.
+
+    Args:
+        listing (Listings): The listing shown on the card.
+        variant (str): Name of the card variant in LISTING_CARD_TEMPLATES.
+
+    Returns:
+        str: Cache key for the card.
+    """
+
+    return f'listing_card:{variant}:{listing.id}:{listing.card_version}'
+
+
+def render_listing_card(listing, variant):
+    """
+    Renders a single listing card.
+
+    The card is rendered without a request, forms inside the card get a placeholder instead of the CSRF token
+    and the favourite button of the listing is left as a marker.
+
+    Args:
+        listing (Listings): The listing shown on the card.
+        variant (str): Name of the card variant in LISTING_CARD_TEMPLATES.
+
+    Returns:
+        str: Rendered card.
+    """
+
+    return render_to_string(LISTING_CARD_TEMPLATES[variant], {
+        'listing': listing,
+        'csrf_token': CSRF_TOKEN_PLACEHOLDER,
+        'favourite_button': mark_safe(FAVOURITE_BUTTON_MARKER % listing.id),
+    })
+
+
+def render_listing_cards(listings, variant, request=None):
+    """
+    Returns rendered cards for the listings, reading all cached cards with a single get_many.
+
+    Missing cards are rendered and stored with a single set_many. Favourite buttons are filled
+    in for the current user, with a single lookup of the favourites for all cards, unless the
+    page is rendered for the page cache, which fills them in for every request.
+
+    Args:
+        listings (iterable): Listings to render.
+        variant (str): Name of the card variant in LISTING_CARD_TEMPLATES.
+        request (HttpRequest): HTTP request object, used to fill in the CSRF token and the favourite buttons.
+
+    Returns:
+        list: Rendered cards in the order of the listings.
+    """
+
+    listings = list(listings)
+    keys = [listing_card_key(listing, variant) for listing in listings]
+    cards = cache.get_many(keys)
+
+    missing = {}
+    for key, listing in zip(keys, listings):
+        if key not in cards:
+            missing[key] = render_listing_card(listing, variant)
+    if missing:
+        cache.set_many(missing, LISTING_CARD_TIMEOUT)
+        cards.update(missing)
+
+    csrf_token = None
+    result = []
+    for key in keys:
+        card = cards[key]
+        if CSRF_TOKEN_PLACEHOLDER in card and request is not None:
+            csrf_token = csrf_token or get_token(request)
+            card = card.replace(CSRF_TOKEN_PLACEHOLDER, csrf_token)
+        if request is not None and not getattr(request, 'punch_holes', False):
+            card = fill_favourite_buttons(card, request)
+        result.append(mark_safe(card))
+    return result
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from sell_it_app.models import SuggestTerm
+from sell_it_app.saved_searches import search_terms
+
+# Shorter words of a query are kept as typed, they have too few trigrams to be corrected.
+MIN_WORD_LENGTH = 3
+# Number of words of a query corrected, the rest are kept as typed.
+MAX_CORRECTED_WORDS = 5
+# Number of closest words of the vocabulary looked up per word of a query.
+CANDIDATES_PER_WORD = 3
+
+
+def trigrams(word):
+    """
+    Returns the trigrams of a normalized word, padded like pg_trgm does: two spaces before it and one after.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        set: The trigrams.
+    """
+
+    padded = f'  {word} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    In-process inverted index of the trigrams of the vocabulary, used to find the words closest
+    to a misspelled one where pg_trgm isn't installed.
+
+    Only the words sharing a trigram with the looked up word are read, through the posting
+    lists of its trigrams, so a lookup never compares the word with the whole vocabulary.
+    Similarity is computed like pg_trgm's similarity(): shared trigrams over distinct trigrams
+    of both words.
+
+    Attributes:
+        terms (list): Words of the vocabulary.
+        counts (list): Number of active listings of every word.
+        postings (dict): Positions in terms of the words containing every trigram.
+        trigram_counts (list): Number of trigrams of every word.
+    """
+
+    def __init__(self, rows):
+        self.terms = []
+        self.counts = []
+        self.trigram_counts = []
+        self.postings = defaultdict(list)
+        for term, count in rows:
+            word_trigrams = trigrams(term)
+            for trigram in word_trigrams:
+                self.postings[trigram].append(len(self.terms))
+            self.terms.append(term)
+            self.counts.append(count)
+            self.trigram_counts.append(len(word_trigrams))
+
+    def closest(self, word, limit, threshold):
+        """
+        Returns the words of the vocabulary most similar to a word.
+
+        Args:
+            word (str): Normalized word.
+            limit (int): Maximum number of words.
+            threshold (float): Lowest similarity of the returned words.
+
+        Returns:
+            list: The words, most similar first, then with the most listings first.
+        """
+
+        word_trigrams = trigrams(word)
+        shared = Counter()
+        for trigram in word_trigrams:
+            shared.update(self.postings.get(trigram, ()))
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(word_trigrams) + self.trigram_counts[position] - count)
+            if similarity >= threshold:
+                scored.append((-similarity, -self.counts[position], self.terms[position]))
+        return [term for _, _, term in sorted(scored)[:limit]]
+
+
+_index = None
+_loaded_at = 0
+_lock = threading.Lock()
+
+
+def get_trigram_index():
+    """
+    Returns the trigram index of the vocabulary of the current process, loaded again every
+    FUZZY_INDEX_REFRESH_INTERVAL seconds.
+
+    The vocabulary is made of the FUZZY_INDEX_MAX_TERMS words found in the most active
+    listings, see SuggestTerm, so the memory of the index stays bounded.
+
+    Returns:
+        TrigramIndex: The index.
+    """
+
+    global _index, _loaded_at
+    if _index is not None and time.monotonic() - _loaded_at < settings.FUZZY_INDEX_REFRESH_INTERVAL:
+        return _index
+    with _lock:
+        if _index is None or time.monotonic() - _loaded_at >= settings.FUZZY_INDEX_REFRESH_INTERVAL:
+            rows = (
+                SuggestTerm.objects.filter(listing_count__gt=0)
+                .exclude(text__contains=' ')
+                .order_by('-listing_count')
+                .values_list('text', 'listing_count')[:settings.FUZZY_INDEX_MAX_TERMS]
+            )
+            _index = TrigramIndex(rows.iterator(chunk_size=10000))
+            _loaded_at = time.monotonic()
+    return _index
+
+
+_pg_trgm_installed = {}
+
+
+def pg_trgm_installed():
+    """
+    Checks whether the pg_trgm extension is installed in the database, once per process.
+
+    Returns:
+        bool: True if the vocabulary and titles have trigram indexes, see migration 0034.
+    """
+
+    if connection.alias not in _pg_trgm_installed:
+        installed = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                installed = cursor.fetchone() is not None
+        _pg_trgm_installed[connection.alias] = installed
+    return _pg_trgm_installed[connection.alias]
+
+
+def closest_terms(word, limit):
+    """
+    Returns the words of the vocabulary most similar to a word, with at least FUZZY_SEARCH_THRESHOLD similarity.
+
+    With pg_trgm, they are looked up with the trigram index of the vocabulary table, otherwise
+    with the in-process TrigramIndex.
+
+    Args:
+        word (str): Normalized word.
+        limit (int): Maximum number of words.
+
+    Returns:
+        list: The words, most similar first.
+    """
+
+    threshold = settings.FUZZY_SEARCH_THRESHOLD
+    if not pg_trgm_installed():
+        return get_trigram_index().closest(word, limit, threshold)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(threshold)])
+        return list(
+            SuggestTerm.objects.filter(TrigramSimilar(F('text'), word), listing_count__gt=0)
+            .exclude(text__contains=' ')
+            .annotate(similarity=TrigramSimilarity('text', word))
+            .order_by('-similarity', '-listing_count', 'text')
+            .values_list('text', flat=True)[:limit]
+        )
+
+
+def suggest_corrections(query):
+    """
+    Suggests corrections of a misspelled search query, made of the words of the listing titles.
+
+    Every word of the query is replaced with the closest word of the vocabulary, e.g.
+    'iphnoe' with 'iphone'. The other suggestions replace one word with its next closest words.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        list: At most FUZZY_SEARCH_SUGGESTIONS corrected queries, the best first, empty if no
+            word was corrected.
+    """
+
+    words = search_terms(query)
+    candidates = []
+    for position, word in enumerate(words):
+        closest = []
+        if len(word) >= MIN_WORD_LENGTH and position < MAX_CORRECTED_WORDS:
+            closest = closest_terms(word, CANDIDATES_PER_WORD)
+        candidates.append(closest or [word])
+
+    best = [closest[0] for closest in candidates]
+    if best == words:
+        return []
+    corrections = [' '.join(best)]
+    for position, closest in enumerate(candidates):
+        for alternative in closest[1:]:
+            corrections.append(' '.join(best[:position] + [alternative] + best[position + 1:]))
+    return corrections[:settings.FUZZY_SEARCH_SUGGESTIONS]
+
+
+def filter_title_words(queryset, query):
+    """
+    Filters listings to the ones whose title contains every word of a query.
+
+    On PostgreSQL with pg_trgm, the case insensitive substring matches are served by the
+    trigram index of the titles.
+
+    Args:
+        queryset (QuerySet): The listings.
+        query (str): The query, e.g. a correction from suggest_corrections().
+
+    Returns:
+        QuerySet: The matching listings.
+    """
+
+    words = query.split()
+    if not words:
+        return queryset
+    return queryset.filter(reduce(and_, (Q(title__icontains=word) for word in words)))
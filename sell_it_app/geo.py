@@ -0,0 +1,279 @@
+import csv
+import functools
+import math
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+POSTAL_CODE_PATTERN = re.compile(r'^\d{2}-?\d{3}$')
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+
+def normalize_place(name):
+    """
+    Normalizes a place name for lookups, ignoring case, diacritics and surrounding spaces.
+
+    Args:
+        name (str): The place name.
+
+    Returns:
+        str: The normalized name.
+    """
+
+    name = unicodedata.normalize('NFKD', name.strip().casefold().replace('ł', 'l'))
+    return ''.join(char for char in name if not unicodedata.combining(char))
+
+
+def normalize_postal_code(postal_code):
+    postal_code = postal_code.strip().replace(' ', '')
+    if len(postal_code) == 5 and postal_code.isdigit():
+        postal_code = f'{postal_code[:2]}-{postal_code[2:]}'
+    return postal_code
+
+
+def average(points):
+    return sum(lat for lat, _ in points) / len(points), sum(lon for _, lon in points) / len(points)
+
+
+@functools.lru_cache(maxsize=None)
+def load_gazetteer():
+    """
+    Loads the gazetteer of the GAZETTEER_PATH setting, once per process.
+
+    The gazetteer is a tab-separated file in the format of the GeoNames postal code dumps:
+    country code, postal code, place name, three pairs of administrative division names and
+    codes, latitude, longitude and accuracy. Places with several postal codes are located at
+    the average of their coordinates.
+
+    Returns:
+        tuple: Coordinates by postal code, by normalized place name and by the first two digits of the postal code.
+    """
+
+    by_postal_code = {}
+    places = {}
+    prefixes = {}
+    with open(settings.GAZETTEER_PATH, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file, delimiter='\t'):
+            point = float(row[9]), float(row[10])
+            postal_code = normalize_postal_code(row[1])
+            by_postal_code[postal_code] = point
+            places.setdefault(normalize_place(row[2]), []).append(point)
+            prefixes.setdefault(postal_code[:2], []).append(point)
+    return (
+        by_postal_code,
+        {place: average(points) for place, points in places.items()},
+        {prefix: average(points) for prefix, points in prefixes.items()},
+    )
+
+
+def geocode(postal_code='', city=''):
+    """
+    Locates an address with the offline gazetteer.
+
+    The postal code is looked up first, then the city, then the postal district given by the
+    first two digits of the postal code.
+
+    Args:
+        postal_code (str): Postal code of the address.
+        city (str): City of the address.
+
+    Returns:
+        tuple: The latitude and longitude, None if the address is not in the gazetteer.
+    """
+
+    by_postal_code, places, prefixes = load_gazetteer()
+    postal_code = normalize_postal_code(postal_code or '')
+    point = by_postal_code.get(postal_code) or places.get(normalize_place(city or ''))
+    if point is None and POSTAL_CODE_PATTERN.match(postal_code):
+        point = prefixes.get(postal_code[:2])
+    return point
+
+
+def geocode_address(address):
+    """
+    Sets the coordinates and the geohash of an address from its postal code and city.
+
+    Args:
+        address (Address): The address, not saved.
+    """
+
+    point = geocode(address.postal_code, address.city)
+    if point is None:
+        address.latitude = address.longitude = None
+        address.geohash = ''
+    else:
+        address.latitude, address.longitude = point
+        address.geohash = encode_geohash(*point)
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Encodes a point as a geohash: points in the same grid cell share the prefix of the cell.
+
+    Args:
+        lat (float): Latitude.
+        lon (float): Longitude.
+        precision (int): Number of characters, each one dividing the cell into 32 smaller ones.
+
+    Returns:
+        str: The geohash.
+    """
+
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return ''.join(geohash)
+
+
+def cell_size(precision):
+    """
+    Returns the size of the geohash cells of a precision.
+
+    Args:
+        precision (int): Number of characters of the geohash.
+
+    Returns:
+        tuple: The height and width of a cell in degrees.
+    """
+
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def covering_cells(lat, lon, radius_km):
+    """
+    Returns the geohash cells covering a circle: the cell of the center and its eight neighbours,
+    at the highest precision whose cells are larger than the radius.
+
+    Args:
+        lat (float): Latitude of the center.
+        lon (float): Longitude of the center.
+        radius_km (float): Radius in kilometers.
+
+    Returns:
+        set: Geohashes of the cells, empty if the circle is larger than the largest cells.
+    """
+
+    lat_km = 111.32
+    lon_km = 111.32 * max(math.cos(math.radians(lat)), 0.01)
+    precision = 0
+    while precision < GEOHASH_PRECISION:
+        height, width = cell_size(precision + 1)
+        if height * lat_km < radius_km or width * lon_km < radius_km:
+            break
+        precision += 1
+    if precision == 0:
+        return set()
+
+    height, width = cell_size(precision)
+    return {
+        encode_geohash(max(min(lat + dlat * height, 90), -90), (lon + dlon * width + 180) % 360 - 180, precision)
+        for dlat in (-1, 0, 1) for dlon in (-1, 0, 1)
+    }
+
+
+def distance_expression(lat, lon, prefix=''):
+    """
+    Returns an expression computing the great-circle distance (haversine) of addresses from a point.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        prefix (str): Lookup of the address from the queried model, e.g. 'address_id__'.
+
+    Returns:
+        Expression: The distance in kilometers.
+    """
+
+    lat_field, lon_field = F(f'{prefix}latitude'), F(f'{prefix}longitude')
+    lat_value, lon_value = Value(lat, output_field=FloatField()), Value(lon, output_field=FloatField())
+    half_chord = (
+        Power(Sin(Radians(lat_field - lat_value) / 2), 2)
+        + Cos(Radians(lat_value)) * Cos(Radians(lat_field)) * Power(Sin(Radians(lon_field - lon_value) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(half_chord))
+
+
+def filter_near(queryset, lat, lon, radius_km, prefix=''):
+    """
+    Filters a queryset to the addresses within a radius of a point, annotated with their distance.
+
+    Candidates are selected with the indexed geohash prefixes of the cells covering the circle,
+    the exact distance is only computed for them.
+
+    Args:
+        queryset (QuerySet): Addresses, or objects related to addresses.
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        radius_km (float): Radius in kilometers.
+        prefix (str): Lookup of the address from the queried model, e.g. 'address_id__'.
+
+    Returns:
+        QuerySet: The matching objects, annotated with their distance in kilometers.
+    """
+
+    cells = Q()
+    for cell in covering_cells(lat, lon, radius_km):
+        cells |= Q(**{f'{prefix}geohash__startswith': cell})
+    return (
+        queryset.filter(cells, **{f'{prefix}latitude__isnull': False})
+        .annotate(distance=distance_expression(lat, lon, prefix))
+        .filter(distance__lte=radius_km)
+    )
+
+
+def get_search_point(params):
+    """
+    Reads the point and radius of a distance search from the query parameters.
+
+    The point is given either by 'lat' and 'lon', e.g. from the browser's location, or by
+    a city or postal code in 'near'. The radius in kilometers is given by 'radius'.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+
+    Returns:
+        tuple: The latitude, longitude and radius, None if there is no valid point.
+    """
+
+    try:
+        radius = min(float(params.get('radius') or DEFAULT_RADIUS_KM), MAX_RADIUS_KM)
+    except ValueError:
+        radius = DEFAULT_RADIUS_KM
+    try:
+        lat, lon = float(params['lat']), float(params['lon'])
+    except (KeyError, ValueError):
+        near = (params.get('near') or '').strip()
+        if not near:
+            return None
+        point = geocode(near, near)
+        if point is None:
+            return None
+        lat, lon = point
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius <= 0:
+        return None
+    return lat, lon, radius
@@ -0,0 +1,253 @@
+import datetime
+import random
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from sell_it_app.models import Job
+
+# Registered tasks by name, see task().
+TASKS = {}
+
+
+def task(func):
+    """
+    Decorator registering a function as a task which can be run by the background workers.
+
+    The function gets an enqueue() attribute queuing a job running it, its arguments
+    must be JSON serializable.
+
+    Args:
+        func (callable): The task function.
+
+    Returns:
+        callable: The same function.
+    """
+
+    name = f'{func.__module__}.{func.__qualname__}'
+    TASKS[name] = func
+
+    def enqueue_task(*args, priority=0, run_at=None, max_attempts=None, unique=False, **kwargs):
+        return enqueue(name, *args, priority=priority, run_at=run_at, max_attempts=max_attempts, unique=unique,
+                       **kwargs)
+
+    func.task_name = name
+    func.enqueue = enqueue_task
+    return func
+
+
+def enqueue(task_name, *args, priority=0, run_at=None, max_attempts=None, unique=False, **kwargs):
+    """
+    Queues a job running a registered task.
+
+    The job is saved in the current transaction, so it is only run if the transaction is committed.
+
+    Args:
+        task_name (str): Registered name of the task.
+        *args: Positional arguments of the task.
+        priority (int): Priority of the job, higher priorities run first.
+        run_at (datetime.datetime): Date the job is due, now by default.
+        max_attempts (int): Number of attempts before the job fails, JOBS_MAX_ATTEMPTS by default.
+        unique (bool): Whether to skip queuing if a job of the task with the same arguments is already queued.
+        **kwargs: Keyword arguments of the task.
+
+    Returns:
+        Job: The queued job, or the already queued job.
+
+    Raises:
+        KeyError: If there is no task registered with the name.
+    """
+
+    if task_name not in TASKS:
+        raise KeyError(f'Unknown task {task_name}')
+    if unique:
+        job = Job.objects.filter(task=task_name, args=list(args), kwargs=kwargs, status='Queued').first()
+        if job is not None:
+            return job
+    return Job.objects.create(
+        task=task_name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """
+    Returns the delay before the next attempt of a failed job, growing exponentially with a random jitter.
+
+    Args:
+        attempts (int): Number of failed attempts.
+
+    Returns:
+        datetime.timedelta: The delay.
+    """
+
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1), settings.JOBS_MAX_RETRY_DELAY)
+    return datetime.timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def lease_expiry():
+    return timezone.now() + datetime.timedelta(seconds=settings.JOBS_LEASE_DURATION)
+
+
+def requeue_stale_jobs():
+    """
+    Queues again the running jobs whose lease expired, as their worker was lost, e.g. killed.
+
+    Every requeue counts as a failed attempt, so a job killing its worker fails after
+    max_attempts attempts instead of being queued forever.
+
+    Returns:
+        int: The number of queued jobs.
+    """
+
+    now = timezone.now()
+    error = 'The lease of the job expired, its worker was lost.'
+    expired = Job.objects.filter(status='Running', lease_expires_at__lt=now)
+    expired.filter(attempts__gte=F('max_attempts') - 1).update(
+        status='Failed', attempts=F('attempts') + 1, last_error=error, finished_at=now)
+    return expired.update(status='Queued', attempts=F('attempts') + 1, last_error=error, run_at=now)
+
+
+def renew_leases(job_id, worker, stop_event):
+    """
+    Renews the lease of a running job every JOBS_HEARTBEAT_INTERVAL seconds until the stop event is set.
+
+    Runs in a thread next to the task, with its own database connection.
+
+    Args:
+        job_id (int): ID of the job.
+        worker (str): Name of the worker running it.
+        stop_event (threading.Event): Event set when the task is over.
+    """
+
+    try:
+        while not stop_event.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+            Job.objects.filter(id=job_id, status='Running', worker=worker).update(lease_expires_at=lease_expiry())
+    finally:
+        connection.close()
+
+
+def claim_job(worker):
+    """
+    Marks the next due job as running by the worker.
+
+    On databases supporting it, the job row is locked with SELECT ... FOR UPDATE SKIP LOCKED,
+    so concurrent workers claim different jobs without waiting for each other. Other
+    databases claim the job with a conditional UPDATE and retry if another worker won.
+
+    Args:
+        worker (str): Name of the worker.
+
+    Returns:
+        Job: The claimed job, or None if no job is due.
+    """
+
+    jobs = Job.objects.filter(status='Queued', run_at__lte=timezone.now()).order_by('-priority', 'run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = jobs.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = 'Running'
+            job.started_at = timezone.now()
+            job.lease_expires_at = lease_expiry()
+            job.worker = worker
+            job.save(update_fields=['status', 'started_at', 'lease_expires_at', 'worker'])
+            return job
+
+    while True:
+        job_id = jobs.values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        if Job.objects.filter(id=job_id, status='Queued').update(status='Running', started_at=timezone.now(),
+                                                                lease_expires_at=lease_expiry(), worker=worker):
+            return Job.objects.get(id=job_id)
+
+
+def run_job(job):
+    """
+    Runs the task of a claimed job and records the result.
+
+    A failed job is queued again after retry_delay(), until it has failed max_attempts times.
+    The lease of the job is renewed while the task runs, see renew_leases().
+
+    Args:
+        job (Job): The claimed job.
+
+    Returns:
+        bool: True if the task succeeded.
+    """
+
+    task_over = threading.Event()
+    heartbeat = threading.Thread(target=renew_leases, args=(job.id, job.worker, task_over), daemon=True)
+    heartbeat.start()
+    try:
+        TASKS[job.task](*job.args, **job.kwargs)
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'Failed'
+            job.finished_at = timezone.now()
+        else:
+            job.status = 'Queued'
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=['attempts', 'last_error', 'status', 'finished_at', 'run_at'])
+        return False
+    finally:
+        task_over.set()
+        heartbeat.join()
+
+    job.status = 'Done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def run_queued_jobs(worker='inline', limit=None):
+    """
+    Runs the due jobs one by one until there are none left.
+
+    Args:
+        worker (str): Name of the worker.
+        limit (int): Maximum number of jobs to run, no limit by default.
+
+    Returns:
+        int: The number of jobs run.
+    """
+
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(worker, stop_event, poll_interval):
+    """
+    Runs jobs until the stop event is set, waiting poll_interval seconds whenever the queue is empty.
+
+    Args:
+        worker (str): Name of the worker.
+        stop_event (threading.Event | multiprocessing.Event): Event stopping the worker.
+        poll_interval (float): Seconds to wait for new jobs.
+    """
+
+    try:
+        while not stop_event.is_set():
+            requeue_stale_jobs()
+            if not run_queued_jobs(worker, limit=100):
+                stop_event.wait(poll_interval)
+    finally:
+        connection.close()
@@ -0,0 +1,319 @@
+import datetime
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from sell_it_app.facets import FACETS, PRICE_RANGES, parse_price
+from sell_it_app.models import Listings, ListingChange
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, listings are then always read from the database.
+    np = None
+
+# Columns of the index holding codes of choices, with their choices in code order.
+CODED_COLUMNS = {
+    'condition': [value for value, _ in Listings.CONDITION_CHOICES],
+    'offer_type': [value for value, _ in Listings.OFFER_CHOICES],
+    'promotion': [value for value, _ in Listings.PROMOTION_CHOICES],
+    'price': [value for value, _, _ in PRICE_RANGES],
+}
+PRICE_BOUNDS = [lower for _, lower, _ in PRICE_RANGES[1:]]
+LOADED_FIELDS = ('id', 'category_id_id', 'price', 'add_date', 'condition', 'offer_type', 'promotion',
+                 'address_id__city')
+
+
+def to_microseconds(date):
+    return int(date.timestamp() * 1_000_000)
+
+
+class ListingIndex:
+    """
+    In-process columnar snapshot of the active listings, held in NumPy arrays.
+
+    Filtering, facet counts, sorting and top-k selection of browse requests are computed
+    with vectorized operations over the arrays, so the database is only queried for the
+    listings of the requested page. The index refreshes itself every
+    LISTING_INDEX_REFRESH_INTERVAL seconds from the ListingChange log: changed listings are
+    marked deleted and their current rows appended, deleted rows are dropped once they make
+    up a quarter of the index. An index which would hold more than LISTING_INDEX_MAX_LISTINGS
+    listings is disabled instead, so its memory stays bounded, about 40 bytes per listing, and
+    is only built again every LISTING_INDEX_RETRY_INTERVAL seconds.
+
+    A refresh replaces the arrays with new ones, so requests served by other threads keep
+    reading a consistent snapshot. City codes are never reassigned for the same reason. A
+    snapshot is published before the index is enabled and never dropped, a disabled index
+    keeps its last one, so a request which found the index enabled always has one to read.
+
+    Attributes:
+        snapshot (tuple): Arrays by column name, aligned by position, and the flags of the
+            rows holding the current state of a listing.
+        cities (list): City names by city code.
+        enabled (bool): Whether the index can serve requests.
+        next_refresh_at (float): Monotonic time of the next refresh.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.cities = []
+        self.city_codes = {}
+        self.enabled = False
+        self.refreshed_at = None
+        self.next_refresh_at = 0
+        self._lock = threading.Lock()
+
+    def _city_code(self, city):
+        code = self.city_codes.get(city)
+        if code is None:
+            code = self.city_codes[city] = len(self.cities)
+            self.cities.append(city)
+        return code
+
+    def _to_columns(self, rows):
+        """
+        Converts listing rows read with LOADED_FIELDS to arrays.
+        """
+
+        ids, categories, prices, dates, conditions, offer_types, promotions, cities = zip(*rows) if rows else [()] * 8
+        prices = np.array(prices, dtype=np.float64)
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'category': np.array(categories, dtype=np.int32),
+            'price': prices,
+            'add_date': np.array([to_microseconds(date) for date in dates], dtype=np.int64),
+            'condition': np.array([CODED_COLUMNS['condition'].index(value) for value in conditions], dtype=np.int8),
+            'offer_type': np.array([CODED_COLUMNS['offer_type'].index(value) for value in offer_types],
+                                   dtype=np.int8),
+            'promotion': np.array([CODED_COLUMNS['promotion'].index(value) for value in promotions], dtype=np.int8),
+            'city': np.array([self._city_code(city) for city in cities], dtype=np.int32),
+            'price_range': np.searchsorted(PRICE_BOUNDS, prices, side='right').astype(np.int8),
+        }
+
+    def build(self):
+        """
+        Loads all active listings, streamed from the database with a server-side cursor, or
+        disables the index if there are more than LISTING_INDEX_MAX_LISTINGS of them.
+        """
+
+        refreshed_at = timezone.now()
+        listings = Listings.objects.filter(status='Active')
+        if listings.count() > settings.LISTING_INDEX_MAX_LISTINGS:
+            self.enabled = False
+        else:
+            rows = list(listings.values_list(*LOADED_FIELDS).iterator(chunk_size=10000))
+            self.snapshot = (self._to_columns(rows), np.ones(len(rows), dtype=bool))
+            self.enabled = True
+        self.refreshed_at = refreshed_at
+
+    def apply_changes(self):
+        """
+        Applies the changes logged since the last refresh.
+
+        Changes logged shortly before the last refresh are read again, so changes committed
+        late by long transactions are not missed, applying a change twice is harmless.
+        Falls back to a full build if the log was pruned since the last refresh.
+        """
+
+        refreshed_at = timezone.now()
+        grace = datetime.timedelta(seconds=settings.LISTING_INDEX_CHANGE_GRACE)
+        if self.refreshed_at < refreshed_at - datetime.timedelta(seconds=settings.LISTING_CHANGE_RETENTION) + grace:
+            self.build()
+            return
+
+        changed_ids = set(ListingChange.objects.filter(changed_at__gte=self.refreshed_at - grace)
+                          .values_list('listing_id', flat=True))
+        if changed_ids:
+            columns, alive = self.snapshot
+            changed = np.fromiter(changed_ids, dtype=np.int64, count=len(changed_ids))
+            alive = alive & ~np.isin(columns['id'], changed)
+            rows = list(Listings.objects.filter(id__in=changed_ids, status='Active').values_list(*LOADED_FIELDS))
+            new_columns = self._to_columns(rows)
+            columns = {name: np.concatenate([column, new_columns[name]]) for name, column in columns.items()}
+            alive = np.concatenate([alive, np.ones(len(rows), dtype=bool)])
+            if (~alive).sum() * 4 > len(alive):
+                columns = {name: column[alive] for name, column in columns.items()}
+                alive = np.ones(len(columns['id']), dtype=bool)
+            if alive.sum() > settings.LISTING_INDEX_MAX_LISTINGS:
+                self.enabled = False
+            else:
+                self.snapshot = (columns, alive)
+        self.refreshed_at = refreshed_at
+
+    def refresh(self, force=False):
+        """
+        Builds the index or applies the logged changes, at most every LISTING_INDEX_REFRESH_INTERVAL
+        seconds, or every LISTING_INDEX_RETRY_INTERVAL seconds while it is disabled for holding
+        too many listings.
+
+        Args:
+            force (bool): Whether to refresh regardless of the interval.
+        """
+
+        if not force and time.monotonic() < self.next_refresh_at:
+            return
+        with self._lock:
+            if self.refreshed_at is None or not self.enabled:
+                self.build()
+            else:
+                self.apply_changes()
+            if self.enabled:
+                interval = settings.LISTING_INDEX_REFRESH_INTERVAL
+            else:
+                interval = settings.LISTING_INDEX_RETRY_INTERVAL
+            self.next_refresh_at = time.monotonic() + interval
+
+    def _facet_masks(self, columns, alive, category_id, params, selected):
+        base = alive & (columns['category'] == category_id)
+        min_price = parse_price(params.get('min_price'))
+        max_price = parse_price(params.get('max_price'))
+        if min_price is not None:
+            base &= columns['price'] >= float(min_price)
+        if max_price is not None:
+            base &= columns['price'] <= float(max_price)
+
+        masks = {}
+        for name, value in selected.items():
+            column = FACETS[name][1]
+            if name == 'city':
+                code = self.city_codes.get(value, -1)
+            else:
+                code = CODED_COLUMNS[name].index(value)
+            masks[name] = columns[column] == code
+        return base, masks
+
+    def _decode(self, name, code):
+        return self.cities[code] if name == 'city' else CODED_COLUMNS[name][code]
+
+    def browse(self, category_id, params, selected):
+        """
+        Filters the listings of a category and counts them by facet value, like facet_queryset(),
+        filter_listings() and count_facets().
+
+        Args:
+            category_id (int): ID of the category.
+            params (QueryDict): Query parameters of the request.
+            selected (dict): Selected value by facet, see get_selected_facets().
+
+        Returns:
+            tuple: The facet counts as a dict of Counters by facet, and the matching
+                listings as an IndexedListings sequence, newest first.
+        """
+
+        columns, alive = self.snapshot
+        base, masks = self._facet_masks(columns, alive, category_id, params, selected)
+        counts = {}
+        for name, (_, column, _) in FACETS.items():
+            mask = base.copy()
+            for other, other_mask in masks.items():
+                if other != name:
+                    mask &= other_mask
+            codes = columns[column][mask]
+            bincount = np.bincount(codes, minlength=1) if len(codes) else np.zeros(0, dtype=np.int64)
+            counts[name] = Counter({self._decode(name, code): int(count)
+                                    for code, count in enumerate(bincount) if count})
+
+        matching = base
+        for mask in masks.values():
+            matching &= mask
+        positions = np.flatnonzero(matching)
+        return counts, IndexedListings(columns['id'][positions], columns['add_date'][positions])
+
+
+class IndexedListings:
+    """
+    Sequence of the listings matching a browse request, newest first, read lazily page by page.
+
+    Slicing selects the listings of the slice with a partial sort of the add dates (top-k)
+    and loads only them from the database, so it can be used as the object list of a Paginator.
+
+    Attributes:
+        ids (numpy.ndarray): IDs of the matching listings, in index order.
+        add_dates (numpy.ndarray): Add dates of the matching listings, in microseconds.
+    """
+
+    def __init__(self, ids, add_dates):
+        self.ids = ids
+        self.add_dates = add_dates
+
+    def __len__(self):
+        return len(self.ids)
+
+    def page_ids(self, start, stop):
+        """
+        Returns the IDs of the listings between two positions of the sequence, newest first.
+
+        Args:
+            start (int): First position.
+            stop (int): Position after the last one.
+
+        Returns:
+            list: The IDs.
+        """
+
+        stop = min(stop, len(self.ids))
+        if start >= stop:
+            return []
+        # Newest first, by ID among listings added at the same time. Early pages only sort
+        # the newest stop listings, selected with a partial sort.
+        if stop * 4 > len(self.ids):
+            order = np.lexsort((-self.ids, -self.add_dates))
+        else:
+            top = np.argpartition(-self.add_dates, stop - 1)[:stop]
+            order = top[np.lexsort((-self.ids[top], -self.add_dates[top]))]
+        return [int(listing_id) for listing_id in self.ids[order[start:stop]]]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('IndexedListings only supports slicing')
+        start, stop, _ = key.indices(len(self.ids))
+        ids = self.page_ids(start, stop)
+        listings = Listings.objects.in_bulk(ids)
+        return [listings[listing_id] for listing_id in ids if listing_id in listings]
+
+
+_index = ListingIndex()
+
+
+def get_listing_index():
+    """
+    Returns the listing index of the current process, refreshed, if it is enabled.
+
+    Returns:
+        ListingIndex: The index, None if it is disabled by the LISTING_INDEX_ENABLED setting,
+            NumPy is not installed or there are too many listings.
+    """
+
+    if np is None or not settings.LISTING_INDEX_ENABLED:
+        return None
+    _index.refresh()
+    return _index if _index.enabled else None
+
+
+def log_listing_changes(listing_ids):
+    """
+    Logs changes of listings for the listing indexes, unless they are disabled by the
+    LISTING_INDEX_ENABLED setting. An index enabled later is built from the listings, not from the log.
+
+    Args:
+        listing_ids (Iterable[int]): IDs of the listings.
+    """
+
+    if not settings.LISTING_INDEX_ENABLED:
+        return
+    ListingChange.objects.bulk_create([ListingChange(listing_id=listing_id) for listing_id in listing_ids])
+
+
+def prune_listing_changes():
+    """
+    Deletes the logged changes older than LISTING_CHANGE_RETENTION seconds.
+
+    Returns:
+        int: The number of deleted changes.
+    """
+
+    changed_at = timezone.now() - datetime.timedelta(seconds=settings.LISTING_CHANGE_RETENTION)
+    deleted, _ = ListingChange.objects.filter(changed_at__lt=changed_at).delete()
+    return deleted
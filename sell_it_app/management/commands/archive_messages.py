@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sell_it_app.archive import archive_messages
+
+
+class Command(BaseCommand):
+    """
+    Management command moving old read messages to the archive.
+
+    Meant to be run periodically, e.g. from cron.
+    """
+
+    help = 'Moves read messages older than the given number of days to the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+                            help='Age in days of the archived messages.')
+        parser.add_argument('--batch-size', type=int, default=settings.MESSAGE_ARCHIVE_BATCH_SIZE,
+                            help='Number of messages moved in one transaction.')
+        parser.add_argument('--pause', type=float, default=settings.MESSAGE_ARCHIVE_BATCH_PAUSE,
+                            help='Pause in seconds between batches.')
+
+    def handle(self, *args, **options):
+        archived = archive_messages(options['days'], options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} message(s).'))
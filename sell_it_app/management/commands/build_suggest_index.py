@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sell_it_app.suggest import build_suggest_index, reconcile_suggest_terms
+
+
+class Command(BaseCommand):
+    """
+    Management command writing the search suggestion index file, optionally recomputing the
+    counts of the suggested words first.
+
+    Meant to be run periodically, e.g. from cron, and once with --reconcile after deployment.
+    """
+
+    help = 'Writes the search suggestion index file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Recompute the listing counts of the suggested words from the listings first.')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            count = reconcile_suggest_terms()
+            self.stdout.write(f'Counted {count} word(s) in the active listings.')
+        count = build_suggest_index()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} suggestion(s) to {settings.SUGGEST_INDEX_PATH}.'))
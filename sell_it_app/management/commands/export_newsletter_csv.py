@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from sell_it_app.subscribers import iter_subscribers_csv
+
+
+class Command(BaseCommand):
+    """
+    Management command writing the newsletter subscribers to a CSV file.
+    """
+
+    help = 'Exports newsletter subscribers to a CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Path of the CSV file, standard output by default.')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            sys.stdout.writelines(iter_subscribers_csv())
+            return
+        with open(options['path'], 'w', newline='', encoding='utf-8') as file:
+            file.writelines(iter_subscribers_csv())
+        self.stdout.write(self.style.SUCCESS(f"Exported subscribers to {options['path']}."))
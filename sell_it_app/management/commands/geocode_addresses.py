@@ -0,0 +1,36 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+
+from sell_it_app.geo import geocode_address
+from sell_it_app.models import Address
+
+
+class Command(BaseCommand):
+    """
+    Management command locating existing addresses with the offline gazetteer.
+
+    Addresses are read with a server-side cursor and updated in batches with bulk_update.
+    """
+
+    help = 'Sets the coordinates of addresses from the offline gazetteer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Locate all addresses again, e.g. after the gazetteer was replaced.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of addresses updated with one query.')
+
+    def handle(self, *args, **options):
+        addresses = Address.objects.order_by('id')
+        if not options['all']:
+            addresses = addresses.filter(latitude__isnull=True)
+
+        located = total = 0
+        addresses = addresses.iterator(chunk_size=options['batch_size'])
+        while batch := list(itertools.islice(addresses, options['batch_size'])):
+            for address in batch:
+                geocode_address(address)
+            Address.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            total += len(batch)
+            located += sum(address.latitude is not None for address in batch)
+        self.stdout.write(self.style.SUCCESS(f'Located {located} of {total} address(es).'))
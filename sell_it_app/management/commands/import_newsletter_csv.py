@@ -0,0 +1,25 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from sell_it_app.subscribers import import_subscribers, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Management command subscribing the emails of a CSV file to the newsletter.
+
+    The email is read from the first column, already subscribed emails are ignored.
+    """
+
+    help = 'Imports newsletter subscribers from a CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the CSV file.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Number of emails inserted with one query.')
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='', encoding='utf-8') as file:
+            valid, skipped = import_subscribers(csv.reader(file), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {valid} valid email(s), skipped {skipped} invalid row(s).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sell_it_app.listing_index import prune_listing_changes
+
+
+class Command(BaseCommand):
+    """
+    Management command deleting the listing changes older than LISTING_CHANGE_RETENTION seconds.
+
+    Meant to be run periodically, e.g. from cron.
+    """
+
+    help = 'Deletes old listing changes read by the in-process listing indexes.'
+
+    def handle(self, *args, **options):
+        deleted = prune_listing_changes()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} listing change(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sell_it_app.rate_limit import get_counters
+
+
+class Command(BaseCommand):
+    """
+    Management command showing the numbers of allowed and rate limited requests, e.g. for monitoring.
+    """
+
+    help = 'Shows the numbers of allowed and rate limited requests by URL name.'
+
+    def handle(self, *args, **options):
+        for url_name, counters in get_counters().items():
+            self.stdout.write(f"{url_name}\tallowed={counters['allowed']}\tlimited={counters['limited']}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sell_it_app.category_stats import reconcile_category_stats
+
+
+class Command(BaseCommand):
+    """
+    Management command recomputing the statistics of all categories from their listings.
+
+    Meant to be run periodically, e.g. from cron, and once after the statistics table is created.
+    """
+
+    help = 'Recomputes the listing statistics of all categories.'
+
+    def handle(self, *args, **options):
+        count = reconcile_category_stats()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled the statistics of {count} category(ies).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sell_it_app.favourites import reconcile_favourite_counts
+
+
+class Command(BaseCommand):
+    """
+    Management command recomputing the favourite counts of all listings from the favourites.
+
+    Meant to be run periodically, e.g. from cron.
+    """
+
+    help = 'Recomputes the favourite counts of all listings.'
+
+    def handle(self, *args, **options):
+        count = reconcile_favourite_counts()
+        self.stdout.write(self.style.SUCCESS(f'Fixed the favourite counts of {count} listing(s).'))
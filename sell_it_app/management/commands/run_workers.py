@@ -0,0 +1,79 @@
+import multiprocessing
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from sell_it_app.jobs import run_queued_jobs, work
+
+
+def run_threads(name, threads, poll_interval, stop_event):
+    """
+    Runs the worker threads of one worker process until the stop event is set.
+
+    Args:
+        name (str): Name of the worker process.
+        threads (int): Number of worker threads.
+        poll_interval (float): Seconds to wait for new jobs.
+        stop_event (threading.Event | multiprocessing.Event): Event stopping the workers.
+    """
+
+    workers = [
+        threading.Thread(target=work, args=(f'{name}:{number}', stop_event, poll_interval))
+        for number in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+class Command(BaseCommand):
+    """
+    Management command running background jobs with a pool of worker processes and threads.
+
+    Stops after the running jobs are finished on SIGINT or SIGTERM.
+    """
+
+    help = 'Runs the background job workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--threads', type=int, default=1, help='Number of worker threads per process.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait for new jobs when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Run the due jobs in the current process and exit.')
+
+    def handle(self, *args, **options):
+        name = f'{socket.gethostname()}:{multiprocessing.current_process().pid}'
+        if options['burst']:
+            count = run_queued_jobs(name)
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} job(s).'))
+            return
+
+        stop_event = multiprocessing.Event()
+
+        def stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        # Forked processes must not share the database connections of the parent.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=run_threads,
+                args=(f'{name}:{number}', options['threads'], options['poll_interval'], stop_event),
+            )
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {options['processes']} process(es) with {options['threads']} thread(s) each.")
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
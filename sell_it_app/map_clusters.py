@@ -0,0 +1,161 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import Substr
+
+from sell_it_app.geo import cell_size, encode_geohash
+from sell_it_app.models import Listings
+from sell_it_app.page_cache import scoped_page_cache_version
+
+# Geohash precision of the clusters by map zoom level, cells are a few dozen pixels wide.
+ZOOM_PRECISIONS = (1, 1, 2, 2, 2, 3, 3, 4, 4, 4, 5, 5, 6, 6, 6)
+# Zoom level from which single listings are returned instead of clusters.
+PIN_ZOOM = len(ZOOM_PRECISIONS)
+# Number of geohash characters a tile is shorter than its clusters, a tile holds up to 32 ** 2 clusters.
+TILE_LEVELS = 2
+MAX_TILES = 64
+MAX_PINS = 500
+# Geohash precision of the cells selecting the candidate pins, about 5 km wide.
+PIN_TILE_PRECISION = 5
+TILE_TIMEOUT = 60 * 10
+
+
+def covering_tiles(south, west, north, east, precision):
+    """
+    Returns the geohash cells of a precision covering a bounding box.
+
+    Args:
+        south (float): Southern latitude of the box.
+        west (float): Western longitude of the box.
+        north (float): Northern latitude of the box.
+        east (float): Eastern longitude of the box, lower than west if the box crosses the antimeridian.
+        precision (int): Number of characters of the geohashes.
+
+    Returns:
+        set: The geohashes, empty if there are more than MAX_TILES.
+    """
+
+    if precision == 0:
+        return {''}
+    height, width = cell_size(precision)
+    if east < west:
+        east += 360
+    rows = int((north - south) / height) + 2
+    columns = int((east - west) / width) + 2
+    if rows * columns > MAX_TILES * 4:
+        return set()
+    tiles = set()
+    for row in range(rows):
+        lat = min(south + row * height, north)
+        for column in range(columns):
+            lon = min(west + column * width, east)
+            tiles.add(encode_geohash(lat, (lon + 180) % 360 - 180, precision))
+    return tiles if len(tiles) <= MAX_TILES else set()
+
+
+def tile_cache_key(tile, precision, version):
+    return f'map_tile:{version}:{precision}:{tile}'
+
+
+def load_tiles(tiles, precision):
+    """
+    Counts the active listings of tiles by cluster cell, with one grouped query.
+
+    Args:
+        tiles (Iterable[str]): Geohashes of the tiles.
+        precision (int): Geohash precision of the clusters.
+
+    Returns:
+        dict: Clusters by tile, as lists of [geohash, count, latitude, longitude].
+    """
+
+    in_tiles = Q()
+    for tile in tiles:
+        in_tiles |= Q(address_id__geohash__startswith=tile)
+    rows = (
+        Listings.objects.filter(in_tiles, status='Active', address_id__latitude__isnull=False)
+        .annotate(cell=Substr('address_id__geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), lat=Avg('address_id__latitude'), lon=Avg('address_id__longitude'))
+        .order_by()
+    )
+    clusters = {tile: [] for tile in tiles}
+    tile_length = max(precision - TILE_LEVELS, 0)
+    for row in rows:
+        clusters[row['cell'][:tile_length]].append([row['cell'], row['count'], row['lat'], row['lon']])
+    return clusters
+
+
+def get_clusters(south, west, north, east, zoom):
+    """
+    Returns the clusters of active listings within a bounding box at a zoom level.
+
+    Clusters are grouped by geohash cells of the precision of the zoom level, and computed
+    for whole tiles of cells, cached for every zoom level until listings or addresses
+    change. Clusters are located at the average position of their listings.
+
+    Args:
+        south (float): Southern latitude of the box.
+        west (float): Western longitude of the box.
+        north (float): Northern latitude of the box.
+        east (float): Eastern longitude of the box.
+        zoom (int): Zoom level of the map, lower than PIN_ZOOM.
+
+    Returns:
+        list: Clusters as dicts with their 'geohash', 'count', 'lat' and 'lon'.
+    """
+
+    precision = ZOOM_PRECISIONS[zoom]
+    tiles = covering_tiles(south, west, north, east, max(precision - TILE_LEVELS, 0))
+    while not tiles:
+        # The box covers too many tiles, e.g. on a large screen: use larger clusters and tiles.
+        precision -= 1
+        tiles = covering_tiles(south, west, north, east, max(precision - TILE_LEVELS, 0))
+
+    version = scoped_page_cache_version(['map'])
+    keys = {tile_cache_key(tile, precision, version): tile for tile in tiles}
+    clusters = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    missing = tiles - set(clusters)
+    if missing:
+        loaded = load_tiles(missing, precision)
+        cache.set_many({tile_cache_key(tile, precision, version): value for tile, value in loaded.items()}, TILE_TIMEOUT)
+        clusters.update(loaded)
+
+    crosses_antimeridian = east < west
+    return [
+        {'geohash': cell, 'count': count, 'lat': lat, 'lon': lon}
+        for tile_clusters in clusters.values()
+        for cell, count, lat, lon in tile_clusters
+        if south <= lat <= north and ((lon >= west or lon <= east) if crosses_antimeridian else west <= lon <= east)
+    ]
+
+
+def get_pins(south, west, north, east):
+    """
+    Returns the single active listings within a bounding box, at most MAX_PINS.
+
+    Candidates are selected with the indexed geohash prefixes of the cells covering the box.
+
+    Args:
+        south (float): Southern latitude of the box.
+        west (float): Western longitude of the box.
+        north (float): Northern latitude of the box.
+        east (float): Eastern longitude of the box.
+
+    Returns:
+        list: Listings as dicts with their 'id', 'title', 'price', 'lat' and 'lon'.
+    """
+
+    in_longitudes = Q(address_id__longitude__gte=west, address_id__longitude__lte=east)
+    if east < west:
+        in_longitudes = Q(address_id__longitude__gte=west) | Q(address_id__longitude__lte=east)
+    in_tiles = Q()
+    for tile in covering_tiles(south, west, north, east, PIN_TILE_PRECISION):
+        in_tiles |= Q(address_id__geohash__startswith=tile)
+    listings = (
+        Listings.objects.filter(in_tiles, in_longitudes, status='Active', address_id__latitude__gte=south,
+                                address_id__latitude__lte=north)
+        .order_by('-add_date')
+        .values_list('id', 'title', 'price', 'address_id__latitude', 'address_id__longitude')[:MAX_PINS]
+    )
+    return [{'id': listing_id, 'title': title, 'price': str(price), 'lat': lat, 'lon': lon}
+            for listing_id, title, price, lat, lon in listings]
@@ -0,0 +1,37 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from sell_it_app.object_cache import start_identity_map, end_identity_map
+
+
+class IdentityMapMiddleware:
+    """
+    Middleware giving every request its own identity map of cached objects.
+
+    Objects looked up with get_cached_object() are loaded at most once per request.
+    Supports both WSGI and ASGI, so asynchronous views like the message event stream
+    are not moved to a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = start_identity_map()
+        try:
+            return self.get_response(request)
+        finally:
+            end_identity_map(token)
+
+    async def __acall__(self, request):
+        token = start_identity_map()
+        try:
+            return await self.get_response(request)
+        finally:
+            end_identity_map(token)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0015_alter_picture_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listings',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
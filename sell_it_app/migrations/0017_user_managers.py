@@ -0,0 +1,20 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:36
+
+from django.db import migrations
+import sell_it_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0016_listings_card_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', sell_it_app.models.UserManager()),
+            ],
+        ),
+    ]
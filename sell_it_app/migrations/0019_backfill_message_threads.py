@@ -0,0 +1,51 @@
+from django.db import migrations
+
+REPLY_PREFIX = 'RE: '
+
+
+def conversation_title(title):
+    while title.startswith(REPLY_PREFIX):
+        title = title[len(REPLY_PREFIX):]
+    return title
+
+
+def backfill_message_threads(apps, schema_editor):
+    """
+    Groups the existing messages into conversations.
+
+    Replies were linked to their original message only by the 'RE: ' title prefix, so
+    messages with the same title between the same users form one conversation.
+    """
+
+    Messages = apps.get_model('sell_it_app', 'Messages')
+    Thread = apps.get_model('sell_it_app', 'Thread')
+    ThreadParticipant = apps.get_model('sell_it_app', 'ThreadParticipant')
+
+    threads = {}
+    for message in Messages.objects.filter(thread__isnull=True).order_by('date_sent', 'id').iterator():
+        title = conversation_title(message.title)
+        users = frozenset({message.from_user_id, message.to_user_id} - {None})
+        key = (title, users, message.from_unregistered_user)
+        if key not in threads:
+            threads[key] = Thread.objects.create(title=title)
+            ThreadParticipant.objects.bulk_create(
+                [ThreadParticipant(thread=threads[key], user_id=user_id) for user_id in users])
+        thread = threads[key]
+        Messages.objects.filter(id=message.id).update(thread=thread)
+        Thread.objects.filter(id=thread.id).update(last_message=message)
+        ThreadParticipant.objects.filter(thread=thread).update(last_message_date=message.date_sent)
+        if message.status == 'Unread':
+            participant = ThreadParticipant.objects.get(thread=thread, user_id=message.to_user_id)
+            participant.unread_count += 1
+            participant.save(update_fields=['unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0018_message_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_message_threads, migrations.RunPython.noop),
+    ]
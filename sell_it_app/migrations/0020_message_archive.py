@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0019_backfill_message_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_unregistered_user', models.EmailField(blank=True, max_length=254, null=True)),
+                ('title', models.CharField(max_length=60)),
+                ('message', models.TextField(max_length=1000)),
+                ('date_sent', models.DateTimeField()),
+                ('date_archived', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='messages',
+            index=models.Index(fields=['status', 'date_sent'], name='message_status_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='from_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='from_archived_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sell_it_app.thread'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='to_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='to_archived_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessage',
+            index=models.Index(fields=['to_user', '-date_sent'], name='archive_to_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessage',
+            index=models.Index(fields=['from_user', '-date_sent'], name='archive_from_user_idx'),
+        ),
+    ]
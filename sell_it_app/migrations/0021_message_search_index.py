@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0020_message_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messages',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('title', 'message', config='simple'), name='message_search_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, Min
+from django.db.models.functions import Lower, Trim
+
+
+def dedupe_newsletter_emails(apps, schema_editor):
+    """
+    Normalizes the subscribed emails and removes duplicates, keeping the oldest subscription.
+    """
+
+    Newsletter = apps.get_model('sell_it_app', 'Newsletter')
+    Newsletter.objects.update(email=Lower(Trim('email')))
+    duplicates = (
+        Newsletter.objects.values('email')
+        .annotate(first_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates.iterator():
+        Newsletter.objects.filter(email=duplicate['email']).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0023_newsletter_campaign'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_newsletter_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-19 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0024_dedupe_newsletter_emails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsletter',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0025_newsletter_email_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(fields=['category_id', '-add_date'], name='listing_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(fields=['category_id', 'price'], include=('condition', 'offer_type', 'promotion', 'address_id'), name='listing_category_facet_idx'),
+        ),
+    ]
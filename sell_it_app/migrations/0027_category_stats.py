@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0026_listing_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sell_it_app.category')),
+                ('active_count', models.IntegerField(default=0)),
+                ('new_count', models.IntegerField(default=0)),
+                ('used_count', models.IntegerField(default=0)),
+                ('newest_add_date', models.DateTimeField(blank=True, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('median_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0031_saved_searches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('previous_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='sell_it_app.listings')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('price_change', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='sell_it_app.listingprice')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['user'], name='price_alert_pending_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricealert',
+            constraint=models.UniqueConstraint(fields=('user', 'price_change'), name='unique_price_alert'),
+        ),
+        migrations.AddIndex(
+            model_name='listingprice',
+            index=models.Index(fields=['listing', '-changed_at'], name='listing_price_date_idx'),
+        ),
+    ]
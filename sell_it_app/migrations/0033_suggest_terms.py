@@ -0,0 +1,22 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0032_price_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=100, unique=True)),
+                ('listing_count', models.IntegerField(default=0)),
+                ('search_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
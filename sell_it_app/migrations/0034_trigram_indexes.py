@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Installs pg_trgm and indexes the trigrams of the listing titles and of the suggested words,
+    where the extension is available. Searches fall back to an in-process trigram index otherwise.
+    """
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS listing_title_trgm_idx '
+                          'ON sell_it_app_listings USING gin (UPPER(title) gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS suggest_term_trgm_idx '
+                          'ON sell_it_app_suggestterm USING gin (text gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS listing_title_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS suggest_term_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0033_suggest_terms'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-19 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sell_it_app', '0036_campaign_claims'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listings',
+            name='listing_category_facet_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listings',
+            index=models.Index(condition=models.Q(('status', 'Active')), fields=['category_id', 'price'], include=('condition', 'offer_type', 'promotion', 'address_id'), name='listing_category_facet_idx'),
+        ),
+    ]
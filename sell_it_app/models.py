@@ -1,10 +1,21 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.core.validators import RegexValidator, FileExtensionValidator
 from django.db import models
+from django.utils import timezone
+
+from sell_it_app.query_cache import QueryCacheQuerySet, CachedManager
 
 # Create your models here.
 
 
+class UserManager(BaseUserManager.from_queryset(QueryCacheQuerySet)):
+    """
+    Manager of users, whose querysets can be read from the query cache with cached().
+    """
+
+
 class User(AbstractUser):
     """
     Custom user model representing users in the system.
@@ -16,6 +27,7 @@ class User(AbstractUser):
         gender (str): Field representing the gender of the user. Defaults to 'F' for Female.
         phone_number (str): Field representing the phone number of the user. Must be 9 digits.
         date_of_birth (datetime.date): Field representing the date of birth of the user.
+        objects (UserManager): Manager of users, supporting cached() querysets.
     """
 
     GENDER_CHOICES = (
@@ -32,6 +44,8 @@ class User(AbstractUser):
                                    message='Phone number must have 9 digits!')])
     date_of_birth = models.DateField(null=True, blank=True)
 
+    objects = UserManager()
+
     def __str__(self):
         return self.username
 
@@ -44,6 +58,7 @@ class Category(models.Model):
         CATEGORY_CHOICES (tuple): Choices for category selection.
         name (str): Field representing the name of the category.
         description (str): Field representing the description of the category.
+        objects (CachedManager): Manager reading all querysets from the query cache.
     """
 
     CATEGORY_CHOICES = (
@@ -58,6 +73,8 @@ class Category(models.Model):
     name = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='Market')
     description = models.TextField(max_length=255, blank=True)
 
+    objects = CachedManager()
+
 
 class Address(models.Model):
     """
@@ -70,6 +87,9 @@ class Address(models.Model):
         city (str): Field representing the city of the address.
         postal_code (str): Field representing the postal code of the address.
         country (str): Field representing the country of the address.
+        latitude (float): Field representing the latitude of the address, located with the offline gazetteer.
+        longitude (float): Field representing the longitude of the address.
+        geohash (str): Field representing the geohash of the coordinates, indexed for distance searches.
     """
 
     user_id = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -78,6 +98,56 @@ class Address(models.Model):
     city = models.CharField(max_length=50)
     postal_code = models.CharField(max_length=6)
     country = models.CharField(max_length=50)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+
+
+class Thread(models.Model):
+    """
+    Model representing a conversation, a thread of messages with their replies.
+
+    Attributes:
+        title (str): Field representing the title of the conversation.
+        listing (int): Field representing the ID of the listing the conversation is about.
+        last_message (int): Field representing the ID of the latest message of the conversation.
+    """
+
+    title = models.CharField(max_length=60)
+    listing = models.ForeignKey('Listings', null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='threads')
+    last_message = models.ForeignKey('Messages', null=True, blank=True, on_delete=models.SET_NULL,
+                                     related_name='+')
+
+    def __str__(self):
+        return self.title
+
+
+class ThreadParticipant(models.Model):
+    """
+    Model representing a user taking part in a conversation, listed in the user's inbox.
+
+    Attributes:
+        thread (int): Field representing the ID of the conversation.
+        user (int): Field representing the ID of the participating user.
+        last_message_date (datetime.datetime): Field representing the date of the latest message
+            of the conversation, the inbox is ordered by it.
+        unread_count (int): Field representing the number of unread messages sent to the user
+            in the conversation.
+    """
+
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='threads')
+    last_message_date = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['thread', 'user'], name='unique_thread_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_message_date'], name='participant_inbox_idx'),
+        ]
 
 
 class Messages(models.Model):
@@ -93,6 +163,7 @@ class Messages(models.Model):
         message (str): Field representing the content of the message.
         date_sent (datetime.datetime): Field representing the date the message was sent.
         status (str): Field representing the status of the message.
+        thread (int): Field representing the ID of the conversation the message belongs to.
     """
 
     STATUS_CHOICES = (
@@ -107,11 +178,54 @@ class Messages(models.Model):
     message = models.TextField(max_length=1000)
     date_sent = models.DateTimeField(auto_now_add=True)
     status = models.CharField(choices=STATUS_CHOICES, default='Unread')
+    thread = models.ForeignKey(Thread, null=True, blank=True, on_delete=models.CASCADE, related_name='messages')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['thread', 'date_sent'], name='message_thread_idx'),
+            models.Index(fields=['status', 'date_sent'], name='message_status_date_idx'),
+            GinIndex(SearchVector('title', 'message', config='simple'), name='message_search_idx'),
+        ]
 
     def __str__(self):
         return self.title, self.from_unregistered_user
 
 
+class ArchivedMessage(models.Model):
+    """
+    Model representing old read messages moved out of the Messages table.
+
+    Attributes:
+        from_user (int): Field representing the sender of the message.
+        from_unregistered_user (str): Field representing the email of an unregistered user sender.
+        to_user (int): Field representing the recipient of the message.
+        title (str): Field representing the title of the message.
+        message (str): Field representing the content of the message.
+        date_sent (datetime.datetime): Field representing the date the message was sent.
+        thread (int): Field representing the ID of the conversation the message belonged to.
+        date_archived (datetime.datetime): Field representing the date the message was archived.
+    """
+
+    from_user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name='from_archived_messages')
+    from_unregistered_user = models.EmailField(null=True, blank=True)
+    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='to_archived_messages')
+    title = models.CharField(max_length=60)
+    message = models.TextField(max_length=1000)
+    date_sent = models.DateTimeField()
+    thread = models.ForeignKey(Thread, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['to_user', '-date_sent'], name='archive_to_user_idx'),
+            models.Index(fields=['from_user', '-date_sent'], name='archive_from_user_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
 class Listings(models.Model):
     """
     Model representing listings of items for sale or exchange.
@@ -132,6 +246,10 @@ class Listings(models.Model):
         description (str): Field representing the description of the listing.
         price (decimal.Decimal): Field representing the price of the listing.
         add_date (datetime.datetime): Field representing the date the listing was added.
+        card_version (int): Field representing the version of the rendered listing card.
+            Bumped whenever the listing, its pictures or its address change.
+        favourite_count (int): Field representing the number of users who favourited the listing,
+            maintained by the Favourite signals.
     """
 
     CONDITION_CHOICES = (
@@ -167,11 +285,216 @@ class Listings(models.Model):
     description = models.TextField(max_length=2000)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     add_date = models.DateTimeField(auto_now_add=True)
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    favourite_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Category page, newest first.
+            models.Index(fields=['category_id', '-add_date'], name='listing_category_date_idx'),
+            # Facet counts of a category, see count_facets(). Only active listings are browsed, so
+            # the index covers them alone and the listing columns are read from it; the city
+            # still comes from the joined address rows, so the scan isn't index-only.
+            models.Index(fields=['category_id', 'price'], include=['condition', 'offer_type', 'promotion', 'address_id'],
+                         condition=models.Q(status='Active'), name='listing_category_facet_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class Favourite(models.Model):
+    """
+    Model representing a listing added to the favourites of a user.
+
+    Attributes:
+        user (int): Field representing the ID of the user.
+        listing (int): Field representing the ID of the favourited listing.
+        created_at (datetime.datetime): Field representing the date the listing was favourited.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favourites')
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name='favourites')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'listing'], name='unique_user_favourite'),
+        ]
+        indexes = [
+            # Favourites page, newest first.
+            models.Index(fields=['user', '-created_at'], name='favourite_user_date_idx'),
+        ]
+
+
+class ListingPrice(models.Model):
+    """
+    Model representing the price history of a listing, one row per price change.
+
+    Attributes:
+        listing (int): Field representing the ID of the listing.
+        price (decimal.Decimal): Field representing the price set by the change.
+        previous_price (decimal.Decimal): Field representing the price before the change, None for the first price.
+        changed_at (datetime.datetime): Field representing the date of the change.
+    """
+
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name='prices')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['listing', '-changed_at'], name='listing_price_date_idx'),
+        ]
+
+
+class PriceAlert(models.Model):
+    """
+    Model representing a price drop of a favourited listing to notify a user of, delivered in a digest.
+
+    Attributes:
+        user (int): Field representing the ID of the user who favourited the listing.
+        price_change (int): Field representing the ID of the price change.
+        created_at (datetime.datetime): Field representing the date the alert was created.
+        delivered_at (datetime.datetime): Field representing the date the alert was delivered, None while pending.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='price_alerts')
+    price_change = models.ForeignKey(ListingPrice, on_delete=models.CASCADE, related_name='alerts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'price_change'], name='unique_price_alert'),
+        ]
+        indexes = [
+            # Alerts pending delivery, by user.
+            models.Index(fields=['user'], condition=models.Q(delivered_at__isnull=True), name='price_alert_pending_idx'),
+        ]
+
+
+class SavedSearch(models.Model):
+    """
+    Model representing a search saved by a user, matched against new listings, see sell_it_app.saved_searches.
+
+    Attributes:
+        user (int): Field representing the ID of the user.
+        name (str): Field representing the name of the search shown to the user.
+        query (str): Field representing the words the listing titles must contain.
+        category (int): Field representing the ID of the category of the listings.
+        min_price (decimal.Decimal): Field representing the lowest price of the listings.
+        max_price (decimal.Decimal): Field representing the highest price of the listings.
+        city (str): Field representing the city of the listings.
+        percolator_key (str): Field representing the most selective criterion of the search, new
+            listings are only matched against the searches with one of their keys.
+        created_at (datetime.datetime): Field representing the date the search was saved.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True)
+    query = models.CharField(max_length=255, blank=True)
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.CASCADE)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    city = models.CharField(max_length=50, blank=True)
+    percolator_key = models.CharField(max_length=120, db_index=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SavedSearchMatch(models.Model):
+    """
+    Model representing a new listing matching a saved search, queued for notification.
+
+    Attributes:
+        saved_search (int): Field representing the ID of the saved search.
+        listing (int): Field representing the ID of the matching listing.
+        created_at (datetime.datetime): Field representing the date the listing was matched.
+        notified_at (datetime.datetime): Field representing the date the user was notified, None while queued.
+    """
+
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    listing = models.ForeignKey(Listings, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['saved_search', 'listing'], name='unique_saved_search_match'),
+        ]
+        indexes = [
+            # Matches queued for notification.
+            models.Index(fields=['created_at'], condition=models.Q(notified_at__isnull=True),
+                         name='saved_search_match_queued_idx'),
+        ]
+
+
+class CategoryStats(models.Model):
+    """
+    Model representing statistics of the active listings of a category, maintained incrementally
+    by the listing signals and reconciled periodically, see sell_it_app.category_stats.
+
+    Attributes:
+        category (int): Field representing the ID of the category.
+        active_count (int): Field representing the number of active listings.
+        new_count (int): Field representing the number of active listings in new condition.
+        used_count (int): Field representing the number of active listings in used condition.
+        newest_add_date (datetime.datetime): Field representing the date the newest active listing was added.
+        min_price (decimal.Decimal): Field representing the lowest price of the active listings.
+        max_price (decimal.Decimal): Field representing the highest price of the active listings.
+        median_price (decimal.Decimal): Field representing the median price of the active listings,
+            refreshed by a background job after changes.
+        updated_at (datetime.datetime): Field representing the date the statistics were last recomputed.
+    """
+
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    active_count = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    used_count = models.IntegerField(default=0)
+    newest_add_date = models.DateTimeField(null=True, blank=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    median_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+
+class ListingChange(models.Model):
+    """
+    Model representing a change of a listing, read by the in-process listing indexes to refresh
+    incrementally, see sell_it_app.listing_index.
+
+    Attributes:
+        listing_id (int): Field representing the ID of the created, edited or deleted listing.
+        changed_at (datetime.datetime): Field representing the date of the change.
+    """
+
+    listing_id = models.BigIntegerField()
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class SuggestTerm(models.Model):
+    """
+    Model representing a suggested search: a word of the active listing titles or a popular search
+    query, with its counts maintained incrementally, see sell_it_app.suggest.
+
+    Attributes:
+        text (str): Field representing the normalized word or query.
+        listing_count (int): Field representing the number of active listings with the word in their title.
+        search_count (int): Field representing the number of searches of the query which returned results.
+    """
+
+    text = models.CharField(max_length=100, unique=True)
+    listing_count = models.IntegerField(default=0)
+    search_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.text
+
+
 class Picture(models.Model):
     """
     Model representing pictures associated with listings.
@@ -209,7 +532,122 @@ class Newsletter(models.Model):
     Model representing a newsletter subscription.
 
     Attributes:
-        email (str): Field representing the email address of the subscriber.
+        email (str): Field representing the email address of the subscriber, normalized with
+            normalize_email() and unique.
+    """
+
+    email = models.EmailField(blank=False, null=False, unique=True)
+
+    @staticmethod
+    def normalize_email(email):
+        """
+        Normalizes an email address, so every address is subscribed once.
+
+        Args:
+            email (str): The email address.
+
+        Returns:
+            str: The stripped, lowercase email address.
+        """
+
+        return email.strip().lower()
+
+    def save(self, *args, **kwargs):
+        self.email = self.normalize_email(self.email)
+        super().save(*args, **kwargs)
+
+
+class Job(models.Model):
+    """
+    Model representing a background job, run by the workers of the run_workers management command.
+
+    Attributes:
+        STATUS_CHOICES (tuple): Choices for job status selection.
+        task (str): Field representing the registered name of the task run by the job.
+        args (list): Field representing the positional arguments of the task.
+        kwargs (dict): Field representing the keyword arguments of the task.
+        priority (int): Field representing the priority of the job, higher priorities run first.
+        status (str): Field representing the status of the job.
+        attempts (int): Field representing the number of failed attempts to run the job.
+        max_attempts (int): Field representing the number of attempts before the job fails.
+        run_at (datetime.datetime): Field representing the date the job is due, delayed after a failed attempt.
+        created_at (datetime.datetime): Field representing the date the job was queued.
+        started_at (datetime.datetime): Field representing the date the last attempt started.
+        lease_expires_at (datetime.datetime): Field representing the date the running job is considered
+            lost unless its worker renews the lease.
+        finished_at (datetime.datetime): Field representing the date the job was done or failed.
+        worker (str): Field representing the name of the worker which ran the last attempt.
+        last_error (str): Field representing the traceback of the last failed attempt.
     """
 
-    email = models.EmailField(blank=False, null=False)
+    STATUS_CHOICES = (
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    )
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
+
+
+class NewsletterCampaign(models.Model):
+    """
+    Model representing a newsletter sent to all subscribers.
+
+    Subscribers are sent the campaign in the order of their IDs, the ID of the last subscriber
+    sent to is saved after every batch, so an interrupted campaign resumes where it stopped.
+
+    Attributes:
+        STATUS_CHOICES (tuple): Choices for campaign status selection.
+        subject (str): Field representing the subject of the emails.
+        body (str): Field representing the template of the email content.
+        status (str): Field representing the status of the campaign.
+        last_subscriber_id (int): Field representing the ID of the last subscriber sent to.
+        sent_count (int): Field representing the number of emails sent.
+        claim_token (str): Field representing the token of the sender holding the campaign.
+        lease_expires_at (datetime.datetime): Field representing the date the claim of the sender expires.
+        created_at (datetime.datetime): Field representing the date the campaign was created.
+        started_at (datetime.datetime): Field representing the date sending started.
+        finished_at (datetime.datetime): Field representing the date sending finished.
+    """
+
+    STATUS_CHOICES = (
+        ('Draft', 'Draft'),
+        ('Sending', 'Sending'),
+        ('Sent', 'Sent'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Draft')
+    last_subscriber_id = models.BigIntegerField(default=0, editable=False)
+    sent_count = models.PositiveIntegerField(default=0, editable=False)
+    claim_token = models.CharField(max_length=32, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return self.subject
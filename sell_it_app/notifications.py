@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from sell_it_app.models import Messages
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Publish/subscribe broker delivering events to subscribers of the current process.
+
+    Subscribers are asyncio queues of the event loop serving the streams, events may be
+    published from any thread. Events published in other processes never arrive, so it only
+    works when the site runs as a single process, use PostgresBroker otherwise.
+
+    Attributes:
+        queue_size (int): Maximum number of events waiting for a slow subscriber, newer events are dropped.
+    """
+
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        """
+        Subscribes to the events of a channel, must be called from the event loop of the subscriber.
+
+        Args:
+            channel (str): Name of the channel.
+
+        Returns:
+            asyncio.Queue: Queue receiving the events of the channel.
+        """
+
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        """
+        Stops delivering the events of a channel to the queue.
+
+        Args:
+            channel (str): Name of the channel.
+            queue (asyncio.Queue): Queue returned by subscribe().
+        """
+
+        with self._lock:
+            subscribers = self._subscribers.get(channel, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel, event):
+        """
+        Delivers an event to all subscribers of a channel.
+
+        Args:
+            channel (str): Name of the channel.
+            event (dict): The event, with its 'type' and data.
+        """
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue, event):
+        if not queue.full():
+            queue.put_nowait(event)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Publish/subscribe broker delivering events to subscribers of all processes, with PostgreSQL LISTEN/NOTIFY.
+
+    Events are published with NOTIFY on one PostgreSQL channel, and each process serving
+    streams runs a listener thread, started with its first subscriber, which delivers them to
+    the subscribers of the process. The listener reconnects when its connection is lost,
+    events published meanwhile are lost, the streams get the current unread count when they
+    reconnect.
+
+    Attributes:
+        pg_channel (str): Name of the PostgreSQL channel.
+        poll_timeout (int): Seconds the listener waits for notifications before checking its connection.
+    """
+
+    pg_channel = 'sell_it_notifications'
+    poll_timeout = 5
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._stopped = threading.Event()
+        self.listening = threading.Event()
+
+    def subscribe(self, channel):
+        queue = super().subscribe(channel)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='notifications-listener', daemon=True)
+                self._listener.start()
+        return queue
+
+    def publish(self, channel, event):
+        """
+        Notifies all processes of an event, delivered once the current transaction is committed.
+
+        Args:
+            channel (str): Name of the channel.
+            event (dict): The event, with its 'type' and data.
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, json.dumps([channel, event])])
+
+    def stop(self):
+        """
+        Stops the listener thread and closes its connection.
+        """
+
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.join()
+
+    def _listen(self):
+        database = connections[DEFAULT_DB_ALIAS]
+        while not self._stopped.is_set():
+            try:
+                listener = database.get_new_connection(database.get_connection_params())
+                try:
+                    listener.autocommit = True
+                    listener.cursor().execute(f'LISTEN {self.pg_channel}')
+                    self.listening.set()
+                    while not self._stopped.is_set():
+                        select.select([listener], [], [], self.poll_timeout)
+                        listener.poll()
+                        while listener.notifies:
+                            channel, event = json.loads(listener.notifies.pop(0).payload)
+                            super().publish(channel, event)
+                finally:
+                    self.listening.clear()
+                    listener.close()
+            except Exception:
+                logger.exception('Notifications listener failed, reconnecting')
+                self._stopped.wait(self.poll_timeout)
+
+
+_broker = None
+
+
+def get_broker():
+    """
+    Returns the broker configured with the NOTIFICATIONS_BROKER setting.
+
+    Returns:
+        InProcessBroker: The broker of the current process, e.g. a PostgresBroker.
+    """
+
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'NOTIFICATIONS_BROKER', 'sell_it_app.notifications.PostgresBroker'))()
+    return _broker
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def unread_message_count(user_id):
+    """
+    Returns the number of unread messages of a user.
+
+    Args:
+        user_id (int): ID of the user.
+
+    Returns:
+        int: The number of unread messages.
+    """
+
+    return Messages.objects.filter(to_user_id=user_id, status='Unread').count()
+
+
+def format_event(event):
+    """
+    Formats an event as a Server-Sent Event.
+
+    Args:
+        event (dict): The event, with its 'type' and data.
+
+    Returns:
+        str: The event in the text/event-stream format.
+    """
+
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def publish_unread_counts(user_ids):
+    """
+    Publishes the unread message counts of users once the current transaction is committed.
+
+    The counts of all users are read with one query. Nothing is published when notifications
+    aren't streamed, see the NOTIFICATIONS_STREAMING setting.
+
+    Args:
+        user_ids (Iterable[int]): IDs of the users.
+    """
+
+    user_ids = set(user_ids)
+    if not user_ids or not settings.NOTIFICATIONS_STREAMING:
+        return
+
+    def publish():
+        counts = dict(
+            Messages.objects.filter(to_user_id__in=user_ids, status='Unread')
+            .values_list('to_user_id')
+            .annotate(count=Count('id'))
+        )
+        for user_id in user_ids:
+            get_broker().publish(user_channel(user_id), {'type': 'unread', 'count': counts.get(user_id, 0)})
+
+    transaction.on_commit(publish)
+
+
+def publish_new_message(message):
+    """
+    Notifies the recipient of a new message once the current transaction is committed, unless
+    notifications aren't streamed.
+
+    Args:
+        message (Messages): The new message.
+    """
+
+    if not settings.NOTIFICATIONS_STREAMING:
+        return
+    event = {
+        'type': 'new-message',
+        'title': message.title,
+        'sender': message.from_user.username if message.from_user_id else message.from_unregistered_user,
+        'thread': message.thread_id,
+    }
+    transaction.on_commit(lambda: get_broker().publish(user_channel(message.to_user_id), event))
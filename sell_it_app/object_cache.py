@@ -0,0 +1,118 @@
+import contextvars
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+OBJECT_CACHE_TIMEOUT = 60 * 15
+
+# Objects loaded during the current request, see IdentityMapMiddleware.
+_identity_map = contextvars.ContextVar('identity_map', default=None)
+
+
+def object_cache_key(model, pk):
+    """
+    Builds the cache key of a model instance.
+
+    Args:
+        model (Model): Model class.
+        pk: Primary key of the instance.
+
+    Returns:
+        str: Cache key for the instance.
+    """
+
+    return f'object_cache:{model._meta.label_lower}:{pk}'
+
+
+def start_identity_map():
+    """
+    Starts a new identity map for the current request.
+
+    Returns:
+        Token: Token passed to end_identity_map().
+    """
+
+    return _identity_map.set({})
+
+
+def end_identity_map(token):
+    """
+    Ends the identity map started with start_identity_map().
+
+    Args:
+        token (Token): Token returned by start_identity_map().
+    """
+
+    _identity_map.reset(token)
+
+
+def get_cached_object(model, pk):
+    """
+    Returns a model instance by primary key.
+
+    The instance is looked up in the identity map of the current request, then in
+    the shared cache and finally in the database.
+
+    Args:
+        model (Model): Model class.
+        pk: Primary key of the instance.
+
+    Returns:
+        Model: The model instance.
+
+    Raises:
+        DoesNotExist: If there is no instance with the given primary key.
+    """
+
+    pk = model._meta.pk.to_python(pk)
+    key = object_cache_key(model, pk)
+    identity_map = _identity_map.get()
+    if identity_map is not None and key in identity_map:
+        return identity_map[key]
+
+    obj = cache.get(key)
+    if obj is None:
+        obj = model._default_manager.get(pk=pk)
+        cache.set(key, obj, OBJECT_CACHE_TIMEOUT)
+
+    if identity_map is not None:
+        identity_map[key] = obj
+    return obj
+
+
+def get_cached_object_or_404(model, pk):
+    """
+    Returns a model instance by primary key using get_cached_object() or raises Http404.
+
+    Args:
+        model (Model): Model class.
+        pk: Primary key of the instance.
+
+    Returns:
+        Model: The model instance.
+
+    Raises:
+        Http404: If there is no instance with the given primary key.
+    """
+
+    try:
+        return get_cached_object(model, pk)
+    except (model.DoesNotExist, ValidationError):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+def invalidate_cached_object(model, pk):
+    """
+    Removes a model instance from the shared cache and the identity map of the current request.
+
+    Args:
+        model (Model): Model class.
+        pk: Primary key of the instance.
+    """
+
+    key = object_cache_key(model, pk)
+    cache.delete(key)
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        identity_map.pop(key, None)
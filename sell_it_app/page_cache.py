@@ -0,0 +1,280 @@
+import hashlib
+import random
+import re
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from sell_it_app.cache_versions import bump_version, get_version, get_versions
+from sell_it_app.favourites import fill_favourite_buttons
+from sell_it_app.models import Avatars, Listings
+
+PAGE_CACHE_VERSION_KEY = 'page_cache:version'
+# Number of seconds a page is kept in the cache.
+PAGE_CACHE_TIMEOUT = 60 * 5
+# Number of promoted listings shown in the carousel of the index page.
+CAROUSEL_SIZE = 3
+PERSONAL_FRAGMENT_MARKER = '<!--personal:%s-->'
+PERSONAL_FRAGMENT_PATTERN = re.compile(r'<!--personal:(\w+)-->')
+
+
+def seller_card_context(request):
+    """
+    Builds the context for the seller card shown on the listing page.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        dict: Context with the avatar of the current user.
+    """
+
+    if request.user.is_authenticated:
+        return {'avatar': Avatars.objects.filter(user_id=request.user).last()}
+    return {'avatar': None}
+
+
+def load_promoted_slides():
+    """
+    Reads the slides of the promoted listings shown in the carousel of the index page.
+
+    Returns:
+        list: Slides as dicts with the listing 'id', 'title', 'category' name and 'picture_url'.
+    """
+
+    slides = []
+    listings = Listings.objects.filter(promotion='Promoted').select_related('category_id').prefetch_related('pictures')
+    for listing in listings:
+        pictures = sorted(listing.pictures.all(), key=lambda picture: picture.id)
+        slides.append({
+            'id': listing.id,
+            'title': listing.title,
+            'category': listing.category_id.name,
+            'picture_url': pictures[0].image.url if pictures else '',
+        })
+    return slides
+
+
+def promoted_carousel_context(request):
+    """
+    Builds the context for the carousel of the index page, with promoted listings picked at random for every request.
+
+    The slides are read once per version of the index page and kept in the cache.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        dict: Context with the 'carousel' slides.
+    """
+
+    key = f'promoted_slides:{scoped_page_cache_version(["index"])}'
+    slides = cache.get_or_set(key, load_promoted_slides, PAGE_CACHE_TIMEOUT)
+    return {'carousel': random.sample(slides, min(CAROUSEL_SIZE, len(slides)))}
+
+
+# Fragments of a page that depend on the current user or change with every request. They
+# are left as markers in the cached page and rendered for every request.
+PERSONAL_FRAGMENTS = {
+    'header': ('sell_it_app/partials/header.html', None),
+    'newsletter_form': ('sell_it_app/partials/newsletter_form.html', None),
+    'seller_card': ('sell_it_app/partials/seller_card.html', seller_card_context),
+    'save_search_form': ('sell_it_app/partials/save_search_form.html', None),
+    'promoted_carousel': ('sell_it_app/partials/promoted_carousel.html', promoted_carousel_context),
+}
+
+
+def page_cache_version():
+    """
+    Returns the current version of the page cache.
+
+    Returns:
+        int: Version number included in every page cache key.
+    """
+
+    return get_version(PAGE_CACHE_VERSION_KEY)
+
+
+def bump_page_cache_version():
+    """
+    Invalidates all cached pages by moving to a new page cache version.
+    """
+
+    bump_version(PAGE_CACHE_VERSION_KEY)
+
+
+def page_scope_version_key(scope):
+    return f'{PAGE_CACHE_VERSION_KEY}:{scope}'
+
+
+def scoped_page_cache_version(scopes):
+    """
+    Returns the version of the pages depending on scopes of data, e.g. 'listing:12' for the page
+    of a listing or 'category:3' for the pages of a category.
+
+    Args:
+        scopes (Iterable[str]): The scopes.
+
+    Returns:
+        str: The version of the page cache followed by the versions of the scopes, all read with one cache query.
+    """
+
+    keys = [PAGE_CACHE_VERSION_KEY] + [page_scope_version_key(scope) for scope in scopes]
+    versions = get_versions(keys)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_page_scopes(scopes):
+    """
+    Invalidates the cached pages depending on scopes of data, leaving the other pages cached.
+
+    Args:
+        scopes (Iterable[str]): The scopes, see scoped_page_cache_version().
+    """
+
+    for scope in set(scopes):
+        bump_version(page_scope_version_key(scope))
+
+
+def listing_page_scopes(listing_id, category_id):
+    """
+    Returns the scopes of the cached pages showing a listing: its own page, the pages of its
+    category, the index page and the map tiles.
+
+    Args:
+        listing_id (int): ID of the listing.
+        category_id (int): ID of its category.
+
+    Returns:
+        list: The scopes.
+    """
+
+    return [f'listing:{listing_id}', f'category:{category_id}', 'index', 'map']
+
+
+def page_cache_key(request, params, scopes=()):
+    """
+    Builds the page cache key for a request.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+        params (tuple): Names of the query parameters that change the page content.
+        scopes (tuple): Scopes of the data shown on the page, see scoped_page_cache_version().
+
+    Returns:
+        str: Cache key for the page.
+    """
+
+    query = '&'.join(f'{name}={request.GET.get(name, "")}' for name in sorted(params))
+    url = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'page_cache:{scoped_page_cache_version(scopes)}:{url}'
+
+
+def render_personal_fragment(name, request):
+    """
+    Renders a single user-specific fragment for the current request.
+
+    Args:
+        name (str): Name of the fragment in PERSONAL_FRAGMENTS.
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        str: Rendered fragment.
+    """
+
+    template_name, get_context = PERSONAL_FRAGMENTS[name]
+    ctx = get_context(request) if get_context else {}
+    return render_to_string(template_name, ctx, request=request)
+
+
+def fill_personal_fragments(content, request):
+    """
+    Replaces the fragment markers in a cached page with fragments rendered for the current request.
+
+    Favourite buttons of the listings on the page are filled in too, looking up the
+    favourites of the user once for the whole page.
+
+    Args:
+        content (str): Cached page content.
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        str: Page content ready to be sent to the user.
+    """
+
+    content = PERSONAL_FRAGMENT_PATTERN.sub(lambda match: render_personal_fragment(match.group(1), request), content)
+    return fill_favourite_buttons(content, request)
+
+
+class PageCacheMixin:
+    """
+    Mixin serving GET requests from a shared page cache.
+
+    The page is rendered once with markers in place of user-specific fragments
+    (see PERSONAL_FRAGMENTS) and stored in the cache. Every request fills in the
+    markers, so anonymous and logged-in users share the same cached page.
+    Cached pages are invalidated by the scopes of data they show, see get_page_cache_scopes()
+    and bump_page_scopes(), or all at once by bump_page_cache_version(). Pages are read with
+    cache.get_or_set(), so an expired hot page is rendered by a single request.
+
+    Attributes:
+        page_cache_params (tuple): Query parameters included in the cache key.
+        page_cache_timeout (int): Number of seconds a page is kept in the cache.
+    """
+
+    page_cache_params = ()
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def get_page_cache_scopes(self, **kwargs):
+        """
+        Returns the scopes of the data shown on the page, pages without scopes change only with
+        the version of the whole page cache.
+
+        Args:
+            **kwargs: Arguments of the view from the URL.
+
+        Returns:
+            tuple: The scopes, see scoped_page_cache_version().
+        """
+
+        return ()
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Serves the page from the cache or renders it and stores it in the cache.
+
+        Requests with pending flash messages bypass the cache, as messages are a part of the page body.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            HttpResponse: The page with user-specific fragments rendered for the current request.
+        """
+
+        if request.method != 'GET' or len(get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+        rendered = {}
+
+        def render_page():
+            request.punch_holes = True
+            try:
+                response = super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+            finally:
+                request.punch_holes = False
+            rendered['response'] = response
+            if response.status_code != 200 or response.streaming:
+                return None
+            return response.content.decode(response.charset)
+
+        key = page_cache_key(request, self.page_cache_params, self.get_page_cache_scopes(**kwargs))
+        content = cache.get_or_set(key, render_page, self.page_cache_timeout)
+        if content is None:
+            return rendered.get('response') or super().dispatch(request, *args, **kwargs)
+
+        response = rendered.get('response') or HttpResponse()
+        response.content = fill_personal_fragments(content, request)
+        return response
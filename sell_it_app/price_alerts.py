@@ -0,0 +1,148 @@
+import itertools
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from sell_it_app.models import Favourite, ListingPrice, Messages, PriceAlert
+
+
+def record_price_change(listing, previous_price):
+    """
+    Records the price of a saved listing in its price history, if the price changed.
+
+    Args:
+        listing (Listings): The saved listing.
+        previous_price (decimal.Decimal): Price of the listing before the change, None for new listings.
+
+    Returns:
+        ListingPrice: The recorded change, None if the price didn't change.
+    """
+
+    if previous_price is not None and listing.price == previous_price:
+        return None
+    return ListingPrice.objects.create(listing=listing, price=listing.price, previous_price=previous_price)
+
+
+def is_price_drop(price_change, listing):
+    """
+    Checks whether a recorded price change lowered the price of an active listing.
+
+    Args:
+        price_change (ListingPrice): The change, None if the price didn't change.
+        listing (Listings): The listing.
+
+    Returns:
+        bool: True for price drops.
+    """
+
+    return (price_change is not None and price_change.previous_price is not None
+            and price_change.price < price_change.previous_price and listing.status == 'Active')
+
+
+def fan_out_price_drop(price_change_id, batch_size=None):
+    """
+    Creates a price alert for every user who favourited the listing of a price drop.
+
+    Favourites are streamed in the order of their IDs and alerts are inserted with one
+    multi-row INSERT per batch, so the number of queries grows with the number of batches
+    rather than of users. Alerts already created are skipped, so running it again after a
+    crash is safe.
+
+    Args:
+        price_change_id (int): ID of the price change.
+        batch_size (int): Number of alerts inserted at once, PRICE_ALERT_BATCH_SIZE by default.
+
+    Returns:
+        int: The number of users alerted.
+    """
+
+    batch_size = batch_size or settings.PRICE_ALERT_BATCH_SIZE
+    price_change = ListingPrice.objects.filter(id=price_change_id).first()
+    if price_change is None:
+        return 0
+
+    user_ids = (
+        Favourite.objects.filter(listing_id=price_change.listing_id)
+        .order_by('id')
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    alerted = 0
+    while batch := list(itertools.islice(user_ids, batch_size)):
+        PriceAlert.objects.bulk_create(
+            [PriceAlert(user_id=user_id, price_change=price_change) for user_id in batch],
+            ignore_conflicts=True,
+        )
+        alerted += len(batch)
+    return alerted
+
+
+def format_digest(alerts):
+    """
+    Builds the digest message of the price alerts of a user, one line per listing.
+
+    Several drops of the same listing are shown as a single drop, from the price before the
+    first one to the current price. Listings whose price went back up, or which are no longer
+    active, are left out.
+
+    Args:
+        alerts (list): Alerts of the user, with their price change and listing, oldest first.
+
+    Returns:
+        str: The message, None if no listing is left.
+    """
+
+    previous_prices = {}
+    for alert in alerts:
+        previous_prices.setdefault(alert.price_change.listing, alert.price_change.previous_price)
+    lines = ['Prices dropped on your favourite listings:']
+    for listing, previous_price in previous_prices.items():
+        if listing.status == 'Active' and listing.price < previous_price:
+            lines.append(f'- {listing.title}: {previous_price} USD -> {listing.price} USD, '
+                         f'{reverse("listing-details", args=[listing.id])}')
+    return '\n'.join(lines)[:1000] if len(lines) > 1 else None
+
+
+def deliver_price_alert_digests(batch_size=None):
+    """
+    Delivers the pending price alerts as digests, one inbox message per user.
+
+    Users are handled in batches, each one in its own transaction, with their alerts locked so
+    concurrent workers never deliver the same alert twice, see format_digest().
+
+    Args:
+        batch_size (int): Number of users handled per transaction, PRICE_ALERT_BATCH_SIZE by default.
+
+    Returns:
+        int: The number of digests sent.
+    """
+
+    batch_size = batch_size or settings.PRICE_ALERT_BATCH_SIZE
+    sent = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            PriceAlert.objects.filter(delivered_at__isnull=True, user_id__gt=last_user_id)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not user_ids:
+            return sent
+        last_user_id = user_ids[-1]
+        with transaction.atomic():
+            alerts = list(
+                PriceAlert.objects.filter(delivered_at__isnull=True, user_id__in=user_ids)
+                .select_related('price_change__listing')
+                .order_by('user_id', 'id')
+                .select_for_update(skip_locked=True, of=('self',))
+            )
+            for user_id, user_alerts in itertools.groupby(alerts, key=lambda alert: alert.user_id):
+                message = format_digest(list(user_alerts))
+                if message is not None:
+                    Messages.objects.create(to_user_id=user_id, title='Price drops on your favourites',
+                                            message=message)
+                    sent += 1
+            PriceAlert.objects.filter(id__in=[alert.id for alert in alerts]).update(delivered_at=timezone.now())
@@ -0,0 +1,134 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+
+from sell_it_app.cache_versions import bump_version, get_versions
+
+QUERY_CACHE_TIMEOUT = 60 * 60
+# Tables whose writes are tracked, only queries reading these tables are cached.
+QUERY_CACHE_TABLES = set()
+
+
+def table_generation_key(table):
+    return f'query_cache:table:{table}'
+
+
+def bump_table_generation(table):
+    """
+    Invalidates all cached query results reading the table.
+
+    Args:
+        table (str): Name of the database table.
+    """
+
+    bump_version(table_generation_key(table))
+
+
+def track_table_writes(*models_to_track):
+    """
+    Enables the query cache for the tables of the models.
+
+    Every save or delete of an instance invalidates the cached query results of its table.
+
+    Args:
+        *models_to_track (Model): Model classes.
+    """
+
+    for model in models_to_track:
+        QUERY_CACHE_TABLES.add(model._meta.db_table)
+        post_save.connect(_invalidate_model_table, sender=model, weak=False)
+        post_delete.connect(_invalidate_model_table, sender=model, weak=False)
+
+
+def _invalidate_model_table(sender, **kwargs):
+    bump_table_generation(sender._meta.db_table)
+
+
+class QueryCacheQuerySet(models.QuerySet):
+    """
+    QuerySet able to cache its results by SQL and parameters.
+
+    Caching is enabled with cached(). Results are cached only if every table of the
+    query is registered with track_table_writes(), and are invalidated by any write
+    to one of those tables.
+    """
+
+    _cache_results = False
+
+    def cached(self):
+        """
+        Returns a copy of the QuerySet whose results are read from the query cache.
+        """
+
+        clone = self._chain()
+        clone._cache_results = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_results = self._cache_results
+        return clone
+
+    def _query_cache_key(self):
+        if self._prefetch_related_lookups:
+            return None
+        compiler = self.query.get_compiler(using=self.db)
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            return None
+        # The tables are known once the query is compiled.
+        tables = {alias.table_name for alias in compiler.query.alias_map.values()}
+        if not tables or not tables <= QUERY_CACHE_TABLES:
+            return None
+
+        generation_keys = [table_generation_key(table) for table in sorted(tables)]
+        generations = get_versions(generation_keys)
+        state = [self._iterable_class.__name__, self.db, sql, repr(params)]
+        state += [f'{key}={generations[key]}' for key in generation_keys]
+        return 'query_cache:' + hashlib.md5('\n'.join(state).encode()).hexdigest()
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cache_results:
+            key = self._query_cache_key()
+            if key is not None:
+                result = cache.get(key)
+                if result is None:
+                    super()._fetch_all()
+                    cache.set(key, self._result_cache, QUERY_CACHE_TIMEOUT)
+                else:
+                    self._result_cache = result
+                return
+        super()._fetch_all()
+
+    def _bump_table_generation(self):
+        bump_table_generation(self.model._meta.db_table)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._bump_table_generation()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        self._bump_table_generation()
+        return objs
+
+    def _raw_delete(self, using):
+        rows = super()._raw_delete(using)
+        self._bump_table_generation()
+        return rows
+
+
+class CachedManager(models.Manager.from_queryset(QueryCacheQuerySet)):
+    """
+    Manager of rarely-changing models, reading all query results from the query cache.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().cached()
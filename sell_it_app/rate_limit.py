@@ -0,0 +1,192 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+RATE_LIMIT_KEY = 'rate_limit:%s:%s:%s'
+COUNTER_KEY = 'rate_limit:counter:%s:%s'
+COUNTERS = ('allowed', 'limited')
+
+
+def rate_limit_cache():
+    """
+    Returns the cache holding the rate limit counters, shared by all processes.
+
+    It is a dedicated cache, see the 'rate_limit' alias of the CACHES setting, so filling the
+    default cache, e.g. by requesting many pages, never evicts the counters of a client.
+
+    Returns:
+        BaseCache: The cache backend.
+    """
+
+    return caches['rate_limit']
+
+
+def client_ip(request):
+    """
+    Returns the address of the client, as seen by the server.
+
+    Deployments behind a reverse proxy must set REMOTE_ADDR to the address of the client in the proxy.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        str: The IP address.
+    """
+
+    return request.META.get('REMOTE_ADDR', '')
+
+
+# Functions returning the identity whose limit is charged for a request, or None to skip the limit.
+IDENTITIES = {
+    'ip': client_ip,
+    'user': lambda request: request.user.pk if request.user.is_authenticated else None,
+    'username': lambda request: (request.POST.get('username') or '').lower() or None,
+}
+
+
+def take_token(key, capacity, period):
+    """
+    Charges a request to a sliding window counter, allowing capacity requests per period seconds.
+
+    The limit is a sliding window rather than a token bucket: requests are counted per window
+    of period seconds, and the number of requests of the last period is estimated from the
+    counts of the current window and of the previous one, weighted by the part of the previous
+    window still within the last period. A rejected request gives back its slot.
+
+    The counts are kept with cache increments, which are atomic only on backends such as Redis
+    or Memcached; other backends read and write the count, so concurrent requests of a client
+    may occasionally be counted once. Every write sets the expiry of the window again, as
+    backends without native increments store the count with the default timeout of the cache.
+
+    Args:
+        key (str): Cache key prefix of the counters.
+        capacity (int): Number of requests allowed per period.
+        period (float): Length of the period in seconds.
+
+    Returns:
+        float: 0 if the request is allowed, otherwise the number of seconds until the next one is.
+    """
+
+    counters = rate_limit_cache()
+    now = time.time()
+    window = int(now // period)
+    elapsed = now % period
+    current_key = f'{key}:{window}'
+    timeout = math.ceil(2 * period)
+    counters.add(current_key, 0, timeout)
+    current = counters.incr(current_key)
+    counters.touch(current_key, timeout)
+    previous = counters.get(f'{key}:{window - 1}', 0)
+    if previous * (period - elapsed) / period + current <= capacity:
+        return 0
+
+    counters.decr(current_key)
+    counters.touch(current_key, timeout)
+    # Time within the window at which enough requests of the previous window left the last period.
+    allowed_at = period - (capacity - current) * period / previous if previous else period
+    return max(allowed_at - elapsed, 0) or 1
+
+
+def count(url_name, counter):
+    """
+    Increments a monitoring counter of a URL name, kept without expiry.
+
+    Args:
+        url_name (str): Name of the URL.
+        counter (str): One of COUNTERS.
+    """
+
+    counters = rate_limit_cache()
+    key = COUNTER_KEY % (url_name, counter)
+    if not counters.add(key, 1, None):
+        try:
+            counters.incr(key)
+        except ValueError:
+            counters.set(key, 1, None)
+
+
+def get_counters():
+    """
+    Returns the monitoring counters of all rate limited URL names.
+
+    Returns:
+        dict: Numbers of allowed and limited requests by URL name.
+    """
+
+    keys = {COUNTER_KEY % (url_name, counter): (url_name, counter)
+            for url_name in settings.RATE_LIMITS for counter in COUNTERS}
+    values = rate_limit_cache().get_many(list(keys))
+    counters = {url_name: dict.fromkeys(COUNTERS, 0) for url_name in settings.RATE_LIMITS}
+    for key, value in values.items():
+        url_name, counter = keys[key]
+        counters[url_name][counter] = value
+    return counters
+
+
+def check_rate_limit(request, url_name):
+    """
+    Charges a request to the limits configured for its URL name in the RATE_LIMITS setting.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+        url_name (str): Name of the URL of the request.
+
+    Returns:
+        float: 0 if the request is allowed, otherwise the number of seconds the client should wait.
+    """
+
+    for identity, (capacity, period) in settings.RATE_LIMITS.get(url_name, {}).items():
+        value = IDENTITIES[identity](request)
+        if value is None:
+            continue
+        wait = take_token(RATE_LIMIT_KEY % (url_name, identity, value), capacity, period)
+        if wait:
+            count(url_name, 'limited')
+            return wait
+    count(url_name, 'allowed')
+    return 0
+
+
+class RateLimitMiddleware:
+    """
+    Middleware rejecting submissions to expensive views which exceed the RATE_LIMITS setting.
+
+    Only unsafe methods (e.g. POST) are limited, pages are still shown. Rejected requests get
+    a plain 429 response without running the view, so bursts of automated submissions
+    don't keep the workers from serving other requests. Must come after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        url_name = request.resolver_match.url_name
+        if url_name not in settings.RATE_LIMITS:
+            return None
+        wait = check_rate_limit(request, url_name)
+        if not wait:
+            return None
+        response = HttpResponse('Too many requests, please try again later.', status=429,
+                                content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
@@ -0,0 +1,205 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from sell_it_app.geo import normalize_place
+from sell_it_app.models import Messages, SavedSearch, SavedSearchMatch
+
+TERM_PATTERN = re.compile(r'\w+')
+MAX_TERM_LENGTH = 100
+
+
+def search_terms(text):
+    """
+    Splits a text into normalized words, ignoring case and diacritics.
+
+    Args:
+        text (str): The text, e.g. a listing title or a search query.
+
+    Returns:
+        list: The words, truncated to MAX_TERM_LENGTH characters.
+    """
+
+    return [term[:MAX_TERM_LENGTH] for term in TERM_PATTERN.findall(normalize_place(text or ''))]
+
+
+def percolator_key(saved_search):
+    """
+    Returns the percolator key of a saved search: its most selective criterion.
+
+    The longest word of the query is used first, as longer words are rarer in titles, then
+    the city, then the category. Searches without any criterion match every listing.
+
+    Args:
+        saved_search (SavedSearch): The saved search.
+
+    Returns:
+        str: The key, e.g. 'term:iphone', 'city:warszawa', 'category:3' or '*'.
+    """
+
+    terms = search_terms(saved_search.query)
+    if terms:
+        return f'term:{max(terms, key=len)}'
+    if saved_search.city.strip():
+        return f'city:{normalize_place(saved_search.city)}'
+    if saved_search.category_id is not None:
+        return f'category:{saved_search.category_id}'
+    return '*'
+
+
+def listing_keys(listing, title_terms, city):
+    """
+    Returns the percolator keys a listing can match: a saved search can only match a listing if its key is one of them.
+
+    Args:
+        listing (Listings): The listing.
+        title_terms (set): Words of the listing title, see search_terms().
+        city (str): Normalized city of the listing.
+
+    Returns:
+        list: The keys.
+    """
+
+    return [f'term:{term}' for term in title_terms] + [f'city:{city}', f'category:{listing.category_id_id}', '*']
+
+
+def search_matches(saved_search, listing, title_terms, city):
+    """
+    Checks all criteria of a saved search against a listing.
+
+    Args:
+        saved_search (SavedSearch): The saved search.
+        listing (Listings): The listing.
+        title_terms (set): Words of the listing title, see search_terms().
+        city (str): Normalized city of the listing.
+
+    Returns:
+        bool: True if the listing matches the search.
+    """
+
+    return (
+        set(search_terms(saved_search.query)) <= title_terms
+        and saved_search.category_id in (None, listing.category_id_id)
+        and (saved_search.min_price is None or listing.price >= saved_search.min_price)
+        and (saved_search.max_price is None or listing.price <= saved_search.max_price)
+        and (not saved_search.city.strip() or normalize_place(saved_search.city) == city)
+    )
+
+
+def match_saved_searches(listing):
+    """
+    Matches a new listing against the saved searches and queues the matches for notification.
+
+    The saved searches are indexed by their percolator key (see percolator_key()), so only the
+    searches whose key is one of the keys of the listing are read and checked, and the cost
+    depends on the listing rather than on the number of saved searches. The searches of the
+    seller are skipped. Queued matches are delivered by deliver_matches().
+
+    Args:
+        listing (Listings): The listing, with its address.
+
+    Returns:
+        list: The matching saved searches.
+    """
+
+    if listing.status != 'Active':
+        return []
+    title_terms = set(search_terms(listing.title))
+    city = normalize_place(listing.address_id.city)
+    candidates = (
+        SavedSearch.objects.filter(percolator_key__in=listing_keys(listing, title_terms, city))
+        .exclude(user_id=listing.user_id_id)
+    )
+    matched = [saved_search for saved_search in candidates if search_matches(saved_search, listing, title_terms, city)]
+    if matched:
+        SavedSearchMatch.objects.bulk_create(
+            [SavedSearchMatch(saved_search=saved_search, listing=listing) for saved_search in matched],
+            ignore_conflicts=True,
+        )
+    return matched
+
+
+def deliver_matches():
+    """
+    Notifies the users of the listings matching their saved searches, with one message per saved search.
+
+    Matches are delivered in batches of SAVED_SEARCH_NOTIFICATION_BATCH, locked so concurrent
+    workers never deliver the same match twice.
+
+    Returns:
+        int: The number of delivered matches, a full batch if more matches are queued.
+    """
+
+    with transaction.atomic():
+        matches = list(
+            SavedSearchMatch.objects.filter(notified_at__isnull=True)
+            .select_related('saved_search', 'listing')
+            .order_by('created_at')
+            .select_for_update(skip_locked=True, of=('self',))[:settings.SAVED_SEARCH_NOTIFICATION_BATCH]
+        )
+        by_search = {}
+        for match in matches:
+            by_search.setdefault(match.saved_search, []).append(match.listing)
+        for saved_search, listings in by_search.items():
+            lines = [f'- {listing.title} ({listing.price} USD): {reverse("listing-details", args=[listing.id])}'
+                     for listing in listings]
+            Messages.objects.create(
+                to_user_id=saved_search.user_id,
+                title=f'New listings: {saved_search.name}'[:60],
+                message='\n'.join([f'New listings match your saved search "{saved_search.name}":'] + lines)[:1000],
+            )
+        SavedSearchMatch.objects.filter(id__in=[match.id for match in matches]).update(notified_at=timezone.now())
+    return len(matches)
+
+
+def describe_search(saved_search):
+    """
+    Builds the default name of a saved search from its criteria.
+
+    Args:
+        saved_search (SavedSearch): The saved search.
+
+    Returns:
+        str: The name, e.g. '"iphone" in Electronics, Warsaw, 100-500 USD'.
+    """
+
+    parts = []
+    if saved_search.query.strip():
+        parts.append(f'"{saved_search.query.strip()}"')
+    if saved_search.category is not None:
+        parts.append(f'in {saved_search.category.name}')
+    if saved_search.city.strip():
+        parts.append(saved_search.city.strip())
+    if saved_search.min_price is not None or saved_search.max_price is not None:
+        parts.append(f'{saved_search.min_price or 0}-{saved_search.max_price or ""} USD')
+    return ', '.join(parts)[:100] or 'All listings'
+
+
+def saved_search_url(saved_search):
+    """
+    Returns the URL showing the current listings of a saved search.
+
+    Searches with words are shown on the search page, other searches on the page of their category.
+
+    Args:
+        saved_search (SavedSearch): The saved search.
+
+    Returns:
+        str: The URL.
+    """
+
+    query = QueryDict(mutable=True)
+    if saved_search.query.strip() or saved_search.category_id is None:
+        query['search_query'] = saved_search.query
+        return f'{reverse("search")}?{query.urlencode()}'
+    if saved_search.city.strip():
+        query['city'] = saved_search.city
+    if saved_search.min_price is not None:
+        query['min_price'] = saved_search.min_price
+    if saved_search.max_price is not None:
+        query['max_price'] = saved_search.max_price
+    return f'{reverse("category", args=[saved_search.category_id])}?{query.urlencode()}'
@@ -0,0 +1,282 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from sell_it_app.bloom import USERNAMES, NEWSLETTER_EMAILS
+from sell_it_app.category_stats import CONTRIBUTION_FIELDS, listing_contribution, apply_listing_change
+from sell_it_app.favourites import invalidate_favourite_ids, update_favourite_count
+from sell_it_app.geo import geocode_address
+from sell_it_app.listing_index import log_listing_changes
+from sell_it_app.saved_searches import percolator_key
+from sell_it_app.conversations import add_thread_participants, refresh_thread_pointers
+from sell_it_app.models import User, Listings, Picture, Category, Address, Messages, Thread, Newsletter, Favourite, \
+    SavedSearch
+from sell_it_app.notifications import publish_new_message, publish_unread_counts
+from sell_it_app.object_cache import invalidate_cached_object
+from sell_it_app.page_cache import bump_page_cache_version, bump_page_scopes, listing_page_scopes
+from sell_it_app.price_alerts import record_price_change, is_price_drop
+from sell_it_app.query_cache import track_table_writes
+from sell_it_app.suggest import title_terms
+from sell_it_app.tasks import refresh_category_stats, fan_out_price_alerts, update_suggest_terms
+
+track_table_writes(Category, User)
+
+# Fields of a listing read before it is saved, to find what the change affects.
+PREVIOUS_LISTING_FIELDS = CONTRIBUTION_FIELDS + ('title', 'card_version', 'favourite_count')
+
+
+@receiver([post_save, post_delete], sender=Listings)
+def invalidate_listing_pages(sender, instance, **kwargs):
+    """
+    Invalidates the cached pages showing a saved or deleted listing, also the pages of the category it left.
+    """
+
+    scopes = listing_page_scopes(instance.pk, instance.category_id_id)
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        scopes.append(f'category:{previous["category_id_id"]}')
+    bump_page_scopes(scopes)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_pages(sender, **kwargs):
+    """
+    Invalidates all cached pages when a category changes, its name is shown with the listings everywhere.
+    """
+
+    bump_page_cache_version()
+
+
+@receiver([post_save, post_delete], sender=Picture)
+def bump_picture_listing_card_version(sender, instance, **kwargs):
+    """
+    Bumps the card version of the listing whose pictures changed, and invalidates the cached pages showing it.
+    """
+
+    Listings.objects.filter(id=instance.listing_id).update(card_version=F('card_version') + 1)
+    invalidate_cached_object(Listings, instance.listing_id)
+    category_id = Listings.objects.filter(id=instance.listing_id).values_list('category_id', flat=True).first()
+    if category_id is not None:
+        bump_page_scopes(listing_page_scopes(instance.listing_id, category_id))
+
+
+@receiver(pre_save, sender=Address)
+def locate_address(sender, instance, **kwargs):
+    """
+    Sets the coordinates of a saved address from the offline gazetteer.
+    """
+
+    geocode_address(instance)
+
+
+@receiver(post_save, sender=Address)
+def bump_address_listings_card_version(sender, instance, **kwargs):
+    """
+    Bumps the card version of the listings placed at the changed address, invalidates the cached
+    pages showing them, and logs them for the listing indexes.
+    """
+
+    listings = dict(Listings.objects.filter(address_id=instance).values_list('id', 'category_id'))
+    if listings:
+        Listings.objects.filter(id__in=listings).update(card_version=F('card_version') + 1)
+        scopes = []
+        for listing_id, category_id in listings.items():
+            invalidate_cached_object(Listings, listing_id)
+            scopes.extend(listing_page_scopes(listing_id, category_id))
+        bump_page_scopes(scopes)
+        log_listing_changes(list(listings))
+
+
+@receiver(pre_save, sender=Listings)
+def remember_previous_listing(sender, instance, **kwargs):
+    """
+    Reads the values of a listing about to be saved before the change, with one query.
+
+    The counters maintained in the database are taken from them rather than from the instance,
+    which may be an old copy: the card version is bumped from its current value, so the cached
+    cards are rendered again, and the favourite count is kept.
+    """
+
+    instance._previous_values = None
+    if instance.pk is not None:
+        instance._previous_values = Listings.objects.filter(pk=instance.pk).values(*PREVIOUS_LISTING_FIELDS).first()
+    if instance._previous_values is not None:
+        instance.card_version = instance._previous_values['card_version'] + 1
+        instance.favourite_count = instance._previous_values['favourite_count']
+
+
+@receiver(post_save, sender=Listings)
+def record_listing_price(sender, instance, created, **kwargs):
+    """
+    Records a changed price in the price history of a listing, and queues the alerts of the users
+    who favourited it if the price dropped, so the seller's request doesn't wait for the fan-out.
+    """
+
+    previous = getattr(instance, '_previous_values', None)
+    if not created and previous is None:
+        return
+    price_change = record_price_change(instance, None if created else previous['price'])
+    if is_price_drop(price_change, instance):
+        fan_out_price_alerts.enqueue(price_change.id)
+
+
+@receiver(pre_save, sender=SavedSearch)
+def index_saved_search(sender, instance, **kwargs):
+    """
+    Sets the percolator key of a saved search, new listings are matched against the searches by their key.
+    """
+
+    instance.percolator_key = percolator_key(instance)
+
+
+@receiver([post_save, post_delete], sender=Listings)
+def log_listing_change(sender, instance, **kwargs):
+    """
+    Logs a created, edited or deleted listing for the in-process listing indexes.
+    """
+
+    log_listing_changes([instance.pk])
+
+
+def refresh_category_medians(category_ids):
+    """
+    Queues the refresh of the median prices of categories, once per category.
+    """
+
+    for category_id in category_ids:
+        refresh_category_stats.enqueue(category_id, unique=True)
+
+
+@receiver(post_save, sender=Listings)
+def update_saved_listing_category_stats(sender, instance, **kwargs):
+    """
+    Updates the statistics of the categories of a created or edited listing.
+    """
+
+    previous = getattr(instance, '_previous_values', None)
+    previous = listing_contribution(previous) if previous else None
+    refresh_category_medians(apply_listing_change(previous, listing_contribution(instance)))
+
+
+@receiver(post_delete, sender=Listings)
+def update_deleted_listing_category_stats(sender, instance, **kwargs):
+    """
+    Updates the statistics of the category of a deleted listing.
+    """
+
+    refresh_category_medians(apply_listing_change(listing_contribution(instance), None))
+
+
+@receiver(post_save, sender=Listings)
+def update_saved_listing_suggest_terms(sender, instance, **kwargs):
+    """
+    Queues the update of the suggested words whose listing count changed with a created or edited listing.
+    """
+
+    previous = getattr(instance, '_previous_values', None)
+    removed = title_terms(previous['title'], previous['status']) if previous else set()
+    added = title_terms(instance.title, instance.status)
+    if removed != added:
+        update_suggest_terms.enqueue(sorted(removed - added), sorted(added - removed))
+
+
+@receiver(post_delete, sender=Listings)
+def update_deleted_listing_suggest_terms(sender, instance, **kwargs):
+    """
+    Queues the update of the suggested words of a deleted listing.
+    """
+
+    removed = title_terms(instance.title, instance.status)
+    if removed:
+        update_suggest_terms.enqueue(sorted(removed), [])
+
+
+@receiver(post_save, sender=Favourite)
+def count_added_favourite(sender, instance, created, **kwargs):
+    """
+    Increments the favourite count of a favourited listing, invalidates the favourite IDs of the user
+    and the cached page of the listing showing the count.
+    """
+
+    if created:
+        update_favourite_count(instance.listing_id, 1)
+        invalidate_cached_object(Listings, instance.listing_id)
+        invalidate_favourite_ids(instance.user_id)
+        bump_page_scopes([f'listing:{instance.listing_id}'])
+
+
+@receiver(post_delete, sender=Favourite)
+def count_removed_favourite(sender, instance, **kwargs):
+    """
+    Decrements the favourite count of a listing removed from favourites, also when the favourite is
+    deleted with its user, and invalidates the favourite IDs of the user and the cached page of the listing.
+    """
+
+    update_favourite_count(instance.listing_id, -1)
+    invalidate_cached_object(Listings, instance.listing_id)
+    invalidate_favourite_ids(instance.user_id)
+    bump_page_scopes([f'listing:{instance.listing_id}'])
+
+
+@receiver([post_save, post_delete], sender=Listings)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_object_cache(sender, instance, **kwargs):
+    """
+    Removes a saved or deleted listing or user from the object cache.
+    """
+
+    invalidate_cached_object(sender, instance.pk)
+
+
+@receiver(pre_save, sender=Messages)
+def start_message_thread(sender, instance, **kwargs):
+    """
+    Starts a new conversation for a message which is not a reply to an existing one.
+    """
+
+    if instance.thread_id is None:
+        instance.thread = Thread.objects.create(title=instance.title)
+
+
+@receiver(post_save, sender=Messages)
+def update_message_thread(sender, instance, created, **kwargs):
+    """
+    Updates the participants, the last message and the unread counts of the conversation of a saved message,
+    and notifies the recipient.
+    """
+
+    if created:
+        add_thread_participants(instance)
+        publish_new_message(instance)
+    refresh_thread_pointers([instance.thread_id])
+    publish_unread_counts([instance.to_user_id])
+
+
+@receiver(post_delete, sender=Messages)
+def update_deleted_message_thread(sender, instance, **kwargs):
+    """
+    Updates the last message and the unread counts of the conversation of a deleted message.
+    """
+
+    if instance.thread_id is not None:
+        refresh_thread_pointers([instance.thread_id])
+    publish_unread_counts([instance.to_user_id])
+
+
+@receiver(post_save, sender=User)
+def add_username_to_bloom_filter(sender, instance, created, **kwargs):
+    """
+    Adds the username of a new or renamed user to the username Bloom filter.
+    """
+
+    USERNAMES.add(instance.username)
+
+
+@receiver(post_save, sender=Newsletter)
+def add_email_to_bloom_filter(sender, instance, created, **kwargs):
+    """
+    Adds the email of a new subscriber to the newsletter Bloom filter.
+    """
+
+    if created:
+        NEWSLETTER_EMAILS.add(instance.email)
@@ -0,0 +1,101 @@
+import csv
+import itertools
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from sell_it_app.bloom import NEWSLETTER_EMAILS
+from sell_it_app.models import Newsletter
+
+IMPORT_BATCH_SIZE = 5000
+EXPORT_CHUNK_SIZE = 5000
+
+
+def subscribe(email):
+    """
+    Subscribes an email address to the newsletter with a single INSERT.
+
+    The unique email column makes the check for an existing subscription part of the insert,
+    so concurrent subscriptions of the same address can't create duplicates. Addresses the
+    Bloom filter reports as possibly subscribed are looked up first, so repeated submissions
+    of subscribed addresses don't run failing inserts.
+
+    Args:
+        email (str): The email address.
+
+    Returns:
+        bool: True if the address was subscribed, False if it was already subscribed.
+    """
+
+    if NEWSLETTER_EMAILS.might_contain(email):
+        if Newsletter.objects.filter(email=Newsletter.normalize_email(email)).exists():
+            return False
+    try:
+        with transaction.atomic():
+            Newsletter.objects.create(email=email)
+    except IntegrityError:
+        return False
+    return True
+
+
+def import_subscribers(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Subscribes the email addresses of CSV rows, in batches of INSERT ... ON CONFLICT DO NOTHING.
+
+    The rows are consumed lazily, so files of any size are imported in bounded memory.
+    The email is the first column of a row, rows without a valid email, like a header row, are skipped.
+
+    Args:
+        rows (Iterable[list]): Rows of the CSV file, e.g. a csv.reader.
+        batch_size (int): Number of emails inserted with one query.
+
+    Returns:
+        tuple: The number of valid rows and the number of skipped rows.
+    """
+
+    valid = 0
+    skipped = 0
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        emails = set()
+        for row in batch:
+            email = Newsletter.normalize_email(row[0]) if row else ''
+            try:
+                validate_email(email)
+            except ValidationError:
+                skipped += 1
+            else:
+                valid += 1
+                emails.add(email)
+        Newsletter.objects.bulk_create([Newsletter(email=email) for email in emails], ignore_conflicts=True)
+        for email in emails:
+            NEWSLETTER_EMAILS.add(email)
+    return valid, skipped
+
+
+class Echo:
+    """
+    File-like object returning what is written, used to stream CSV rows.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_subscribers_csv(queryset=None):
+    """
+    Yields the subscribers as CSV lines, streaming them from the database with a server-side cursor.
+
+    Args:
+        queryset (QuerySet): Subscribers to export, all subscribers by default.
+
+    Yields:
+        str: The header line, then one line per subscriber.
+    """
+
+    queryset = Newsletter.objects.all() if queryset is None else queryset
+    writer = csv.writer(Echo())
+    yield writer.writerow(['email'])
+    for email in queryset.order_by('id').values_list('email', flat=True).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([email])
@@ -0,0 +1,379 @@
+import array
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from sell_it_app.models import Listings, SuggestTerm
+from sell_it_app.saved_searches import search_terms
+
+# Header of the index file: magic, number of entries, number of precomputed prefixes and
+# number of suggestions kept per precomputed prefix.
+MAGIC = b'SELLSUG1'
+HEADER = struct.Struct('=8sIII4x')
+NO_ENTRY = 0xFFFFFFFF
+MAX_WEIGHT = 0xFFFFFFFF
+
+
+def normalize_query(text):
+    """
+    Normalizes a search query for suggestions: lowercase words without diacritics, separated by single spaces.
+
+    Args:
+        text (str): The query.
+
+    Returns:
+        str: The normalized query, at most 100 characters long.
+    """
+
+    return ' '.join(search_terms(text))[:100].strip()
+
+
+def title_terms(title, status):
+    """
+    Returns the suggested words of a listing title, for active listings.
+
+    Args:
+        title (str): Title of the listing.
+        status (str): Status of the listing.
+
+    Returns:
+        set: The words, empty for inactive listings.
+    """
+
+    if status != 'Active':
+        return set()
+    return {term for term in search_terms(title) if len(term) >= settings.SUGGEST_MIN_TERM_LENGTH}
+
+
+def apply_term_changes(removed, added):
+    """
+    Updates the listing counts of the suggested words after listings were changed, with one UPDATE per
+    distinct change of count.
+
+    Args:
+        removed (Iterable[str]): Words each removed from one listing, repeated for several listings.
+        added (Iterable[str]): Words each added to one listing.
+    """
+
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    deltas = {term: delta for term, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    SuggestTerm.objects.bulk_create([SuggestTerm(text=term) for term in deltas], ignore_conflicts=True)
+    for delta in set(deltas.values()):
+        SuggestTerm.objects.filter(text__in=[term for term, value in deltas.items() if value == delta]) \
+            .update(listing_count=F('listing_count') + delta)
+
+
+_search_counts = Counter()
+_search_counts_since = time.monotonic()
+_search_counts_lock = threading.Lock()
+
+
+def record_search_query(query):
+    """
+    Counts a search query returning results, so popular queries are suggested.
+
+    The counts are buffered in the process, so searches don't write to the database. They are
+    handed over once SUGGEST_SEARCH_FLUSH_SIZE distinct queries are buffered or after
+    SUGGEST_SEARCH_FLUSH_INTERVAL seconds, to be saved in one batch, see save_search_counts().
+    Counts still buffered when the process exits are lost, which only delays a popular query.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        dict: The buffered counts by normalized query when they are due to be saved, otherwise None.
+    """
+
+    global _search_counts, _search_counts_since
+    text = normalize_query(query)
+    if len(text) < settings.SUGGEST_MIN_TERM_LENGTH:
+        return None
+    with _search_counts_lock:
+        _search_counts[text] += 1
+        if (len(_search_counts) < settings.SUGGEST_SEARCH_FLUSH_SIZE
+                and time.monotonic() - _search_counts_since < settings.SUGGEST_SEARCH_FLUSH_INTERVAL):
+            return None
+        counts = dict(_search_counts)
+        _search_counts = Counter()
+        _search_counts_since = time.monotonic()
+    return counts
+
+
+def save_search_counts(counts):
+    """
+    Adds buffered search counts to the suggested words, with one INSERT and one UPDATE.
+
+    Args:
+        counts (dict): Number of searches by normalized query, see record_search_query().
+    """
+
+    SuggestTerm.objects.bulk_create([SuggestTerm(text=text) for text in counts], ignore_conflicts=True)
+    increment = Case(*[When(text=text, then=Value(count)) for text, count in counts.items()], default=Value(0))
+    SuggestTerm.objects.filter(text__in=list(counts)).update(search_count=F('search_count') + increment)
+
+
+def reconcile_suggest_terms():
+    """
+    Recomputes the listing counts of the suggested words from all active listings.
+
+    Fixes any drift of the incrementally maintained counts, and fills them in for the
+    listings created before suggestions were enabled.
+
+    Returns:
+        int: The number of words found in the listings.
+    """
+
+    counts = Counter()
+    titles = Listings.objects.filter(status='Active').values_list('title', flat=True).iterator(chunk_size=10000)
+    for title in titles:
+        counts.update(title_terms(title, 'Active'))
+    with transaction.atomic():
+        SuggestTerm.objects.filter(listing_count__gt=0).update(listing_count=0)
+        SuggestTerm.objects.bulk_create(
+            [SuggestTerm(text=term, listing_count=count) for term, count in counts.items()],
+            update_conflicts=True,
+            unique_fields=['text'],
+            update_fields=['listing_count'],
+            batch_size=10000,
+        )
+    return len(counts)
+
+
+def write_suggest_index(path, entries, top_count, prefix_length):
+    """
+    Writes a suggestion index file, replacing the previous one atomically.
+
+    The file holds the entries sorted by their UTF-8 encoding, with their weights, and the
+    top_count heaviest entries of every prefix of up to prefix_length characters, for which
+    the sorted range of matching entries may be large. Arrays come before the strings so
+    they are aligned when the file is mapped. Processes still reading the previous file
+    keep their mapping of it.
+
+    Args:
+        path (str): Path of the index file.
+        entries (Iterable[tuple]): Texts and weights of the entries.
+        top_count (int): Number of entries kept per precomputed prefix.
+        prefix_length (int): Length of the longest precomputed prefixes.
+    """
+
+    entries = sorted((text.encode(), min(weight, MAX_WEIGHT)) for text, weight in entries)
+    tops = {}
+    for index, (text, weight) in enumerate(entries):
+        decoded = text.decode()
+        for length in range(1, min(prefix_length, len(decoded)) + 1):
+            heap = tops.setdefault(decoded[:length].encode(), [])
+            if len(heap) < top_count:
+                heapq.heappush(heap, (weight, -index))
+            elif (weight, -index) > heap[0]:
+                heapq.heapreplace(heap, (weight, -index))
+    prefixes = sorted(tops)
+
+    def string_table(texts):
+        offsets = array.array('I', [0])
+        for text in texts:
+            offsets.append(offsets[-1] + len(text))
+        return offsets, b''.join(texts)
+
+    entry_offsets, entry_blob = string_table([text for text, _ in entries])
+    prefix_offsets, prefix_blob = string_table(prefixes)
+    weights = array.array('I', [weight for _, weight in entries])
+    top_entries = array.array('I')
+    for prefix in prefixes:
+        best = [-index for _, index in sorted(tops[prefix], reverse=True)]
+        top_entries.extend(best + [NO_ENTRY] * (top_count - len(best)))
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    file, temporary_path = tempfile.mkstemp(dir=directory, prefix='.suggest-')
+    try:
+        with os.fdopen(file, 'wb') as output:
+            output.write(HEADER.pack(MAGIC, len(entries), len(prefixes), top_count))
+            for part in (entry_offsets, weights, prefix_offsets, top_entries):
+                part.tofile(output)
+            output.write(entry_blob)
+            output.write(prefix_blob)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def build_suggest_index(path=None):
+    """
+    Writes the suggestion index file from the suggested words and the popular search queries.
+
+    An entry weighs its number of active listings plus SUGGEST_SEARCH_WEIGHT times its number of searches.
+
+    Args:
+        path (str): Path of the index file, SUGGEST_INDEX_PATH by default.
+
+    Returns:
+        int: The number of entries.
+    """
+
+    rows = (
+        SuggestTerm.objects.filter(Q(listing_count__gt=0) | Q(search_count__gt=0))
+        .values_list('text', 'listing_count', 'search_count')
+        .iterator(chunk_size=10000)
+    )
+    entries = [(text, max(listing_count, 0) + settings.SUGGEST_SEARCH_WEIGHT * search_count)
+               for text, listing_count, search_count in rows]
+    write_suggest_index(path or settings.SUGGEST_INDEX_PATH, entries, settings.SUGGEST_TOP_COUNT,
+                        settings.SUGGEST_PREFIX_LENGTH)
+    return len(entries)
+
+
+class StringTable:
+    """
+    Sorted strings read from a mapped index file, searchable by binary search.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+    def lower_bound(self, text):
+        return bisect.bisect_left(self, text)
+
+
+class SuggestIndex:
+    """
+    Suggestion index mapped from a file written by write_suggest_index().
+
+    The file is mapped read-only, so all worker processes of a server share one copy of it in
+    the page cache, and lookups only touch the pages they need: a prefix is looked up with a
+    binary search of the sorted entries, short prefixes with the precomputed heaviest entries.
+
+    Attributes:
+        entries (StringTable): Sorted UTF-8 encoded entries.
+        weights (memoryview): Weights of the entries.
+        prefixes (StringTable): Sorted precomputed prefixes.
+        top_entries (memoryview): Indexes of the heaviest entries of every precomputed prefix.
+        top_count (int): Number of indexes per precomputed prefix.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(file.fileno())
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        magic, entry_count, prefix_count, self.top_count = HEADER.unpack_from(self.mapping, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a suggestion index')
+
+        view = memoryview(self.mapping)
+        position = HEADER.size
+
+        def take(size):
+            nonlocal position
+            part = view[position:position + size]
+            position += size
+            return part
+
+        entry_offsets = take(4 * (entry_count + 1)).cast('I')
+        self.weights = take(4 * entry_count).cast('I')
+        prefix_offsets = take(4 * (prefix_count + 1)).cast('I')
+        self.top_entries = take(4 * prefix_count * self.top_count).cast('I')
+        self.entries = StringTable(entry_offsets, take(entry_offsets[-1]))
+        self.prefixes = StringTable(prefix_offsets, take(prefix_offsets[-1]))
+
+    def lookup(self, prefix, limit):
+        """
+        Returns the heaviest entries starting with a prefix.
+
+        Args:
+            prefix (str): Normalized prefix.
+            limit (int): Maximum number of entries.
+
+        Returns:
+            list: Tuples of weight and entry, heaviest first.
+        """
+
+        encoded = prefix.encode()
+        position = self.prefixes.lower_bound(encoded)
+        if position < len(self.prefixes) and self.prefixes[position] == encoded and limit <= self.top_count:
+            indexes = self.top_entries[position * self.top_count:(position + 1) * self.top_count]
+            return [(self.weights[index], self.entries[index].decode()) for index in indexes[:limit]
+                    if index != NO_ENTRY]
+
+        start = self.entries.lower_bound(encoded)
+        # UTF-8 never contains 0xff, so every entry starting with the prefix sorts before it.
+        stop = self.entries.lower_bound(encoded + b'\xff')
+        best = heapq.nlargest(limit, range(start, stop), key=lambda index: (self.weights[index], -index))
+        return [(self.weights[index], self.entries[index].decode()) for index in best]
+
+    def suggest(self, query, limit):
+        """
+        Suggests completions of a query: entries starting with it, and for queries of several
+        words, completions of the last word after the previous ones.
+
+        Args:
+            query (str): The query typed by the user.
+            limit (int): Maximum number of suggestions.
+
+        Returns:
+            list: The suggestions, heaviest first.
+        """
+
+        text = normalize_query(query)
+        if not text:
+            return []
+        candidates = self.lookup(text, limit)
+        head, _, last = text.rpartition(' ')
+        if head:
+            candidates += [(weight, f'{head} {term}') for weight, term in self.lookup(last, limit) if ' ' not in term]
+        suggestions = []
+        for _, suggestion in sorted(candidates, key=lambda candidate: -candidate[0]):
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions[:limit]
+
+
+_index = None
+_checked_at = 0
+_lock = threading.Lock()
+
+
+def get_suggest_index():
+    """
+    Returns the suggestion index of the current process, mapped again when the file was rebuilt.
+
+    The file is checked at most every SUGGEST_INDEX_REFRESH_INTERVAL seconds.
+
+    Returns:
+        SuggestIndex: The index, None if the file wasn't built yet.
+    """
+
+    global _index, _checked_at
+    if time.monotonic() - _checked_at < settings.SUGGEST_INDEX_REFRESH_INTERVAL:
+        return _index
+    with _lock:
+        path = settings.SUGGEST_INDEX_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _index = None
+        else:
+            if _index is None or _index.file_id != (stat.st_ino, stat.st_mtime_ns):
+                _index = SuggestIndex(path)
+        _checked_at = time.monotonic()
+    return _index
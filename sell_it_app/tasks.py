@@ -0,0 +1,135 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from sell_it_app.campaigns import send_campaign
+from sell_it_app.category_stats import reconcile_category_stats
+from sell_it_app.jobs import task
+from sell_it_app.models import Messages
+from sell_it_app.price_alerts import fan_out_price_drop, deliver_price_alert_digests
+from sell_it_app.saved_searches import deliver_matches
+from sell_it_app.suggest import apply_term_changes, build_suggest_index, save_search_counts
+
+
+@task
+def deliver_contact_message(title, message, to_user_id, from_user_id=None, from_unregistered_user=None):
+    """
+    Delivers a message sent with the contact form to the admin.
+
+    Args:
+        title (str): Title of the message.
+        message (str): Content of the message.
+        to_user_id (int): ID of the admin.
+        from_user_id (int): ID of the sender, for registered users.
+        from_unregistered_user (str): Email of the sender, for unregistered users.
+    """
+
+    Messages.objects.create(
+        title=title,
+        message=message,
+        to_user_id=to_user_id,
+        from_user_id=from_user_id,
+        from_unregistered_user=from_unregistered_user,
+    )
+
+
+@task
+def send_newsletter_campaign(campaign_id):
+    """
+    Sends a newsletter campaign, resuming it if it was interrupted.
+
+    Args:
+        campaign_id (int): ID of the campaign.
+    """
+
+    send_campaign(campaign_id)
+
+
+@task
+def refresh_category_stats(category_id=None):
+    """
+    Recomputes the statistics of a category, or of all categories.
+
+    Args:
+        category_id (int): ID of the category, all categories by default.
+    """
+
+    reconcile_category_stats(None if category_id is None else [category_id])
+
+
+@task
+def deliver_saved_search_matches():
+    """
+    Notifies the users of the new listings matching their saved searches, queuing itself
+    again while more matches are queued.
+    """
+
+    if deliver_matches() == settings.SAVED_SEARCH_NOTIFICATION_BATCH:
+        deliver_saved_search_matches.enqueue(unique=True)
+
+
+@task
+def fan_out_price_alerts(price_change_id):
+    """
+    Creates the price alerts of a price drop and queues their digest delivery.
+
+    The digest is delivered PRICE_ALERT_DIGEST_DELAY seconds later, collecting the drops of
+    that period into one message per user.
+
+    Args:
+        price_change_id (int): ID of the price change.
+    """
+
+    if fan_out_price_drop(price_change_id):
+        run_at = timezone.now() + datetime.timedelta(seconds=settings.PRICE_ALERT_DIGEST_DELAY)
+        deliver_price_alerts.enqueue(run_at=run_at, unique=True)
+
+
+@task
+def deliver_price_alerts():
+    """
+    Delivers the pending price alerts as digests.
+    """
+
+    deliver_price_alert_digests()
+
+
+@task
+def update_suggest_terms(removed, added):
+    """
+    Updates the counts of the suggested words of a changed listing and queues the rebuild of
+    the suggestion index.
+
+    The index is rebuilt SUGGEST_INDEX_BUILD_DELAY seconds later, once for all the listings
+    changed in that period.
+
+    Args:
+        removed (list): Words no longer in the title of an active listing.
+        added (list): Words new in the title of an active listing.
+    """
+
+    apply_term_changes(removed, added)
+    run_at = timezone.now() + datetime.timedelta(seconds=settings.SUGGEST_INDEX_BUILD_DELAY)
+    rebuild_suggest_index.enqueue(run_at=run_at, unique=True)
+
+
+@task
+def count_search_queries(counts):
+    """
+    Saves the search counts buffered by a worker process, see record_search_query().
+
+    Args:
+        counts (dict): Number of searches by normalized query.
+    """
+
+    save_search_counts(counts)
+
+
+@task
+def rebuild_suggest_index():
+    """
+    Writes the suggestion index file from the current counts.
+    """
+
+    build_suggest_index()
@@ -0,0 +1,24 @@
+from django import template
+
+from sell_it_app.fragment_cache import render_listing_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def listing_cards(context, listings, variant):
+    """
+    Returns the rendered cards of the listings from the fragment cache.
+
+    Usage: {% listing_cards listings 'category' as cards %}
+
+    Args:
+        context (Context): Template context.
+        listings (iterable): Listings to render.
+        variant (str): Name of the card variant in LISTING_CARD_TEMPLATES.
+
+    Returns:
+        list: Rendered cards in the order of the listings.
+    """
+
+    return render_listing_cards(listings, variant, context.get('request'))
@@ -0,0 +1,57 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from sell_it_app.favourites import FAVOURITE_BUTTON_MARKER, render_favourite_button
+from sell_it_app.page_cache import PERSONAL_FRAGMENTS, PERSONAL_FRAGMENT_MARKER
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name):
+    """
+    Renders a user-specific fragment of the page.
+
+    When the page is rendered for the page cache, only a marker is returned and
+    the fragment is rendered later for every request.
+
+    Args:
+        context (Context): Template context.
+        name (str): Name of the fragment in PERSONAL_FRAGMENTS.
+
+    Returns:
+        str: Rendered fragment or its marker.
+    """
+
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(PERSONAL_FRAGMENT_MARKER % name)
+
+    template_name, get_context = PERSONAL_FRAGMENTS[name]
+    fragment = context.template.engine.get_template(template_name)
+    if get_context is None:
+        return fragment.render(context)
+    with context.push(get_context(request)):
+        return fragment.render(context)
+
+
+@register.simple_tag(takes_context=True)
+def favourite_button(context, listing_id):
+    """
+    Renders the favourite button of a listing for the current user.
+
+    When the page is rendered for the page cache, only a marker is returned and
+    the button is rendered later for every request, see fill_favourite_buttons().
+
+    Args:
+        context (Context): Template context.
+        listing_id (int): ID of the listing.
+
+    Returns:
+        str: Rendered button or its marker.
+    """
+
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(FAVOURITE_BUTTON_MARKER % listing_id)
+    return mark_safe(render_favourite_button(listing_id, request))
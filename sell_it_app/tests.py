@@ -1,14 +1,73 @@
+import asyncio
 import datetime
+import io
+import re
+import threading
+import time
+from collections import Counter
 from datetime import timedelta
 
 import pytest
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.mail.backends.locmem import EmailBackend
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db import IntegrityError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
 
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.datastructures import MultiValueDict
 
-from sell_it_app.models import User, Category, Newsletter, Listings, Address, Picture, Messages, Avatars
+from sell_it_app.archive import archive_messages, archive_messages_batch
+from sell_it_app.bloom import BloomFilter, USERNAMES, NEWSLETTER_EMAILS
+from sell_it_app.campaigns import send_campaign
+from sell_it_app.category_stats import reconcile_category_stats
+from sell_it_app.cache_backends import TwoTierCache, LocalLRUCache
+from sell_it_app.page_cache import PAGE_CACHE_VERSION_KEY, bump_page_cache_version, page_cache_version
+from sell_it_app.conversations import search_messages
+from sell_it_app import notifications
+from sell_it_app.notifications import InProcessBroker, PostgresBroker
+from sell_it_app.jobs import task, enqueue, claim_job, run_job, run_queued_jobs, requeue_stale_jobs
+from sell_it_app.fragment_cache import render_listing_cards, CSRF_TOKEN_PLACEHOLDER
+from sell_it_app.geo import geocode, encode_geohash, covering_cells
+from sell_it_app.facets import facet_queryset, count_facets, filter_listings, get_selected_facets
+from sell_it_app.listing_index import ListingIndex, get_listing_index
+from sell_it_app.rate_limit import take_token, get_counters, count, rate_limit_cache, COUNTER_KEY, COUNTERS
+from sell_it_app.saved_searches import match_saved_searches
+from sell_it_app import fuzzy_search, suggest
+from sell_it_app.object_cache import get_cached_object, start_identity_map, end_identity_map
+from sell_it_app.models import User, Category, Newsletter, Listings, Address, Picture, Messages, Avatars, Thread, \
+    ThreadParticipant, ArchivedMessage, Job, NewsletterCampaign, CategoryStats, Favourite, SavedSearch, \
+    SavedSearchMatch, PriceAlert, SuggestTerm, ListingChange
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Fixture clearing the caches before and after every test, as they are not rolled back with the database.
+    """
+
+    for backend in caches.all():
+        backend.clear()
+    yield
+    for backend in caches.all():
+        backend.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_bloom_filters():
+    """
+    Fixture dropping the Bloom filters after every test, as they are not rolled back with the database.
+    """
+
+    yield
+    USERNAMES.reset()
+    NEWSLETTER_EMAILS.reset()
 
 
 # main page test
@@ -1946,6 +2005,7 @@ def test_contact_view_logged_user_status_code_ok(client):
 
     client.login(username='testuser', password='testtest')
     response = client.post('/contact/', {'title': 'test title', 'message': 'test message', 'to_user_id': admin.id, 'from_user_id': user.id})
+    run_queued_jobs()
 
     assert response.status_code == 200
     assert Messages.objects.filter(from_user_id=user.id).count() == 1
@@ -1972,6 +2032,7 @@ def test_contact_view_not_logged_user_status_code_ok(client):
     unregistered_email = 'test@gmail.com'
 
     response = client.post('/contact/', {'title': 'test title', 'message': 'test message', 'to_user_id': admin.id, 'email': unregistered_email})
+    run_queued_jobs()
 
     assert response.status_code == 200
     assert Messages.objects.filter(from_unregistered_user=unregistered_email).count() == 1
@@ -2072,3 +2133,2022 @@ def test_newsletter_register_email_exists(client):
         assert Newsletter.objects.filter(email='rafal.czerwik@gmail.com').count() == 1
         assert response.status_code == 302
         assert 'Email already registered!' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_category_page_served_from_cache(client, django_assert_num_queries):
+    """
+    Test function to verify that an anonymous visitor gets the category page from the page cache.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    category = Category.objects.create(name='Car')
+
+    response = client.get(f'/category/{category.id}/')
+    assert response.status_code == 200
+
+    with django_assert_num_queries(0):
+        response = client.get(f'/category/{category.id}/')
+    assert response.status_code == 200
+    assert 'Sign in or Register' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_cached_page_personal_fragments(client):
+    """
+    Test function to verify that the cached page shows the header of the logged-in user.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    User.objects.create_user(username='testuser', password='testtesttesttest')
+
+    response = client.get('/about-us/')
+    assert 'Sign in or Register' in response.content.decode()
+
+    client.login(username='testuser', password='testtesttesttest')
+    response = client.get('/about-us/')
+    assert response.status_code == 200
+    assert 'My profile (testuser)' in response.content.decode()
+    assert 'Sign in or Register' not in response.content.decode()
+    assert '<!--personal:' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_page_cache_invalidated_by_new_listing(client):
+    """
+    Test function to verify that adding a listing invalidates the cached category page.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+
+    response = client.get(f'/category/{category.id}/')
+    assert 'Cached Listing' not in response.content.decode()
+
+    Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Cached Listing',
+                            description='This is a test listing', price=10.99)
+
+    response = client.get(f'/category/{category.id}/')
+    assert 'Cached Listing' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_page_cache_invalidated_by_scope(client):
+    """
+    Test function to verify that a changed listing invalidates only the cached pages showing it,
+    that a new favourite updates the count on the cached listing page, and that the carousel of
+    the cached index page is picked for every request.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    car, bike = Category.objects.create(name='Car'), Category.objects.create(name='Bike')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listing = Listings.objects.create(user_id=user, category_id=car, address_id=address, title='Old title',
+                                      description='This is a test listing', price=10.99)
+    for index in range(6):
+        Listings.objects.create(user_id=user, category_id=bike, address_id=address, title=f'Promoted {index}',
+                                description='This is a test listing', price=10.99, promotion='Promoted')
+
+    client.get(f'/category/{bike.id}/')
+    client.get(f'/category/{car.id}/')
+    assert 'Favourited by 0 user(s)' in client.get(f'/listing-details/{listing.id}/').content.decode()
+
+    listing.title = 'New title'
+    listing.save()
+    Favourite.objects.create(user=user, listing=listing)
+    assert 'New title' in client.get(f'/category/{car.id}/').content.decode()
+    assert 'Favourited by 1 user(s)' in client.get(f'/listing-details/{listing.id}/').content.decode()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(f'/category/{bike.id}/')
+    assert not any('sell_it_app_listings' in query['sql'] for query in queries.captured_queries)
+
+    carousels = set()
+    for _ in range(10):
+        content = client.get('/').content.decode()
+        carousels.add(tuple(re.findall(r'<h3>(Promoted \d)</h3>', content)))
+    assert all(len(carousel) == 3 for carousel in carousels)
+    assert len(carousels) > 1
+
+
+@pytest.mark.django_db
+def test_listing_cards_rendered_from_cache(django_assert_num_queries):
+    """
+    Test function to verify that listing cards are rendered once and then read from the fragment cache.
+
+    Args:
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    for i in range(6):
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, title=f'Card {i}',
+                                description='This is a test listing', price=10.99)
+
+    listings = list(Listings.objects.all())
+    cards = render_listing_cards(listings, 'category')
+    assert len(cards) == 6
+    assert 'Warsaw' in cards[0]
+
+    with django_assert_num_queries(0):
+        assert render_listing_cards(listings, 'category') == cards
+
+
+@pytest.mark.django_db
+def test_listing_card_version_bumped(client):
+    """
+    Test function to verify that the card version changes with the listing and its address.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listing = Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Card',
+                                      description='This is a test listing', price=10.99)
+    assert 'Warsaw' in render_listing_cards([listing], 'category')[0]
+
+    address.city = 'Cracow'
+    address.save()
+    listing.refresh_from_db()
+    assert listing.card_version == 1
+    assert 'Cracow' in render_listing_cards([listing], 'category')[0]
+
+    listing.title = 'New title'
+    listing.save()
+    assert listing.card_version == 2
+    assert 'New title' in render_listing_cards([listing], 'category')[0]
+
+
+@pytest.mark.django_db
+def test_my_listings_cards_csrf_token(client):
+    """
+    Test function to verify that cached cards on the My Listings page get the CSRF token of the request.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Card',
+                            description='This is a test listing', price=10.99)
+
+    client.login(username='testuser', password='testtesttesttest')
+    response = client.get('/listings/')
+    assert response.status_code == 200
+    assert 'Card' in response.content.decode()
+    assert CSRF_TOKEN_PLACEHOLDER not in response.content.decode()
+    assert 'csrfmiddlewaretoken' in response.content.decode()
+
+
+def test_local_lru_cache_evicts_least_recently_used():
+    """
+    Test function to verify that the local LRU cache keeps at most max_entries entries.
+
+    Returns:
+        None
+    """
+
+    local = LocalLRUCache(max_entries=2)
+    local.set('a', 1, None)
+    local.set('b', 2, None)
+    assert local.get('a') == 1
+    local.set('c', 3, None)
+
+    assert local.get('b') is None
+    assert local.get('a') == 1
+    assert local.get('c') == 3
+
+    local.set('d', 4, 0)
+    assert local.get('d') is None
+
+
+def test_two_tier_cache_get_or_set_single_flight():
+    """
+    Test function to verify that concurrent get_or_set calls on a missing key compute the value only once.
+
+    Returns:
+        None
+    """
+
+    two_tier = TwoTierCache('test-single-flight', {'OPTIONS': {'EARLY_REFRESH_BETA': 0}})
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'page'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(two_tier.get_or_set('hot', compute, 60)))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['page'] * 20
+    assert two_tier.get('hot') == 'page'
+
+
+def test_two_tier_cache_early_refresh(monkeypatch):
+    """
+    Test function to verify that a value close to its expiry is refreshed early and plain values are not.
+
+    Args:
+        monkeypatch: Fixture used to make the early refresh decision deterministic.
+
+    Returns:
+        None
+    """
+
+    monkeypatch.setattr('sell_it_app.cache_backends.random.random', lambda: 0.5)
+    two_tier = TwoTierCache('test-early-refresh', {'OPTIONS': {'EARLY_REFRESH_BETA': 1000}})
+    assert two_tier.get_or_set('key', lambda: (time.sleep(0.01), 'old')[1], 1) == 'old'
+    assert two_tier.get_or_set('key', lambda: 'new', 1) == 'new'
+
+    two_tier.set('plain', 'value')
+    assert two_tier.get_or_set('plain', lambda: 'new') == 'value'
+    assert two_tier.get_or_set('none', lambda: None) is None
+    assert two_tier.has_key('none') is False
+
+
+def test_two_tier_cache_reads_shared_tier():
+    """
+    Test function to verify that values written by another process are read from the shared tier.
+
+    Returns:
+        None
+    """
+
+    two_tier = TwoTierCache('test-shared', {})
+    two_tier.shared.set('a', 1)
+    two_tier.set('b', 2)
+    two_tier.local.clear()
+
+    assert two_tier.get_many(['a', 'b', 'c']) == {'a': 1, 'b': 2}
+    assert len(two_tier.local) == 2
+    assert two_tier.incr('a') == 2
+    two_tier.delete('b')
+    assert two_tier.get('b') is None
+
+
+def test_two_tier_cache_keeps_expiry_and_foreign_locks():
+    """
+    Test function to verify that a value read from the shared tier is kept in the local tier no
+    longer than it lives in the shared one, and that get_or_set() never releases the lock of a
+    key held by another process.
+
+    Returns:
+        None
+    """
+
+    writer = TwoTierCache('test-expiry', {})
+    reader = TwoTierCache('test-expiry', {'OPTIONS': {'LOCAL_TIMEOUT': 60, 'LOCK_TIMEOUT': 0.1}})
+    writer.set('short', 'value', 0.3)
+    writer.set('counter', 1, 0.3)
+    assert reader.get('short') == 'value'
+    assert reader.incr('counter') == 2
+    time.sleep(0.4)
+    assert reader.get('short') is None
+    assert reader.get('counter') is None
+
+    writer.shared.add('hot:lock', 1, 10)
+    assert reader.get_or_set('hot', lambda: 'page', 60) == 'page'
+    assert writer.shared.get('hot:lock') == 1
+
+
+@pytest.mark.django_db
+def test_object_cache_read_through(django_assert_num_queries):
+    """
+    Test function to verify that listings are read from the object cache and invalidated on save.
+
+    Args:
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listing = Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Cached',
+                                      description='This is a test listing', price=10.99)
+
+    with django_assert_num_queries(2):
+        assert get_cached_object(Listings, listing.id).title == 'Cached'
+        assert get_cached_object(User, user.id).username == 'testuser'
+    with django_assert_num_queries(0):
+        assert get_cached_object(Listings, listing.id).title == 'Cached'
+        assert get_cached_object(User, str(user.id)).username == 'testuser'
+
+    listing.title = 'Updated'
+    listing.save()
+    assert get_cached_object(Listings, listing.id).title == 'Updated'
+
+    listing.delete()
+    with pytest.raises(Listings.DoesNotExist):
+        get_cached_object(Listings, listing.id)
+
+
+@pytest.mark.django_db
+def test_object_cache_identity_map():
+    """
+    Test function to verify that a listing is loaded only once per request.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listing = Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Cached',
+                                      description='This is a test listing', price=10.99)
+
+    token = start_identity_map()
+    try:
+        assert get_cached_object(Listings, listing.id) is get_cached_object(Listings, listing.id)
+    finally:
+        end_identity_map(token)
+    assert get_cached_object(Listings, listing.id) is not get_cached_object(Listings, listing.id)
+
+
+@pytest.mark.django_db
+def test_update_listing_status_keeps_database_counters(client):
+    """
+    Test function to verify updating a listing doesn't overwrite the favourite count and card
+    version maintained in the database with the ones of an old cached copy.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='testcategory')
+    address = Address.objects.create(user_id=user, street_name='test', postal_code='1234', city='test', country='test')
+    listing = Listings.objects.create(
+        user_id=user, category_id=category, address_id=address, condition='New', offer_type='Sell',
+        title='Test title', description='This is a test listing', price=100, status='Active',
+    )
+    get_cached_object(Listings, listing.id)
+    Listings.objects.filter(pk=listing.pk).update(favourite_count=3, card_version=F('card_version') + 5)
+    card_version = Listings.objects.get(pk=listing.pk).card_version
+
+    client.login(username='testuser', password='testtesttesttest')
+    client.post(f'/listing/update-status/{listing.id}/')
+
+    listing.refresh_from_db()
+    assert listing.status == 'Inactive'
+    assert listing.favourite_count == 3
+    assert listing.card_version == card_version + 1
+
+    stale = get_cached_object(Listings, listing.id)
+    stale.favourite_count = 0
+    stale.save()
+    listing.refresh_from_db()
+    assert listing.favourite_count == 3
+    assert listing.card_version == card_version + 2
+
+
+@pytest.mark.django_db
+def test_query_cache_category_table(django_assert_num_queries):
+    """
+    Test function to verify that category querysets are cached and invalidated by writes to the table.
+
+    Args:
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    Category.objects.create(name='Car')
+    assert [category.name for category in Category.objects.all()] == ['Car']
+    assert Category.objects.get(name='Car').name == 'Car'
+
+    with django_assert_num_queries(0):
+        assert [category.name for category in Category.objects.all()] == ['Car']
+        assert Category.objects.get(name='Car').name == 'Car'
+
+    Category.objects.create(name='Boat')
+    assert Category.objects.all().count() == 2
+    assert len(Category.objects.all()) == 2
+
+    Category.objects.filter(name='Boat').update(name='Work')
+    assert sorted(Category.objects.values_list('name', flat=True)) == ['Car', 'Work']
+
+
+@pytest.mark.django_db
+def test_query_cache_opt_in_user_lookup(django_assert_num_queries):
+    """
+    Test function to verify that user querysets are cached only with cached().
+
+    Args:
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    User.objects.create_superuser(username='Admin')
+    assert User.objects.cached().get(username='Admin').username == 'Admin'
+
+    with django_assert_num_queries(0):
+        assert User.objects.cached().get(username='Admin').username == 'Admin'
+    with django_assert_num_queries(1):
+        assert User.objects.get(username='Admin').username == 'Admin'
+
+
+@pytest.mark.django_db
+def test_reply_joins_message_thread(client):
+    """
+    Test function to verify that a reply is added to the conversation of the original message
+    and that the last message and unread pointers of the conversation are updated.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    message = Messages.objects.create(title='Test Message', message='Test Message', from_user=user, to_user=user1)
+
+    client.login(username='testuser1', password='testtest1')
+    client.post(f'/send-message/{message.id}/', {'message': 'test return message'})
+    client.post(f'/send-message/{message.id}/', {'message': 'second return message'})
+
+    thread = Thread.objects.get()
+    reply = Messages.objects.latest('id')
+    assert reply.thread_id == message.thread_id == thread.id
+    assert reply.to_user == user
+    assert thread.last_message == reply
+    assert ThreadParticipant.objects.get(thread=thread, user=user).unread_count == 2
+    assert ThreadParticipant.objects.get(thread=thread, user=user1).unread_count == 1
+
+    reply.delete()
+    thread.refresh_from_db()
+    assert thread.last_message_id == Messages.objects.latest('id').id
+    assert ThreadParticipant.objects.get(thread=thread, user=user).unread_count == 1
+
+
+@pytest.mark.django_db
+def test_messages_view_lists_threads(client):
+    """
+    Test function to verify that the inbox lists conversations instead of single messages.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    message = Messages.objects.create(title='First', message='Test Message', from_user=user, to_user=user1)
+    Messages.objects.create(title='RE: First', message='Reply', from_user=user1, to_user=user, thread=message.thread)
+    Messages.objects.create(title='Second', message='Test Message', from_user=user1, to_user=user)
+
+    client.login(username='testuser', password='testtest')
+    response = client.get('/messages/')
+    assert response.status_code == 200
+    assert [participant.thread.title for participant in response.context['threads']] == ['Second', 'First']
+    assert response.context['user_messages'] == 2
+    assert response.context['user_unread_messages'] == 2
+    assert response.context['user_sent_messages'] == 1
+
+    response = client.get('/messages/', {'message_type': 'Sent'})
+    assert [participant.thread.title for participant in response.context['threads']] == ['First']
+
+
+@pytest.mark.django_db
+def test_conversation_view_marks_messages_read(client, django_assert_max_num_queries):
+    """
+    Test function to verify that the conversation view shows all messages of a conversation,
+    marks them as read and is forbidden for users outside of the conversation.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_max_num_queries: Fixture limiting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    User.objects.create_user(username='testuser2', password='testtest2')
+    message = Messages.objects.create(title='First', message='Test Message', from_user=user1, to_user=user)
+    for number in range(5):
+        Messages.objects.create(title='RE: First', message=f'Reply {number}', from_user=user1, to_user=user,
+                                thread=message.thread)
+
+    client.login(username='testuser', password='testtest')
+    with django_assert_max_num_queries(12):
+        response = client.get(f'/conversation/{message.thread_id}/')
+    assert response.status_code == 200
+    assert len(response.context['thread_messages']) == 6
+    assert not Messages.objects.filter(status='Unread').exists()
+    assert ThreadParticipant.objects.get(user=user).unread_count == 0
+
+    client.login(username='testuser2', password='testtest2')
+    response = client.get(f'/conversation/{message.thread_id}/')
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_messages_bulk_mark_read_and_unread(client, django_assert_max_num_queries):
+    """
+    Test function to verify that bulk status changes run a constant number of queries,
+    only change messages of the user and keep the unread counts in sync.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_max_num_queries: Fixture limiting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    first = Messages.objects.create(title='First', message='Test Message', from_user=user1, to_user=user)
+    second = Messages.objects.create(title='Second', message='Test Message', from_user=user1, to_user=user)
+    for number in range(20):
+        Messages.objects.create(title='RE: First', message=f'Reply {number}', from_user=user1, to_user=user,
+                                thread=first.thread)
+    other = Messages.objects.create(title='Other', message='Test Message', from_user=user, to_user=user1)
+
+    client.login(username='testuser', password='testtest')
+    with django_assert_max_num_queries(12):
+        response = client.post('/messages/bulk/', {'action': 'mark-all-read'})
+    assert response.status_code == 302
+    assert not Messages.objects.filter(to_user=user, status='Unread').exists()
+    assert Messages.objects.get(id=other.id).status == 'Unread'
+    assert set(ThreadParticipant.objects.filter(user=user).values_list('unread_count', flat=True)) == {0}
+    assert ThreadParticipant.objects.get(user=user1, thread=other.thread).unread_count == 1
+
+    client.post('/messages/bulk/', {'action': 'mark-unread', 'thread_id': [first.thread_id, other.thread_id]})
+    assert ThreadParticipant.objects.get(user=user, thread=first.thread).unread_count == 21
+    assert ThreadParticipant.objects.get(user=user, thread=second.thread).unread_count == 0
+
+    client.post('/messages/bulk/', {'action': 'mark-read', 'message_id': [first.id]})
+    assert ThreadParticipant.objects.get(user=user, thread=first.thread).unread_count == 20
+
+
+@pytest.mark.django_db
+def test_messages_bulk_delete(client, django_assert_max_num_queries):
+    """
+    Test function to verify that bulk deletes run a constant number of queries, only delete
+    messages received by the user, leaving the messages the user sent to their recipients, and
+    remove conversations left without messages.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_max_num_queries: Fixture limiting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    user2 = User.objects.create_user(username='testuser2', password='testtest2')
+    first = Messages.objects.create(title='First', message='Test Message', from_user=user1, to_user=user)
+    for number in range(20):
+        Messages.objects.create(title='RE: First', message=f'Reply {number}', from_user=user1, to_user=user,
+                                thread=first.thread)
+    old = Messages.objects.create(title='Old', message='Test Message', from_user=user1, to_user=user)
+    Messages.objects.filter(id=old.id).update(date_sent=old.date_sent - timedelta(days=60))
+    recent = Messages.objects.create(title='Recent', message='Test Message', from_user=user1, to_user=user)
+    other = Messages.objects.create(title='Other', message='Test Message', from_user=user1, to_user=user2)
+    chat = Messages.objects.create(title='Chat', message='Test Message', from_user=user1, to_user=user)
+    sent = Messages.objects.create(title='RE: Chat', message='Test Message', from_user=user, to_user=user1,
+                                   thread=chat.thread)
+    old_sent = Messages.objects.create(title='Old sent', message='Test Message', from_user=user, to_user=user1)
+    Messages.objects.filter(id=old_sent.id).update(date_sent=old_sent.date_sent - timedelta(days=60))
+
+    client.login(username='testuser', password='testtest')
+    with django_assert_max_num_queries(12):
+        response = client.post('/messages/bulk/', {'action': 'delete',
+                                                       'thread_id': [first.thread_id, other.thread_id, chat.thread_id]})
+    assert response.status_code == 302
+    assert not Messages.objects.filter(thread_id=first.thread_id).exists()
+    assert not Thread.objects.filter(id=first.thread_id).exists()
+    assert Messages.objects.filter(id=other.id).exists()
+    assert list(Messages.objects.filter(thread_id=chat.thread_id)) == [sent]
+    assert Thread.objects.get(id=chat.thread_id).last_message_id == sent.id
+
+    for days in [0, -5, '2.5', 'all', 10 ** 9]:
+        response = client.post('/messages/bulk/', {'action': 'delete-older-than', 'days': days}, follow=True)
+        assert 'Invalid number of days!' in response.content.decode()
+    assert Messages.objects.filter(id=recent.id).exists() and Messages.objects.filter(id=old.id).exists()
+
+    client.post('/messages/bulk/', {'action': 'delete-older-than', 'days': 30})
+    assert list(Messages.objects.filter(to_user=user)) == [recent]
+    assert Messages.objects.filter(id=old_sent.id).exists()
+    assert ThreadParticipant.objects.filter(user=user).count() == 3
+
+
+@pytest.mark.django_db
+def test_archive_messages(client):
+    """
+    Test function to verify that old read messages are moved to the archive in batches
+    and are listed only in the archived tab.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    first = Messages.objects.create(title='First', message='Old message', from_user=user1, to_user=user, status='Read')
+    for number in range(4):
+        Messages.objects.create(title='RE: First', message=f'Old reply {number}', from_user=user1, to_user=user,
+                                status='Read', thread=first.thread)
+    unread = Messages.objects.create(title='Unread', message='Old unread message', from_user=user1, to_user=user)
+    recent = Messages.objects.create(title='Recent', message='Recent message', from_user=user1, to_user=user,
+                                     status='Read')
+    old_date = timezone.now() - timedelta(days=100)
+    Messages.objects.exclude(id=recent.id).update(date_sent=old_date)
+
+    assert archive_messages(days=90, batch_size=2) == 5
+    assert set(Messages.objects.values_list('id', flat=True)) == {unread.id, recent.id}
+    assert ArchivedMessage.objects.filter(to_user=user, date_sent=old_date).count() == 5
+    assert not Thread.objects.filter(id=first.thread_id).exists()
+
+    client.login(username='testuser', password='testtest')
+    response = client.get('/messages/', {'message_type': 'Archived'})
+    assert response.status_code == 200
+    assert len(response.context['threads']) == 5
+    response = client.get('/messages/')
+    assert [participant.thread.title for participant in response.context['threads']] == ['Recent', 'Unread']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_archive_skips_messages_locked_by_other_transactions():
+    """
+    Test function to verify that a batch of the archive skips the read messages locked by another
+    transaction, so a message marked unread meanwhile is neither archived nor deleted.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    read = Messages.objects.create(title='Read', message='Old message', to_user=user, status='Read')
+    reopened = Messages.objects.create(title='Reopened', message='Old message', to_user=user, status='Read')
+    old_date = timezone.now() - timedelta(days=100)
+    Messages.objects.update(date_sent=old_date)
+    locked, archived = threading.Event(), threading.Event()
+
+    def mark_unread():
+        try:
+            with transaction.atomic():
+                Messages.objects.select_for_update().get(id=reopened.id)
+                locked.set()
+                archived.wait(5)
+                Messages.objects.filter(id=reopened.id).update(status='Unread')
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=mark_unread)
+    thread.start()
+    assert locked.wait(5)
+    try:
+        assert archive_messages_batch(timezone.now(), 10) == 1
+    finally:
+        archived.set()
+        thread.join()
+
+    assert list(Messages.objects.values_list('id', 'status')) == [(reopened.id, 'Unread')]
+    assert list(ArchivedMessage.objects.values_list('title', flat=True)) == [read.title]
+
+
+@pytest.mark.django_db
+def test_messages_full_text_search(client):
+    """
+    Test function to verify that the mailbox search finds messages of the user by title and content
+    using the full-text index.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    user2 = User.objects.create_user(username='testuser2', password='testtest2')
+    bike = Messages.objects.create(title='Bike', message='Is the red bicycle still available?', from_user=user1,
+                                   to_user=user)
+    sent = Messages.objects.create(title='RE: Bike', message='Yes, the bicycle is available.', from_user=user,
+                                   to_user=user1, thread=bike.thread)
+    Messages.objects.create(title='Car', message='What is the mileage?', from_user=user1, to_user=user)
+    Messages.objects.create(title='Bicycle', message='Other mailbox', from_user=user1, to_user=user2)
+
+    assert list(search_messages(user, 'bicycle')) == [sent, bike]
+    assert list(search_messages(user, 'bike')) == [sent, bike]
+    assert list(search_messages(user, 'bicycle -red')) == [sent]
+
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+    search = Messages.objects.alias(search=SearchVector('title', 'message', config='simple'))
+    assert 'message_search_idx' in search.filter(search=SearchQuery('bicycle', config='simple')).explain()
+    plan = search_messages(user, 'bicycle').explain()
+    assert 'Seq Scan' not in plan
+
+    client.login(username='testuser', password='testtest')
+    response = client.get('/messages/', {'q': 'mileage'})
+    assert response.status_code == 200
+    assert response.context['message_type'] == 'Search'
+    assert [message.title for message in response.context['threads']] == ['Car']
+
+
+class RecordingBroker:
+    """
+    Broker recording the published events, used to test notifications.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def publish(self, channel, event):
+        self.events.append((channel, event))
+
+
+def test_in_process_broker_delivers_events():
+    """
+    Test function to verify that the in-process broker delivers events published from
+    another thread to the subscribers of the channel only.
+
+    Returns:
+        None
+    """
+
+    broker = InProcessBroker()
+
+    async def receive():
+        queue = broker.subscribe('user:1')
+        other_queue = broker.subscribe('user:2')
+        await asyncio.to_thread(broker.publish, 'user:1', {'type': 'unread', 'count': 3})
+        event = await asyncio.wait_for(queue.get(), 1)
+        broker.unsubscribe('user:1', queue)
+        broker.publish('user:1', {'type': 'unread', 'count': 4})
+        await asyncio.sleep(0)
+        return event, queue.empty(), other_queue.empty()
+
+    assert asyncio.run(receive()) == ({'type': 'unread', 'count': 3}, True, True)
+
+
+@pytest.mark.django_db
+def test_new_message_publishes_notifications(client, settings, monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Test function to verify that new messages and status changes publish the unread count
+    of the recipient after the transaction is committed.
+
+    Args:
+        client (Client): Django test client.
+        settings: Fixture overriding Django settings.
+        monkeypatch: Fixture replacing the broker.
+        django_capture_on_commit_callbacks: Fixture running the on commit callbacks.
+
+    Returns:
+        None
+    """
+
+    settings.NOTIFICATIONS_BROKER = 'sell_it_app.tests.RecordingBroker'
+    monkeypatch.setattr(notifications, '_broker', None)
+    with django_capture_on_commit_callbacks(execute=True):
+        Messages.objects.create(title='Unseen', message='Not streamed', to_user=User.objects.create_user('other'))
+    assert notifications.get_broker().events == []
+    settings.NOTIFICATIONS_STREAMING = True
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        message = Messages.objects.create(title='Bike', message='Is it available?', from_user=user1, to_user=user)
+    channel = f'user:{user.id}'
+    assert notifications.get_broker().events == [
+        (channel, {'type': 'new-message', 'title': 'Bike', 'sender': 'testuser1', 'thread': message.thread_id}),
+        (channel, {'type': 'unread', 'count': 1}),
+    ]
+
+    client.login(username='testuser', password='testtest')
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post('/messages/bulk/', {'action': 'mark-all-read'})
+    assert notifications.get_broker().events[-1] == (channel, {'type': 'unread', 'count': 0})
+
+    settings.NOTIFICATIONS_STREAMING = False
+    assert client.get('/messages/events/').status_code == 204
+    client.logout()
+    assert client.get('/messages/events/').status_code == 403
+
+
+@pytest.mark.django_db(transaction=True)
+def test_postgres_broker_delivers_events_committed_in_other_connections():
+    """
+    Test function to verify that the PostgreSQL broker delivers the events published from
+    another connection, as from another process, once they are committed.
+
+    Returns:
+        None
+    """
+
+    broker = PostgresBroker()
+    broker.poll_timeout = 0.1
+
+    async def receive():
+        queue = broker.subscribe('user:1')
+        assert await asyncio.to_thread(broker.listening.wait, 5)
+        await asyncio.to_thread(broker.publish, 'user:1', {'type': 'unread', 'count': 3})
+        return await asyncio.wait_for(queue.get(), 5)
+
+    try:
+        assert asyncio.run(receive()) == {'type': 'unread', 'count': 3}
+    finally:
+        broker.stop()
+
+
+@pytest.mark.django_db
+def test_unread_count_polled_without_streaming(client, settings):
+    """
+    Test function to verify that the unread count is answered at once when notifications
+    aren't streamed, and that the pages poll it instead of opening a stream.
+
+    Args:
+        client (Client): Django test client.
+        settings: Fixture overriding Django settings.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtest')
+    user1 = User.objects.create_user(username='testuser1', password='testtest1')
+    Messages.objects.create(title='Bike', message='Is it available?', from_user=user1, to_user=user)
+    assert client.get(reverse('message-unread-count')).status_code == 403
+
+    client.login(username='testuser', password='testtest')
+    assert client.get(reverse('message-unread-count')).json() == {'count': 1}
+
+    content = client.get(reverse('index')).content.decode()
+    assert reverse('message-unread-count') in content
+    assert 'EventSource' not in content
+    settings.NOTIFICATIONS_STREAMING = True
+    content = client.get(reverse('index')).content.decode()
+    assert 'EventSource' in content
+
+
+@task
+def flaky_task(fail):
+    """
+    Task failing when asked to, used to test the background jobs.
+    """
+
+    if fail:
+        raise ValueError('Task failed')
+
+
+@pytest.mark.django_db
+def test_jobs_run_by_priority_and_retried():
+    """
+    Test function to verify that jobs run by priority and that failed jobs are retried with
+    a growing delay until they run out of attempts.
+
+    Returns:
+        None
+    """
+
+    low = flaky_task.enqueue(False)
+    high = flaky_task.enqueue(False, priority=10)
+    failing = flaky_task.enqueue(True, max_attempts=2)
+
+    assert claim_job('worker') == high
+    assert Job.objects.get(id=high.id).status == 'Running'
+    assert claim_job('worker') == low
+    job = claim_job('worker')
+    assert job == failing
+    assert claim_job('worker') is None
+
+    assert not run_job(job)
+    job.refresh_from_db()
+    assert job.status == 'Queued'
+    assert job.attempts == 1
+    assert 'Task failed' in job.last_error
+    assert job.run_at > timezone.now()
+    assert run_queued_jobs() == 0
+
+    Job.objects.filter(id=job.id).update(run_at=timezone.now())
+    assert run_queued_jobs() == 1
+    job.refresh_from_db()
+    assert job.status == 'Failed'
+    assert job.attempts == 2
+
+    with pytest.raises(KeyError):
+        enqueue('sell_it_app.tests.unknown_task')
+
+
+@pytest.mark.django_db
+def test_jobs_with_expired_lease_requeued_as_failed_attempts():
+    """
+    Test function to verify that only running jobs whose lease expired are queued again, and
+    that every requeue counts as an attempt, so a job killing its worker eventually fails.
+
+    Returns:
+        None
+    """
+
+    alive = flaky_task.enqueue(False)
+    lost = flaky_task.enqueue(True, max_attempts=2)
+    assert claim_job('worker1') == alive
+    assert claim_job('worker2') == lost
+    assert requeue_stale_jobs() == 0
+
+    Job.objects.filter(id=lost.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    assert requeue_stale_jobs() == 1
+    lost.refresh_from_db()
+    assert (lost.status, lost.attempts) == ('Queued', 1)
+    assert Job.objects.get(id=alive.id).status == 'Running'
+
+    assert claim_job('worker3') == lost
+    Job.objects.filter(id=lost.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    assert requeue_stale_jobs() == 0
+    lost.refresh_from_db()
+    assert (lost.status, lost.attempts) == ('Failed', 2)
+    assert 'lease' in lost.last_error
+
+
+@pytest.mark.django_db
+def test_contact_message_delivered_by_job(client):
+    """
+    Test function to verify that the contact form queues the message delivery as a background job
+    and that the admin job page shows the jobs.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    admin = User.objects.create_superuser(username='Admin', password='adminadmin')
+    client.post('/contact/', {'title': 'test title', 'message': 'test message', 'email': 'test@gmail.com'})
+
+    job = Job.objects.get()
+    assert job.task == 'sell_it_app.tasks.deliver_contact_message'
+    assert not Messages.objects.exists()
+    assert run_queued_jobs() == 1
+    assert Messages.objects.get().to_user == admin
+    assert Job.objects.get().status == 'Done'
+
+    client.login(username='Admin', password='adminadmin')
+    response = client.get('/admin/sell_it_app/job/')
+    assert response.status_code == 200
+    assert ('Done', 1) in response.context['status_counts']
+
+
+@pytest.mark.django_db
+def test_newsletter_campaign_sent_in_throttled_batches(monkeypatch):
+    """
+    Test function to verify that a campaign is sent to every subscriber once, in throttled batches,
+    with its content rendered from the campaign template.
+
+    Args:
+        monkeypatch: Fixture recording the throttling pauses.
+
+    Returns:
+        None
+    """
+
+    pauses = []
+    monkeypatch.setattr('sell_it_app.campaigns.time.sleep', pauses.append)
+    Newsletter.objects.bulk_create([Newsletter(email=f'user{number}@example.com') for number in range(25)])
+    campaign = NewsletterCampaign.objects.create(subject='News', body='Hello from {{ campaign.subject }}!')
+
+    assert send_campaign(campaign.id, batch_size=10, send_rate=10) == 25
+    assert len(mail.outbox) == 25
+    assert sorted(email.to[0] for email in mail.outbox) == sorted(Newsletter.objects.values_list('email', flat=True))
+    assert mail.outbox[0].body == 'Hello from News!'
+    assert 'Hello from News!' in mail.outbox[0].alternatives[0][0]
+    assert len(pauses) == 3 and all(pause > 0 for pause in pauses)
+
+    campaign.refresh_from_db()
+    assert campaign.status == 'Sent'
+    assert campaign.sent_count == 25
+    assert send_campaign(campaign.id) == 0
+
+
+@pytest.mark.django_db
+def test_newsletter_campaign_resumes_after_crash(monkeypatch):
+    """
+    Test function to verify that an interrupted campaign resumes after the last batch sent.
+
+    Args:
+        monkeypatch: Fixture making the email backend fail.
+
+    Returns:
+        None
+    """
+
+    Newsletter.objects.bulk_create([Newsletter(email=f'user{number}@example.com') for number in range(25)])
+    campaign = NewsletterCampaign.objects.create(subject='News', body='Hello!')
+    send_messages = EmailBackend.send_messages
+
+    def send_one_batch(backend, messages):
+        if mail.outbox:
+            raise ConnectionError('SMTP server went away')
+        return send_messages(backend, messages)
+
+    monkeypatch.setattr(EmailBackend, 'send_messages', send_one_batch)
+    with pytest.raises(ConnectionError):
+        send_campaign(campaign.id, batch_size=10, send_rate=1000)
+    campaign.refresh_from_db()
+    assert campaign.status == 'Sending'
+    assert campaign.sent_count == 10
+
+    monkeypatch.setattr(EmailBackend, 'send_messages', send_messages)
+    assert send_campaign(campaign.id, batch_size=10, send_rate=1000) == 15
+    assert len({email.to[0] for email in mail.outbox}) == len(mail.outbox) == 25
+
+
+@pytest.mark.django_db
+def test_newsletter_campaign_claimed_by_one_sender(admin_user, client):
+    """
+    Test function to verify that a campaign held by a sender isn't sent by another one, and
+    that sending it twice from the admin queues a single job.
+
+    Args:
+        admin_user (User): Superuser fixture.
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    Newsletter.objects.bulk_create([Newsletter(email=f'user{number}@example.com') for number in range(5)])
+    campaign = NewsletterCampaign.objects.create(subject='News', body='Hello!')
+    client.force_login(admin_user)
+    changelist = reverse('admin:sell_it_app_newslettercampaign_changelist')
+    for _ in range(2):
+        client.post(changelist, {'action': 'send_campaigns', '_selected_action': [campaign.id]})
+    assert Job.objects.filter(task='sell_it_app.tasks.send_newsletter_campaign').count() == 1
+
+    NewsletterCampaign.objects.filter(id=campaign.id).update(
+        status='Sending', claim_token='other', lease_expires_at=timezone.now() + timedelta(minutes=5))
+    assert send_campaign(campaign.id, send_rate=1000) == 0
+    client.post(changelist, {'action': 'send_campaigns', '_selected_action': [campaign.id]})
+    assert run_queued_jobs() == 1
+    assert mail.outbox == []
+
+    NewsletterCampaign.objects.filter(id=campaign.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    assert send_campaign(campaign.id, send_rate=1000) == 5
+    campaign.refresh_from_db()
+    assert (campaign.status, campaign.sent_count, campaign.claim_token) == ('Sent', 5, '')
+
+
+@pytest.mark.django_db
+def test_newsletter_subscription_normalized_and_unique(client):
+    """
+    Test function to verify that newsletter emails are normalized and subscribed once.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    response = client.post('/newsletter/', {'email': 'Test@Gmail.com '})
+    assert response.status_code == 302
+    assert list(Newsletter.objects.values_list('email', flat=True)) == ['test@gmail.com']
+
+    response = client.post('/newsletter/', {'email': 'test@GMAIL.com'}, follow=True)
+    assert Newsletter.objects.count() == 1
+    assert 'Email already registered!' in response.content.decode()
+
+    with pytest.raises(IntegrityError):
+        Newsletter.objects.create(email='TEST@gmail.com')
+
+
+@pytest.mark.django_db
+def test_newsletter_csv_import_and_export(client, tmp_path, capsys):
+    """
+    Test function to verify that subscribers are imported from and exported to CSV files,
+    skipping invalid rows and already subscribed emails.
+
+    Args:
+        client (Client): Django test client.
+        tmp_path: Fixture providing a temporary directory.
+        capsys: Fixture capturing the exported CSV.
+
+    Returns:
+        None
+    """
+
+    Newsletter.objects.create(email='old@example.com')
+    path = tmp_path / 'subscribers.csv'
+    rows = ['email', 'OLD@example.com', 'new1@example.com', 'not an email', '', 'New1@example.com ']
+    rows += [f'user{number}@example.com' for number in range(10)]
+    path.write_text('\n'.join(rows) + '\n')
+
+    call_command('import_newsletter_csv', str(path), batch_size=4)
+    assert Newsletter.objects.count() == 12
+    assert 'Processed 13 valid email(s), skipped 3 invalid row(s).' in capsys.readouterr().out
+
+    call_command('export_newsletter_csv')
+    exported = capsys.readouterr().out.splitlines()
+    assert exported[:3] == ['email', 'old@example.com', 'new1@example.com']
+    assert len(exported) == 13
+
+    User.objects.create_superuser(username='Admin', password='adminadmin')
+    client.login(username='Admin', password='adminadmin')
+    upload = SimpleUploadedFile('subscribers.csv', b'email\nadmin1@example.com\nold@example.com\n', 'text/csv')
+    response = client.post('/admin/sell_it_app/newsletter/import-csv/', {'csv_file': upload})
+    assert response.status_code == 302
+    assert Newsletter.objects.count() == 13
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """
+    Test function to verify that a Bloom filter contains every added value and few others.
+
+    Returns:
+        None
+    """
+
+    bloom_filter = BloomFilter(1000, error_rate=0.01, shared=True)
+    for number in range(1000):
+        bloom_filter.add(f'user{number}')
+
+    assert all(f'user{number}' in bloom_filter for number in range(1000))
+    false_positives = sum(f'other{number}' in bloom_filter for number in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.django_db
+def test_shared_bloom_filter_rebuilt_only_by_its_builder(settings, monkeypatch):
+    """
+    Test function to verify that a shared Bloom filter over its capacity is rebuilt by the
+    process that built it, and kept by the worker processes forked from it.
+
+    Args:
+        settings (pytest fixture): The Django settings.
+        monkeypatch (pytest fixture): Fixture replacing the process id.
+
+    Returns:
+        None
+    """
+
+    settings.BLOOM_FILTER_SHARED = True
+    settings.BLOOM_FILTER_MIN_CAPACITY = 10
+    USERNAMES.build()
+    shared_filter = USERNAMES._filter
+    for number in range(11):
+        USERNAMES.add(f'user{number}')
+
+    monkeypatch.setattr('sell_it_app.bloom.os.getpid', lambda: -1)
+    assert USERNAMES.might_contain('user0')
+    assert USERNAMES._filter is shared_filter
+
+    monkeypatch.undo()
+    USERNAMES.might_contain('user0')
+    assert USERNAMES._filter is not shared_filter
+
+
+@pytest.mark.django_db
+def test_register_checks_username_bloom_filter(client, django_assert_num_queries):
+    """
+    Test function to verify that registration looks up only usernames possibly taken according
+    to the Bloom filter, and still refuses taken usernames missing from the filter.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    User.objects.create_user(username='taken', password='testtest')
+    USERNAMES.build()
+    with django_assert_num_queries(0):
+        assert not USERNAMES.might_contain('free')
+    assert USERNAMES.might_contain('taken')
+
+    form = {'first_name': 'Test', 'last_name': 'Test', 'gender': 'M', 'password': 'testtest',
+            'password_confirm': 'testtest', 'email': 'test@example.com', 'dob': '1990-01-01'}
+    response = client.post('/register/', {**form, 'username': 'taken'})
+    assert 'Username already exists.' in response.content.decode()
+
+    response = client.post('/register/', {**form, 'username': 'free'})
+    assert response.status_code == 302
+    assert USERNAMES.might_contain('free')
+
+    User.objects.bulk_create([User(username='bulk')])
+    response = client.post('/register/', {**form, 'username': 'bulk'})
+    assert 'Username already exists.' in response.content.decode()
+    assert User.objects.filter(username='bulk').count() == 1
+
+
+@pytest.mark.django_db
+def test_newsletter_bloom_filter_updated_on_insert(client):
+    """
+    Test function to verify that subscribed emails are added to the newsletter Bloom filter.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    NEWSLETTER_EMAILS.build()
+    assert not NEWSLETTER_EMAILS.might_contain('test@gmail.com')
+
+    client.post('/newsletter/', {'email': 'Test@gmail.com'})
+    assert NEWSLETTER_EMAILS.might_contain('test@GMAIL.com')
+    response = client.post('/newsletter/', {'email': 'test@gmail.com'}, follow=True)
+    assert 'Email already registered!' in response.content.decode()
+    assert Newsletter.objects.count() == 1
+
+
+def test_rate_limit_window_slides_over_time(monkeypatch):
+    """
+    Test function to verify that a rate limit allows its capacity per period, and that the
+    requests of the previous window count for the part of it still within the last period.
+
+    Args:
+        monkeypatch: Fixture patching the clock.
+
+    Returns:
+        None
+    """
+
+    now = [1000.0]
+    monkeypatch.setattr('sell_it_app.rate_limit.time.time', lambda: now[0])
+
+    assert all(take_token('bucket', 3, 60) == 0 for _ in range(3))
+    assert take_token('bucket', 3, 60) == pytest.approx(20)
+    now[0] += 20
+    assert take_token('bucket', 3, 60) == pytest.approx(20)
+    now[0] += 20
+    assert take_token('bucket', 3, 60) == 0
+    assert take_token('bucket', 3, 60) == pytest.approx(20)
+
+
+def test_rate_limit_windows_outlive_idle_clients(monkeypatch):
+    """
+    Test function to verify that the count of a window is kept for two periods after its last
+    request, also on caches whose increments store the count with their default timeout.
+
+    Args:
+        monkeypatch: Fixture patching the clock.
+
+    Returns:
+        None
+    """
+
+    now = [1200.0]
+    monkeypatch.setattr('sell_it_app.rate_limit.time.time', lambda: now[0])
+
+    assert all(take_token('idle', 3, 600) == 0 for _ in range(3))
+    now[0] += 700
+    assert take_token('idle', 3, 600) > 0
+    for counter in COUNTERS:
+        count('idle-view', counter)
+    now[0] += 10 ** 6
+    assert rate_limit_cache().get(COUNTER_KEY % ('idle-view', 'allowed')) == 1
+
+
+def test_page_cache_version_kept_apart_and_never_reused():
+    """
+    Test function to verify that the page cache version survives a flush of the default cache,
+    and that a lost version starts again above every version used before.
+
+    Returns:
+        None
+    """
+
+    version = page_cache_version()
+    bump_page_cache_version()
+    assert page_cache_version() == version + 1
+    cache.clear()
+    assert page_cache_version() == version + 1
+
+    caches['versions'].clear()
+    assert page_cache_version() > version + 1
+    assert caches['versions'].get(PAGE_CACHE_VERSION_KEY) is not None
+
+
+@pytest.mark.django_db
+def test_login_rate_limited_per_username(client, settings, django_assert_num_queries):
+    """
+    Test function to verify that login attempts over the limit of a username get a 429 response
+    without running the view, while other usernames can still log in, and that they are counted.
+
+    Args:
+        client (Client): Django test client.
+        settings: Fixture overriding the settings.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    settings.RATE_LIMITS = {'login': {'ip': (10, 60), 'username': (2, 60)}}
+
+    for _ in range(2):
+        response = client.post('/login/', {'username': 'test', 'password': 'wrong'})
+        assert response.status_code == 200
+    with django_assert_num_queries(0):
+        response = client.post('/login/', {'username': 'Test', 'password': 'wrong'})
+    assert response.status_code == 429
+    assert int(response['Retry-After']) > 0
+
+    assert client.get('/login/').status_code == 200
+    response = client.post('/login/', {'username': 'other', 'password': 'wrong'})
+    assert response.status_code == 200
+    assert get_counters() == {'login': {'allowed': 3, 'limited': 1}}
+
+
+@pytest.mark.django_db
+def test_send_message_rate_limited_per_user(client, settings):
+    """
+    Test function to verify that logged-in users are limited by their own bucket.
+
+    Args:
+        client (Client): Django test client.
+        settings: Fixture overriding the settings.
+
+    Returns:
+        None
+    """
+
+    settings.RATE_LIMITS = {'send-new-message': {'user': (1, 60)}}
+    user = User.objects.create_user(username='sender', password='testtest')
+    client.force_login(user)
+
+    client.post('/send-new-message/1/', {'title': 'Hi', 'message': 'Hello'})
+    assert client.post('/send-new-message/1/', {'title': 'Hi', 'message': 'Hello'}).status_code == 429
+
+    client.force_login(User.objects.create_user(username='other', password='testtest'))
+    assert client.post('/send-new-message/1/', {'title': 'Hi', 'message': 'Hello'}).status_code != 429
+
+
+@pytest.mark.django_db
+def test_category_facet_counts(client, django_assert_max_num_queries):
+    """
+    Test function to verify that the category page filters listings by facets and counts every
+    facet value for the selection of the other facets, with one grouped query.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_max_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    warsaw = Address.objects.create(street_name='Street', city='Warsaw', user_id=user)
+    krakow = Address.objects.create(street_name='Street', city='Krakow', user_id=user)
+    for address, condition, offer_type, price in [(warsaw, 'New', 'Sell', 50), (warsaw, 'Used', 'Sell', 150),
+                                                 (krakow, 'Used', 'Sell', 150), (krakow, 'Used', 'Buy', 30000)]:
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, condition=condition,
+                                offer_type=offer_type, title=f'{condition} {offer_type}', description='Test',
+                                price=price)
+
+    listings = facet_queryset(category, QueryDict('city=Krakow'))
+    with django_assert_max_num_queries(1):
+        counts, total = count_facets(listings, {'city': 'Krakow'})
+    assert total == 2
+    assert counts['city'] == {'Warsaw': 2, 'Krakow': 2}
+    assert counts['condition'] == {'Used': 2}
+    assert counts['price'] == {'100-500': 1, '20000+': 1}
+
+    response = client.get(f'/category/{category.id}/?city=Krakow&condition=Used&min_price=100')
+    content = response.content.decode()
+    assert [listing.title for listing in response.context['listings']] == ['Used Buy', 'Used Sell']
+    assert 'Sell (1)' in content and 'Buy (1)' in content
+    assert 'Warsaw (1)' in content
+    response = client.get(f'/category/{category.id}/?price=0-100')
+    assert [listing.title for listing in response.context['listings']] == ['New Sell']
+
+
+@pytest.mark.django_db
+def test_category_pagination_links_keep_only_facet_params(client):
+    """
+    Test function to verify that the pagination links of the cached category page are built from
+    the facet parameters only, so a page cached for a request with other parameters doesn't
+    serve them to everyone.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='Street', city='Krakow', user_id=user)
+    for index in range(7):
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, condition='Used',
+                                offer_type='Sell', title=f'Car {index}', description='Test', price=100)
+
+    response = client.get(f'/category/{category.id}/?condition=Used&utm_source=evil&page=1')
+    assert response.context['filter_query'] == 'condition=Used'
+    assert 'utm_source' not in response.content.decode()
+    response = client.get(f'/category/{category.id}/?condition=Used&page=1')
+    assert 'utm_source' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_category_stats_maintained_incrementally(client):
+    """
+    Test function to verify that category statistics follow created, edited, deactivated and deleted
+    listings, match the recomputed statistics, and are shown on the index page.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='Street', city='Warsaw', user_id=user)
+
+    def create_listing(condition, price):
+        return Listings.objects.create(user_id=user, category_id=category, address_id=address, condition=condition,
+                                       title='Car', description='Test', price=price)
+
+    def stats():
+        return CategoryStats.objects.values('active_count', 'new_count', 'used_count', 'min_price', 'max_price',
+                                            'newest_add_date').get(category=category)
+
+    cheap = create_listing('New', 100)
+    middle = create_listing('Used', 200)
+    expensive = create_listing('Used', 300)
+    assert stats() == {'active_count': 3, 'new_count': 1, 'used_count': 2, 'min_price': 100, 'max_price': 300,
+                       'newest_add_date': expensive.add_date}
+
+    expensive.status = 'Inactive'
+    expensive.save()
+    middle.price = 50
+    middle.save()
+    assert stats() == {'active_count': 2, 'new_count': 1, 'used_count': 1, 'min_price': 50, 'max_price': 100,
+                       'newest_add_date': middle.add_date}
+
+    cheap.delete()
+    maintained = stats()
+    assert maintained['active_count'] == 1 and maintained['max_price'] == 50
+
+    run_queued_jobs()
+    assert CategoryStats.objects.get(category=category).median_price == 50
+    reconcile_category_stats()
+    assert stats() == maintained
+
+    response = client.get('/')
+    assert response.context['category_stats'][category.id].active_count == 1
+
+
+@pytest.mark.django_db
+def test_listing_index_matches_database(client, settings, monkeypatch, django_assert_num_queries):
+    """
+    Test function to verify that the in-process listing index filters, counts and sorts listings like
+    the database, follows logged changes, and that the category page served from it reads only the page.
+
+    Args:
+        client (Client): Django test client.
+        settings: Fixture overriding the settings.
+        monkeypatch: Fixture replacing the index of the process.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    other = User.objects.create_user(username='other', password='testtest')
+    Listings.objects.create(user_id=other, category_id=Category.objects.create(name='Other'),
+                            address_id=Address.objects.create(street_name='Street', city='Gdansk', user_id=other),
+                            title='Not logged', description='Test', price=10)
+    assert not ListingChange.objects.exists()
+    other.delete()
+
+    settings.LISTING_INDEX_ENABLED = True
+    index = ListingIndex()
+    monkeypatch.setattr('sell_it_app.listing_index._index', index)
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    warsaw = Address.objects.create(street_name='Street', city='Warsaw', user_id=user)
+    krakow = Address.objects.create(street_name='Street', city='Krakow', user_id=user)
+    listings = [Listings.objects.create(user_id=user, category_id=category, address_id=address, condition=condition,
+                                        title=f'Car {number}', description='Test', price=price)
+                for number, (address, condition, price) in enumerate([
+                    (warsaw, 'New', 50), (warsaw, 'Used', 150), (krakow, 'Used', 150), (krakow, 'Used', 30000),
+                    (warsaw, 'Used', 700), (krakow, 'New', 20)])]
+
+    def assert_matches(params):
+        params = QueryDict(params)
+        selected = get_selected_facets(params)
+        queryset = facet_queryset(category, params)
+        counts, total = count_facets(queryset, selected)
+        index_counts, indexed = get_listing_index().browse(category.id, params, selected)
+        assert index_counts == counts
+        assert len(indexed) == total
+        expected = list(filter_listings(queryset, selected).order_by('-add_date', '-id').values_list('id', flat=True))
+        assert indexed.page_ids(0, total) == expected
+        assert indexed.page_ids(1, 3) == expected[1:3]
+
+    assert_matches('')
+    assert_matches('city=Krakow&condition=Used')
+    assert_matches('price=100-500&min_price=100')
+
+    listings[0].status = 'Inactive'
+    listings[0].save()
+    krakow.city = 'Gdansk'
+    krakow.save()
+    index.refresh(force=True)
+    assert_matches('')
+    assert_matches('city=Gdansk')
+
+    index.refresh(force=True)
+    with django_assert_num_queries(1):
+        page = get_listing_index().browse(category.id, QueryDict(''), {})[1][0:2]
+    assert [listing.title for listing in page] == ['Car 5', 'Car 4']
+
+    response = client.get(f'/category/{category.id}/?city=Warsaw')
+    assert [listing.title for listing in response.context['listings']] == ['Car 4', 'Car 1']
+
+
+@pytest.mark.django_db
+def test_listing_index_disabled_over_cap_keeps_snapshot(settings, django_assert_num_queries):
+    """
+    Test function to verify that a listing index growing over its cap is disabled without
+    dropping the snapshot requests may still read, and is only built again after the retry interval.
+
+    Args:
+        settings: Fixture overriding the settings.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    settings.LISTING_INDEX_ENABLED = True
+    settings.LISTING_INDEX_MAX_LISTINGS = 1
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='Street', city='Warsaw', user_id=user)
+    Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Car 1',
+                            description='Test', price=100)
+    index = ListingIndex()
+    index.refresh()
+    assert index.enabled
+
+    Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Car 2',
+                            description='Test', price=100)
+    index.refresh(force=True)
+    assert not index.enabled
+    counts, listings = index.browse(category.id, QueryDict(''), {})
+    assert len(listings) == 1
+
+    with django_assert_num_queries(0):
+        index.refresh()
+
+
+def test_geocode_with_offline_gazetteer():
+    """
+    Test function to verify that addresses are located by postal code, city or postal district,
+    and that geohashes of nearby points are covered by the cells of a search circle.
+
+    Returns:
+        None
+    """
+
+    assert geocode('00-001', '') == pytest.approx((52.2297, 21.0122))
+    assert geocode('', ' KRAKÓW ') == geocode('30001', 'Unknown')
+    assert geocode('30-999', 'Unknown') == geocode('30-001', '')
+    assert geocode('99-999', 'Atlantis') is None
+
+    assert encode_geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    cells = covering_cells(52.2297, 21.0122, 10)
+    assert any(encode_geohash(52.30, 21.10).startswith(cell) for cell in cells)
+    assert not any(encode_geohash(50.0647, 19.9450).startswith(cell) for cell in cells)
+
+
+@pytest.mark.django_db
+def test_search_near_sorted_by_distance(client):
+    """
+    Test function to verify that saved addresses are located and that search results can be
+    limited to a radius around a place and sorted by distance.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    for city, postal_code in [('Gdynia', '81-001'), ('Sopot', '81-701'), ('Kraków', '30-001'), ('Nowhere', '')]:
+        address = Address.objects.create(street_name='Street', city=city, postal_code=postal_code, user_id=user)
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, title=f'Car in {city}',
+                                description='Test', price=100)
+
+    address = Address.objects.get(city='Sopot')
+    assert (address.latitude, address.longitude) == pytest.approx((54.4416, 18.5601))
+    assert Address.objects.get(city='Nowhere').latitude is None
+
+    response = client.get('/search/', {'search_query': 'Car', 'near': 'Gdańsk', 'radius': 30})
+    results = list(response.context['searching'])
+    assert [listing.title for listing in results] == ['Car in Sopot', 'Car in Gdynia']
+    assert results[0].distance == pytest.approx(11, abs=1)
+
+    response = client.get(f'/category/{category.id}/', {'lat': 50.06, 'lon': 19.94, 'radius': 5})
+    assert [listing.title for listing in response.context['listings']] == ['Car in Kraków']
+
+    Address.objects.update(latitude=None, geohash='')
+    call_command('geocode_addresses', stdout=io.StringIO())
+    assert Address.objects.filter(latitude__isnull=False).count() == 3
+
+
+@pytest.mark.django_db
+def test_map_markers_clustered_from_cached_tiles(client, django_assert_num_queries):
+    """
+    Test function to verify that the map endpoint returns listings clustered by grid cell at low zoom
+    levels, from cached tiles on repeated requests, and single listings at high zoom levels.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='seller', password='testtest')
+    category = Category.objects.create(name='Car')
+    for city, count in [('Gdynia', 3), ('Sopot', 1), ('Kraków', 2)]:
+        address = Address.objects.create(street_name='Street', city=city, user_id=user)
+        for _ in range(count):
+            Listings.objects.create(user_id=user, category_id=category, address_id=address, title=f'Car in {city}',
+                                    description='Test', price=100)
+
+    poland = {'bbox': '49,14,55,24.5', 'zoom': 5}
+    clusters = client.get('/listings/map/markers/', poland).json()['clusters']
+    assert sorted(cluster['count'] for cluster in clusters) == [2, 4]
+    with django_assert_num_queries(0):
+        assert client.get('/listings/map/markers/', poland).json()['clusters'] == clusters
+
+    clusters = client.get('/listings/map/markers/', {'bbox': '54.3,18.3,54.6,18.7', 'zoom': 10}).json()['clusters']
+    assert sorted(cluster['count'] for cluster in clusters) == [1, 3]
+
+    pins = client.get('/listings/map/markers/', {'bbox': '54.50,18.50,54.54,18.56', 'zoom': 16}).json()['pins']
+    assert [pin['title'] for pin in pins] == ['Car in Gdynia'] * 3
+
+    assert client.get('/listings/map/markers/', {'bbox': '1,2', 'zoom': 5}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_favourite_toggle_maintains_count(client, django_capture_on_commit_callbacks):
+    """
+    Test function to verify that toggling a favourite keeps the favourite count of the listing
+    and the favourite button of the user up to date.
+
+    Args:
+        client (Client): Django test client.
+        django_capture_on_commit_callbacks: Fixture running the on commit callbacks.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listing = Listings.objects.create(user_id=user, category_id=category, address_id=address, title='Favourite',
+                                      description='This is a test listing', price=10.99)
+    client.login(username='testuser', password='testtesttesttest')
+    assert 'Add to favourites' in client.get(f'/listing-details/{listing.id}/').content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(reverse('favourite-toggle', args=[listing.id]), {'next': '/favourites/'})
+    assert response.status_code == 302
+    assert response.url == '/favourites/'
+    listing.refresh_from_db()
+    assert listing.favourite_count == 1
+    assert 'Favourite' in client.get('/favourites/').content.decode()
+    assert 'Remove from favourites' in client.get(f'/listing-details/{listing.id}/').content.decode()
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Favourite.objects.create(user=user, listing=listing)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(reverse('favourite-toggle', args=[listing.id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    assert response.json() == {'favourited': False, 'favourite_count': 0}
+    assert not Favourite.objects.filter(user=user).exists()
+    assert 'Add to favourites' in client.get(f'/listing-details/{listing.id}/').content.decode()
+
+
+@pytest.mark.django_db
+def test_favourite_buttons_looked_up_once_per_page(client):
+    """
+    Test function to verify that the favourite buttons of a cached category page are filled in
+    with a single lookup of the user's favourites, cached for the next pages.
+
+    Args:
+        client (Client): Django test client.
+
+    Returns:
+        None
+    """
+
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    listings = [Listings.objects.create(user_id=user, category_id=category, address_id=address, title=f'Card {i}',
+                                        description='This is a test listing', price=10.99) for i in range(6)]
+    for listing in listings[:2]:
+        Favourite.objects.create(user=user, listing=listing)
+    client.get(f'/category/{category.id}/')
+    client.login(username='testuser', password='testtesttesttest')
+
+    for lookups in (1, 0):
+        with CaptureQueriesContext(connection) as queries:
+            content = client.get(f'/category/{category.id}/').content.decode()
+        assert sum('sell_it_app_favourite' in query['sql'] for query in queries.captured_queries) == lookups
+        assert content.count('Remove from favourites') == 2
+        assert content.count('Add to favourites') == 4
+        assert '<!--favourite:' not in content
+
+
+@pytest.mark.django_db
+def test_new_listing_matched_against_saved_searches(client, django_assert_num_queries):
+    """
+    Test function to verify that a new listing is matched against the saved searches through
+    their percolator keys, and that the matching searches are notified.
+
+    Args:
+        client (Client): Django test client.
+        django_assert_num_queries: Fixture counting database queries.
+
+    Returns:
+        None
+    """
+
+    seller = User.objects.create_user(username='seller', password='testtesttesttest')
+    buyer = User.objects.create_user(username='buyer', password='testtesttesttest')
+    category = Category.objects.create(name='Car')
+    client.login(username='buyer', password='testtesttesttest')
+    client.post('/saved-searches/', {'query': 'Mountain bike', 'city': 'Kraków', 'max_price': 500})
+    client.post('/saved-searches/', {'query': 'laptop'})
+    client.post('/saved-searches/', {'category': category.id, 'max_price': 100})
+    assert SavedSearch.objects.get(query='Mountain bike').percolator_key == 'term:mountain'
+
+    client.login(username='seller', password='testtesttesttest')
+    image = SimpleUploadedFile(name='test_avatar1.png', content=open('sell_it_app/static/test/test_avatar1.png',
+                                                                        'rb').read(), content_type='image/png')
+    response = client.post('/add-listing/', {
+        'category_id': category.pk, 'condition': 'Used', 'offer_type': 'Sell', 'image': [image],
+        'street_name': 'Test address', 'postal_code': '30-001', 'country': 'Poland', 'city': 'Krakow',
+        'title': 'MOUNTAIN Bike XL', 'description': 'This is a test listing', 'price': 300,
+    })
+    assert response.status_code == 302
+    match = SavedSearchMatch.objects.get()
+    assert match.saved_search.query == 'Mountain bike'
+
+    run_queued_jobs()
+    message = Messages.objects.get(to_user=buyer)
+    assert 'Mountain bike' in message.title
+    assert 'MOUNTAIN Bike XL' in message.message
+    match.refresh_from_db()
+    assert match.notified_at is not None
+
+    for i in range(20):
+        SavedSearch.objects.create(user=buyer, query=f'unrelated{i} words')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=seller)
+    listing = Listings.objects.create(user_id=seller, category_id=category, address_id=address, title='Red scooter',
+                                      description='This is a test listing', price=1000)
+    with django_assert_num_queries(1):
+        assert match_saved_searches(listing) == []
+
+
+@pytest.mark.django_db
+def test_price_drop_alerts_fanned_out_in_background(settings):
+    """
+    Test function to verify that price changes are recorded and that price drops are fanned out
+    to the users who favourited the listing by a background job, and delivered in one digest per user.
+
+    Args:
+        settings (SettingsWrapper): Django settings fixture.
+
+    Returns:
+        None
+    """
+
+    settings.PRICE_ALERT_BATCH_SIZE = 2
+    settings.PRICE_ALERT_DIGEST_DELAY = 0
+    seller = User.objects.create_user(username='seller', password='testtesttesttest')
+    watchers = [User.objects.create_user(username=f'watcher{i}', password='testtesttesttest') for i in range(3)]
+    category = Category.objects.create(name='Car')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=seller)
+    listing = Listings.objects.create(user_id=seller, category_id=category, address_id=address, title='Old car',
+                                      description='This is a test listing', price=1000)
+    for watcher in watchers:
+        Favourite.objects.create(user=watcher, listing=listing)
+
+    listing.title = 'Old red car'
+    listing.save()
+    listing.price = 900
+    listing.save()
+    listing.price = 800
+    listing.save()
+    assert list(listing.prices.order_by('changed_at', 'id').values_list('previous_price', 'price')) == [
+        (None, 1000), (1000, 900), (900, 800)]
+    assert not PriceAlert.objects.exists()
+
+    run_queued_jobs()
+    assert PriceAlert.objects.count() == 6
+    assert not PriceAlert.objects.filter(delivered_at__isnull=True).exists()
+    for watcher in watchers:
+        message = Messages.objects.get(to_user=watcher)
+        assert 'Old red car: 1000.00 USD -> 800.00 USD' in message.message
+
+    listing.price = 850
+    listing.save()
+    run_queued_jobs()
+    assert PriceAlert.objects.count() == 6
+
+
+
+@pytest.mark.django_db
+def test_search_suggestions_served_from_mapped_index(client, settings, tmp_path, monkeypatch,
+                                                     django_assert_num_queries):
+    """
+    Test function to verify that the words of listing titles and popular queries are counted
+    incrementally, and that suggestions are served from the mapped index without database queries.
+
+    Args:
+        client (Client): Django test client.
+        settings (SettingsWrapper): Django settings fixture.
+        tmp_path (pathlib.Path): Temporary directory fixture.
+        monkeypatch (MonkeyPatch): Pytest fixture patching module attributes.
+        django_assert_num_queries (callable): Fixture asserting the number of queries.
+
+    Returns:
+        None
+    """
+
+    settings.SUGGEST_INDEX_PATH = str(tmp_path / 'suggest.idx')
+    settings.SUGGEST_INDEX_REFRESH_INTERVAL = 0
+    settings.SUGGEST_INDEX_BUILD_DELAY = 0
+    settings.SUGGEST_PREFIX_LENGTH = 2
+    monkeypatch.setattr(suggest, '_index', None)
+    monkeypatch.setattr(suggest, '_checked_at', 0)
+    settings.SUGGEST_SEARCH_FLUSH_SIZE = 2
+    settings.SUGGEST_SEARCH_FLUSH_INTERVAL = 3600
+    monkeypatch.setattr(suggest, '_search_counts', Counter())
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Phones')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    for title in ['iPhone 13 case', 'iPhone 12', 'Phone charger', 'Ice skates']:
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, title=title,
+                                description='This is a test listing', price=10)
+    response = client.get(reverse('search-suggest'), {'q': 'ip'})
+    assert response.json() == {'query': 'ip', 'suggestions': []}
+
+    run_queued_jobs()
+    assert SuggestTerm.objects.get(text='iphone').listing_count == 2
+    for _ in range(2):
+        client.get(reverse('search'), {'search_query': 'Ice skates'})
+    client.get(reverse('search'), {'search_query': 'nothing like this'})
+    assert not SuggestTerm.objects.filter(text='ice skates').exists()
+    client.get(reverse('search'), {'search_query': 'iPhone'})
+    run_queued_jobs()
+    assert SuggestTerm.objects.get(text='ice skates').search_count == 2
+    assert SuggestTerm.objects.get(text='iphone').search_count == 1
+    assert not SuggestTerm.objects.filter(text='nothing like this').exists()
+    call_command('build_suggest_index', stdout=io.StringIO())
+
+    with django_assert_num_queries(0):
+        assert client.get(reverse('search-suggest'), {'q': 'I'}).json()['suggestions'][:2] == ['ice skates', 'iphone']
+        assert client.get(reverse('search-suggest'), {'q': 'iPh'}).json()['suggestions'] == ['iphone']
+        assert client.get(reverse('search-suggest'), {'q': 'iphone c'}).json()['suggestions'] == [
+            'iphone case', 'iphone charger']
+        assert client.get(reverse('search-suggest'), {'q': 'i', 'limit': 1}).json()['suggestions'] == ['ice skates']
+
+    listing = Listings.objects.get(title='iPhone 12')
+    listing.status = 'Inactive'
+    listing.save()
+    Listings.objects.get(title='Ice skates').delete()
+    run_queued_jobs()
+    assert SuggestTerm.objects.get(text='iphone').listing_count == 1
+    assert SuggestTerm.objects.get(text='skates').listing_count == 0
+    assert client.get(reverse('search-suggest'), {'q': 'sk'}).json()['suggestions'] == []
+    assert call_command('build_suggest_index', '--reconcile', stdout=io.StringIO()) is None
+    assert SuggestTerm.objects.get(text='iphone').listing_count == 1
+
+
+@pytest.mark.django_db
+def test_misspelled_search_corrected_with_trigram_index(client, settings, monkeypatch):
+    """
+    Test function to verify that searches without results are corrected with the closest words
+    of the listing titles found in the trigram index, and that the corrections are suggested.
+
+    Args:
+        client (Client): Django test client.
+        settings (SettingsWrapper): Django settings fixture.
+        monkeypatch (MonkeyPatch): Pytest fixture patching module attributes.
+
+    Returns:
+        None
+    """
+
+    settings.FUZZY_INDEX_REFRESH_INTERVAL = 0
+    monkeypatch.setattr(fuzzy_search, '_index', None)
+    monkeypatch.setattr(fuzzy_search, '_pg_trgm_installed', {})
+    user = User.objects.create_user(username='testuser', password='testtesttesttest')
+    category = Category.objects.create(name='Vehicles')
+    address = Address.objects.create(street_name='testaddress', city='Warsaw', user_id=user)
+    for title in ['Red motorcycle', 'Motorcycle helmet', 'iPhone 13', 'iPhone 12 case', 'Phone case']:
+        Listings.objects.create(user_id=user, category_id=category, address_id=address, title=title,
+                                description='This is a test listing', price=10)
+    run_queued_jobs()
+
+    index = fuzzy_search.get_trigram_index()
+    assert index.closest('iphnoe', 3, 0.25) == ['iphone']
+    assert fuzzy_search.trigrams('ab') == {'  a', ' ab', 'ab '}
+
+    response = client.get(reverse('search'), {'search_query': 'motorcylce'})
+    assert response.context['corrected_query'] == 'motorcycle'
+    assert [listing.title for listing in response.context['searching']] == ['Motorcycle helmet', 'Red motorcycle']
+    assert 'showing results for' in response.content.decode()
+
+    response = client.get(reverse('search'), {'search_query': 'iphnoe cas'})
+    assert response.context['corrected_query'] == 'iphone case'
+    assert [listing.title for listing in response.context['searching']] == ['iPhone 12 case']
+    settings.FUZZY_SEARCH_THRESHOLD = 0.2
+    assert fuzzy_search.suggest_corrections('phon cas') == ['phone case', 'iphone case']
+
+    response = client.get(reverse('search'), {'search_query': 'red motorcycle'})
+    assert response.context['corrected_query'] is None
+    response = client.get(reverse('search'), {'search_query': 'zzzzzz'})
+    assert response.context['corrected_query'] is None
+    assert 'No results found.' in response.content.decode()
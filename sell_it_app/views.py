@@ -1,21 +1,47 @@
-import random
+import asyncio
 import datetime
 
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model, authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
-from django.http import HttpResponseForbidden
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 
-from sell_it_app.forms import AvatarForm, ListingsForm, AddressesForm, PictureForm, ProfileForm, PasswordForm
-from sell_it_app.models import Messages, Newsletter, Avatars, Listings, Category, Picture, Address
+from sell_it_app.bloom import USERNAMES
+from sell_it_app.forms import AvatarForm, ListingsForm, AddressesForm, PictureForm, ProfileForm, PasswordForm, \
+    SavedSearchForm, DeleteOlderMessagesForm
+from sell_it_app.category_stats import get_category_stats
+from sell_it_app.favourites import toggle_favourite
+from sell_it_app.facets import FACET_PARAMS, get_selected_facets, facet_queryset, count_facets, filter_listings, \
+    build_facets, facet_params
+from sell_it_app.conversations import find_listing_thread, set_messages_status, delete_messages, search_messages
+from sell_it_app.fuzzy_search import filter_title_words, suggest_corrections
+from sell_it_app.geo import filter_near, get_search_point
+from sell_it_app.listing_index import get_listing_index
+from sell_it_app.map_clusters import PIN_ZOOM, get_clusters, get_pins
+from sell_it_app.models import Messages, Newsletter, Avatars, Listings, Category, Picture, Address, Thread, \
+    ThreadParticipant, ArchivedMessage, CategoryStats, SavedSearch, ListingPrice
+from sell_it_app.notifications import get_broker, user_channel, unread_message_count, format_event
+from sell_it_app.object_cache import get_cached_object_or_404
+from sell_it_app.page_cache import PageCacheMixin
+from sell_it_app.saved_searches import describe_search, match_saved_searches, saved_search_url
+from sell_it_app.subscribers import subscribe
+from sell_it_app.suggest import get_suggest_index, record_search_query
+from sell_it_app.tasks import deliver_contact_message, deliver_saved_search_matches, count_search_queries
 
 User = get_user_model()
 
 
-class IndexView(View):
+class IndexView(PageCacheMixin, View):
     """
     View for rendering the index page.
 
@@ -23,12 +49,16 @@ class IndexView(View):
         get(self, request): Handles GET requests to the index page.
     """
 
+    def get_page_cache_scopes(self, **kwargs):
+        return ('index',)
+
     def get(self, request):
         """
         Handles GET requests to the index page.
 
-        Retrieves promoted and recently added listings, shuffles promoted listings,
-        selects a subset for the carousel, and renders the index page with the context.
+        Retrieves recently added listings and renders the index page with the context. The
+        carousel of promoted listings is picked at random for every request, see
+        promoted_carousel_context().
 
         Parameters:
             request (HttpRequest): The HTTP request object.
@@ -37,15 +67,11 @@ class IndexView(View):
             HttpResponse: The rendered index page with the context.
         """
 
-        promoted_listings = list(Listings.objects.filter(promotion='Promoted').order_by('-add_date'))
-        random.shuffle(promoted_listings)
-        carousel = promoted_listings[:3]
         last_added = Listings.objects.all().order_by('-add_date')[:6]
 
         ctx = {
-            'promoted_listings': promoted_listings,
             'last_added': last_added,
-            'carousel': carousel,
+            'category_stats': get_category_stats(),
         }
         return render(request, 'sell_it_app/index.html', ctx)
 
@@ -168,9 +194,10 @@ class RegisterView(View):
         email = request.POST.get('email')
         date_of_birth = request.POST.get('dob')
 
-        if User.objects.filter(username=username).exists():
-            error_message = 'Username already exists.'
-            return render(request, 'sell_it_app/register.html', {'error_message': error_message})
+        username_taken_message = 'Username already exists.'
+        # Only usernames possibly taken according to the Bloom filter are looked up.
+        if USERNAMES.might_contain(username) and User.objects.filter(username=username).exists():
+            return render(request, 'sell_it_app/register.html', {'error_message': username_taken_message})
 
         if gender not in dict(User.GENDER_CHOICES):
             error_message = 'Invalid gender choice.'
@@ -183,29 +210,46 @@ class RegisterView(View):
             error_message = 'Passwords do not match.'
             return render(request, 'sell_it_app/register.html', {'error_message': error_message})
         else:
-            new_user = User.objects.create_user(
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                gender=gender,
-                email=email,
-                password=password,
-                date_of_birth=date_of_birth,
-            )
-            new_user.save()
+            # The username may have been taken by another process since the Bloom filter was built.
+            try:
+                with transaction.atomic():
+                    new_user = User.objects.create_user(
+                        username=username,
+                        first_name=first_name,
+                        last_name=last_name,
+                        gender=gender,
+                        email=email,
+                        password=password,
+                        date_of_birth=date_of_birth,
+                    )
+            except IntegrityError:
+                return render(request, 'sell_it_app/register.html', {'error_message': username_taken_message})
             return redirect('login')
 
 
-class CategoryView(View):
+class CategoryView(PageCacheMixin, View):
     """
     View for displaying listings within a specific category.
 
-    GET request renders the category page with listings filtered by category.
+    GET request renders the category page with active listings filtered by category and by the
+    selected facets (condition, offer type, promotion, city and price), with the number of
+    listings of every facet value.
     """
 
+    page_cache_params = ('page',) + FACET_PARAMS
+
+    def get_page_cache_scopes(self, category_id):
+        return (f'category:{category_id}',)
+
     def get(self, request, category_id):
         """
-        Renders the category page with listings filtered by category.
+        Renders the category page with listings filtered by category and facets.
+
+        The facet counts and the number of matching listings come from one grouped query,
+        see count_facets(), so the paginator doesn't run its own COUNT query. With the
+        in-process listing index enabled, they are computed from the index instead and only
+        the listings of the page are read from the database. Distance searches are sorted
+        by distance and always read from the database.
 
         Args:
             request (HttpRequest): HTTP request object.
@@ -216,15 +260,35 @@ class CategoryView(View):
         """
 
         category = get_object_or_404(Category, id=category_id)
-        listings = Listings.objects.filter(category_id=category).order_by('-add_date')
-
-        paginator = Paginator(listings, 6)
+        selected = get_selected_facets(request.GET)
+        point = get_search_point(request.GET)
+        listing_index = get_listing_index() if point is None else None
+        if listing_index is not None:
+            counts, listings = listing_index.browse(category.id, request.GET, selected)
+            paginator = Paginator(listings, 6)
+        else:
+            listings = facet_queryset(category, request.GET)
+            counts, total = count_facets(listings, selected)
+            listings = filter_listings(listings, selected)
+            if point is None:
+                listings = listings.order_by('-add_date')
+            else:
+                listings = listings.order_by('distance', '-add_date')
+            paginator = Paginator(listings, 6)
+            paginator.count = total
         page_number = request.GET.get('page')
         page_obj = paginator.get_page(page_number)
 
         ctx = {
             'category': category,
+            'stats': CategoryStats.objects.filter(category_id=category.id).first(),
             'listings': page_obj,
+            'facets': build_facets(request.GET, counts, selected),
+            'min_price': request.GET.get('min_price', ''),
+            'max_price': request.GET.get('max_price', ''),
+            'near': request.GET.get('near', ''),
+            'radius': request.GET.get('radius', ''),
+            'filter_query': facet_params(request.GET).urlencode(),
         }
         return render(request, 'sell_it_app/category.html', ctx)
 
@@ -288,7 +352,7 @@ class UpdateProfileView(LoginRequiredMixin, View):
             HttpResponse: Rendered profile page with user profile and profile update form.
         """
 
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         form = ProfileForm(instance=user)
         return render(request, 'sell_it_app/profile.html', {'user': user, 'form': form})
 
@@ -301,7 +365,7 @@ class UpdateProfileView(LoginRequiredMixin, View):
             HttpResponse: Rendered profile page with error messages if profile update fails.
         """
 
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         form = ProfileForm(request.POST, instance=user)
         if form.is_valid():
             form.save()
@@ -420,15 +484,34 @@ class SearchView(View):
         """
         Processes the search query and renders the search results page.
 
+        Results can be limited to a radius around a place or point and sorted by distance, see get_search_point().
+        Queries returning results are counted on their first page, to be suggested, see SearchSuggestView.
+        Queries without results are corrected with the closest words of the listing titles, and the
+        results of the best correction are shown with the other ones as "did you mean" links.
+
         Returns:
             HttpResponse: Rendered search results page.
         """
 
-        query = request.GET.get('search_query')
-        searching = Listings.objects.filter(title__icontains=query).order_by('title')
+        query = request.GET.get('search_query') or ''
+        listings = Listings.objects.all()
+        point = get_search_point(request.GET)
+        if point is not None:
+            listings = filter_near(listings, *point, prefix='address_id__')
+        searching = listings.filter(title__icontains=query)
+        corrections = []
+        if query.strip() and not searching.exists():
+            corrections = suggest_corrections(query)
+            if corrections:
+                searching = filter_title_words(listings, corrections[0])
+        searching = searching.order_by('title') if point is None else searching.order_by('distance', 'title')
 
         if not searching.exists():
             messages.error(request, 'No results found.')
+        elif 'page' not in request.GET and not corrections:
+            search_counts = record_search_query(query)
+            if search_counts:
+                count_search_queries.enqueue(search_counts)
 
         paginator = Paginator(searching, 1)
         page_number = request.GET.get('page')
@@ -437,10 +520,43 @@ class SearchView(View):
         ctx = {
             'searching': searching,
             'page_obj': page_obj,
+            'corrected_query': corrections[0] if corrections else None,
+            'did_you_mean': corrections[1:],
         }
         return render(request, 'sell_it_app/search_results.html', ctx)
 
 
+class SearchSuggestView(View):
+    """
+    View returning suggested completions of a search query as it is typed, as JSON.
+
+    GET request takes the typed text as 'q' and the number of suggestions as 'limit'. Suggestions
+    are read from the memory-mapped suggestion index, without any database query, see
+    sell_it_app.suggest.
+    """
+
+    def get(self, request):
+        """
+        Returns the suggestions of the typed text.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            JsonResponse: The 'query' and its 'suggestions', empty until the index is built.
+        """
+
+        query = request.GET.get('q') or ''
+        try:
+            limit = min(max(int(request.GET.get('limit', settings.SUGGEST_MAX_RESULTS)), 1),
+                        settings.SUGGEST_MAX_RESULTS)
+        except ValueError:
+            limit = settings.SUGGEST_MAX_RESULTS
+        index = get_suggest_index()
+        suggestions = index.suggest(query, limit) if index is not None else []
+        return JsonResponse({'query': query, 'suggestions': suggestions})
+
+
 class MyListingsView(LoginRequiredMixin, View):
     """
     View for displaying user's listings.
@@ -488,11 +604,11 @@ class MyListingsView(LoginRequiredMixin, View):
         })
 
 
-class ListingView(View):
+class ListingView(PageCacheMixin, View):
     """
     View for displaying individual listing details.
 
-    GET request renders the listing page with details and pictures.
+    GET request renders the listing page with details, pictures and the latest price changes.
 
     Attributes:
         user (User): The current user accessing the page.
@@ -501,6 +617,9 @@ class ListingView(View):
         pictures (QuerySet): Queryset of pictures related to the listing.
     """
 
+    def get_page_cache_scopes(self, listing_id):
+        return (f'listing:{listing_id}',)
+
     def get(self, request, listing_id):
         """
         Renders the listing page with details and pictures.
@@ -511,18 +630,23 @@ class ListingView(View):
 
         user = request.user
         if user.is_authenticated:
-            listing = get_object_or_404(Listings, pk=listing_id)
+            listing = get_cached_object_or_404(Listings, listing_id)
             avatar = Avatars.objects.filter(user_id=request.user).last()
             pictures = Picture.objects.filter(listing=listing_id)
             return render(request, 'sell_it_app/listing.html', {
                 'listing': listing,
                 'avatar': avatar,
                 'pictures': pictures,
+                'price_history': ListingPrice.objects.filter(listing=listing_id).order_by('-changed_at')[:5],
             })
         else:
-            listing = get_object_or_404(Listings, pk=listing_id)
+            listing = get_cached_object_or_404(Listings, listing_id)
             pictures = Picture.objects.filter(listing=listing_id)
-            return render(request, 'sell_it_app/listing.html', {'listing': listing, 'pictures': pictures})
+            return render(request, 'sell_it_app/listing.html', {
+                'listing': listing,
+                'pictures': pictures,
+                'price_history': ListingPrice.objects.filter(listing=listing_id).order_by('-changed_at')[:5],
+            })
 
 
 class ListingGoogleMapsView(View):
@@ -547,16 +671,72 @@ class ListingGoogleMapsView(View):
             HttpResponse: Rendered Google Maps page.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_cached_object_or_404(Listings, listing_id)
         return render(request, 'sell_it_app/google_maps.html', {'listing': listing})
 
 
+class ListingsMapView(View):
+    """
+    View for displaying all active listings on a map.
+
+    GET request renders the map page, which loads the markers of the visible area from MapMarkersView.
+    """
+
+    def get(self, request):
+        """
+        Renders the listings map page.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            HttpResponse: Rendered map page.
+        """
+
+        return render(request, 'sell_it_app/listings_map.html', {'pin_zoom': PIN_ZOOM})
+
+
+class MapMarkersView(View):
+    """
+    View returning the markers of the listings within the visible area of a map, as JSON.
+
+    GET request takes the bounding box as 'bbox' (south,west,north,east) and the 'zoom'
+    level of the map. Below PIN_ZOOM listings are returned as clusters with their count,
+    computed from cached tiles of the geohash grid, so the response stays small however many
+    listings are visible. From PIN_ZOOM single listings are returned.
+    """
+
+    def get(self, request):
+        """
+        Returns the clusters or pins of the visible area.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            JsonResponse: The 'zoom' and the 'clusters' or 'pins', or an error with status 400.
+        """
+
+        try:
+            south, west, north, east = (float(value) for value in request.GET['bbox'].split(','))
+            zoom = int(request.GET['zoom'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Expected bbox=south,west,north,east and zoom parameters.'}, status=400)
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180 and zoom >= 0):
+            return JsonResponse({'error': 'Invalid bounding box or zoom level.'}, status=400)
+
+        if zoom >= PIN_ZOOM:
+            return JsonResponse({'zoom': zoom, 'pins': get_pins(south, west, north, east)})
+        return JsonResponse({'zoom': zoom, 'clusters': get_clusters(south, west, north, east, zoom)})
+
+
 class AddListingView(LoginRequiredMixin, View):
     """
     View for adding a new listing.
 
     GET request renders the add listing form.
-    POST request processes the form data for adding a new listing.
+    POST request processes the form data for adding a new listing, and matches the new listing
+    against the saved searches, queuing the notifications of the matching searches.
 
     Requires the user to be logged in.
     """
@@ -624,6 +804,8 @@ class AddListingView(LoginRequiredMixin, View):
                 ctx['pictures'] = pictures
 
         if listing_form.is_valid() and picture_form.is_valid() and address_form.is_valid():
+            if match_saved_searches(listing):
+                deliver_saved_search_matches.enqueue(unique=True)
             # return render(request, 'sell_it_app/listing.html', ctx)
             return redirect('listing-details', listing_id=listing.id)
         else:
@@ -653,7 +835,7 @@ class EditListingView(LoginRequiredMixin, View):
             HttpResponse: Rendered edit listing form.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_cached_object_or_404(Listings, listing_id)
         categories = Category.objects.all()
         address = Address.objects.get(id=listing.address_id.id)
         pictures = Picture.objects.filter(listing=listing_id)
@@ -678,7 +860,7 @@ class EditListingView(LoginRequiredMixin, View):
             HttpResponse: Rendered edit listing form with error messages if form submission fails.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_object_or_404(Listings, id=listing_id)
         listing_form = ListingsForm(request.POST, instance=listing)
         address_form = AddressesForm(request.POST, instance=listing.address_id)
 
@@ -724,7 +906,7 @@ class EditListingPictureView(LoginRequiredMixin, View):
             HttpResponse: Rendered edit listing form with picture uploads.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_cached_object_or_404(Listings, listing_id)
         return render(request, 'sell_it_app/edit_listing.html', {'listing': listing})
 
     def post(self, request, listing_id):
@@ -740,7 +922,7 @@ class EditListingPictureView(LoginRequiredMixin, View):
             HttpResponse: Rendered edit listing form with error messages if form submission fails.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_object_or_404(Listings, id=listing_id)
         user = request.user
         if listing.user_id != user:
             return HttpResponseForbidden("You do not have permission to edit this listing's picture.")
@@ -785,7 +967,7 @@ class DeleteListingPicture(LoginRequiredMixin, View):
             HttpResponseRedirect: Redirects to the updated listing details page.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_object_or_404(Listings, id=listing_id)
         picture = Picture.objects.get(pk=picture_id)
 
         if listing.user_id != request.user:
@@ -820,7 +1002,7 @@ class UpdateListingStatusView(LoginRequiredMixin, View):
             HttpResponseRedirect: Redirects to the listings page after updating the status.
         """
 
-        listing = get_object_or_404(Listings, pk=listing_id)
+        listing = get_object_or_404(Listings, id=listing_id)
 
         if listing.status == 'Active':
             listing.status = 'Inactive'
@@ -864,26 +1046,25 @@ class DeleteListingView(LoginRequiredMixin, View):
 
 class MessagesView(LoginRequiredMixin, View):
     """
-    View for displaying messages.
+    View for displaying the inbox, listing the conversations of the user.
 
     Attributes:
         user (User): The current authenticated user.
-        id (int): The ID of the current authenticated user.
-        messages (QuerySet): The messages related to the current user.
-        user_messages (int): The total number of messages received by the user.
-        user_unread_messages (int): The number of unread messages received by the user.
-        user_read_messages (int): The number of read messages received by the user.
-        user_sent_messages (int): The number of messages sent by the user.
-        message_type (str): The type of messages to display (All, Unread, Read, Sent).
-        paginator (Paginator): Paginator object for paginating messages.
-        page_number (str): The current page number of the paginated messages.
-        page_obj (Page): Page object containing the messages for the current page.
+        threads (QuerySet): The conversations of the current user, latest first.
+        sent_threads (Q): Condition matching the conversations the user sent a message to.
+        counts (dict): The numbers of all, unread, read and sent conversations, counted with one query.
+        message_type (str): The type of conversations to display (All, Unread, Read, Sent, Archived).
+            Archived lists the archived messages of the user, read from the archive only.
+        query (str): Full-text search query, when given the matching messages are listed instead.
+        paginator (Paginator): Paginator object for paginating conversations.
+        page_number (str): The current page number of the paginated conversations.
+        page_obj (Page): Page object containing the conversations, or the archived messages, for the current page.
         ctx (dict): Context dictionary containing data to be rendered in the template.
     """
 
     def get(self, request):
         """
-        Handles GET requests to display messages.
+        Handles GET requests to display the conversations.
 
         Args:
             request (HttpRequest): The HTTP request object.
@@ -893,40 +1074,247 @@ class MessagesView(LoginRequiredMixin, View):
         """
         user = request.user
         if user.is_authenticated:
-            id = user.id
-            messages = Messages.objects.filter(to_user=id).order_by('-id')
-            user_messages = Messages.objects.filter(to_user_id=id).count()
-            user_unread_messages = Messages.objects.filter(to_user_id=id).filter(status='Unread').count()
-            user_read_messages = Messages.objects.filter(to_user_id=id).filter(status='Read').count()
-            user_sent_messages = Messages.objects.filter(from_user_id=id).count()
+            threads = ThreadParticipant.objects.filter(user=user)
+            sent_threads = Q(thread__in=Messages.objects.filter(from_user=user).values('thread_id'))
+            counts = threads.aggregate(
+                all=Count('id'),
+                unread=Count('id', filter=Q(unread_count__gt=0)),
+                read=Count('id', filter=Q(unread_count=0)),
+                sent=Count('id', filter=sent_threads),
+            )
 
             message_type = request.GET.get('message_type', 'All')
-            if message_type == 'All':
-                messages = Messages.objects.filter(to_user=id).order_by('-id')
-            elif message_type == 'Unread':
-                messages = Messages.objects.filter(to_user_id=id).filter(status='Unread').order_by('-date_sent')
+            if message_type == 'Unread':
+                threads = threads.filter(unread_count__gt=0)
             elif message_type == 'Read':
-                messages = Messages.objects.filter(to_user_id=id).filter(status='Read').order_by('-date_sent')
+                threads = threads.filter(unread_count=0)
             elif message_type == 'Sent':
-                messages = Messages.objects.filter(from_user_id=id).order_by('-date_sent')
-
-            paginator = Paginator(messages, 5)
+                threads = threads.filter(sent_threads)
+
+            query = request.GET.get('q', '').strip()
+            if query:
+                message_type = 'Search'
+                threads = search_messages(user, query)
+            elif message_type == 'Archived':
+                threads = ArchivedMessage.objects.filter(Q(to_user=user) | Q(from_user=user)) \
+                    .select_related('from_user').order_by('-date_sent')
+            else:
+                threads = threads.select_related('thread__last_message__from_user').order_by('-last_message_date')
+            paginator = Paginator(threads, 5)
             page_number = request.GET.get('page')
             page_obj = paginator.get_page(page_number)
 
             ctx = {
-                'user_messages': user_messages,
-                'user_unread_messages': user_unread_messages,
-                'user_read_messages': user_read_messages,
-                'user_sent_messages': user_sent_messages,
-                'messages': page_obj,
+                'user_messages': counts['all'],
+                'user_unread_messages': counts['unread'],
+                'user_read_messages': counts['read'],
+                'user_sent_messages': counts['sent'],
+                'threads': page_obj,
                 # 'page_obj': page_obj,
                 'message_type': message_type,
+                'query': query,
             }
 
             return render(request, 'sell_it_app/messages.html', ctx)
 
 
+class ConversationView(LoginRequiredMixin, View):
+    """
+    View for displaying a conversation.
+
+    GET request renders the 'conversation.html' template with all messages of the conversation
+    and marks the messages sent to the user as read.
+
+    Attributes:
+        thread (Thread): The conversation to display.
+        thread_messages (QuerySet): The messages of the conversation, oldest first.
+    """
+
+    def get(self, request, thread_id):
+        """
+        Renders the 'conversation.html' template with the messages of the conversation.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+            thread_id (int): ID of the conversation to display.
+
+        Returns:
+            HttpResponse: Renders the 'conversation.html' template.
+        """
+
+        thread = get_object_or_404(Thread, pk=thread_id)
+        if not thread.participants.filter(user=request.user).exists():
+            return HttpResponseForbidden("You do not have permission to view this conversation.")
+
+        set_messages_status(thread.messages.filter(to_user=request.user), 'Read')
+
+        thread_messages = thread.messages.select_related('from_user').order_by('date_sent', 'id')
+        ctx = {
+            'thread': thread,
+            'thread_messages': thread_messages,
+            'last_message': thread.last_message,
+        }
+
+        return render(request, 'sell_it_app/conversation.html', ctx)
+
+
+class MessagesBulkActionView(LoginRequiredMixin, View):
+    """
+    View for changing many messages at once.
+
+    POST request runs the selected action as a single UPDATE or DELETE limited to the messages
+    received by the user, keeping the unread counts of the conversations in sync. Messages the
+    user sent are in the mailbox of their recipient, so they are never deleted.
+
+    Attributes:
+        ACTIONS (tuple): Available actions.
+        action (str): The selected action.
+        received_messages (QuerySet): The messages the user may change or delete.
+        selected (QuerySet): The messages selected by thread or message IDs.
+    """
+
+    ACTIONS = ('mark-all-read', 'mark-read', 'mark-unread', 'delete', 'delete-older-than')
+
+    def post(self, request):
+        """
+        Runs the selected action on the selected messages.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the 'messages' page.
+        """
+
+        action = request.POST.get('action')
+        if action not in self.ACTIONS:
+            messages.error(request, 'Unknown action!')
+            return redirect('messages')
+
+        user = request.user
+        received_messages = Messages.objects.filter(to_user=user)
+        selection = Q(thread_id__in=request.POST.getlist('thread_id')) | Q(id__in=request.POST.getlist('message_id'))
+
+        try:
+            if action == 'mark-all-read':
+                count = set_messages_status(received_messages, 'Read')
+            elif action == 'mark-read':
+                count = set_messages_status(received_messages.filter(selection), 'Read')
+            elif action == 'mark-unread':
+                count = set_messages_status(received_messages.filter(selection), 'Unread')
+            elif action == 'delete':
+                count = delete_messages(received_messages.filter(selection))
+            else:
+                form = DeleteOlderMessagesForm({'days': request.POST.get('days', 30)})
+                if not form.is_valid():
+                    messages.error(request, 'Invalid number of days! ' + ' '.join(form.errors['days']))
+                    return redirect('messages')
+                date_sent = timezone.now() - datetime.timedelta(days=form.cleaned_data['days'])
+                count = delete_messages(received_messages.filter(date_sent__lt=date_sent))
+        except ValueError:
+            messages.error(request, 'Invalid selection!')
+            return redirect('messages')
+
+        messages.success(request, f'{count} message(s) updated.')
+        return redirect('messages')
+
+
+def get_authenticated_user_id(request):
+    """
+    Returns the ID of the user of the request, or None for anonymous users.
+
+    Args:
+        request (HttpRequest): HTTP request object.
+
+    Returns:
+        int: The ID of the user, or None.
+    """
+
+    return request.user.id if request.user.is_authenticated else None
+
+
+class MessageEventsView(View):
+    """
+    View streaming unread message counts and new message notifications as Server-Sent Events.
+
+    The view is asynchronous, so under ASGI an open stream does not hold a worker thread. Under
+    WSGI it would hold one forever, so streams are only opened with NOTIFICATIONS_STREAMING, pages
+    poll MessageUnreadCountView otherwise. The current unread count is sent first, then every event published for the user,
+    with a keepalive comment when nothing happens for KEEPALIVE_INTERVAL seconds.
+
+    Attributes:
+        KEEPALIVE_INTERVAL (int): Seconds without events before a keepalive comment is sent.
+    """
+
+    KEEPALIVE_INTERVAL = 15
+
+    async def get(self, request):
+        """
+        Opens the event stream of the current user.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: The text/event-stream response, or an empty response with status
+                204, telling the browser not to reconnect, without NOTIFICATIONS_STREAMING.
+        """
+
+        user_id = await sync_to_async(get_authenticated_user_id)(request)
+        if user_id is None:
+            return HttpResponseForbidden("You must be logged in to receive notifications.")
+        if not settings.NOTIFICATIONS_STREAMING:
+            return HttpResponse(status=204)
+
+        broker = get_broker()
+        channel = user_channel(user_id)
+        queue = broker.subscribe(channel)
+        unread_count = await sync_to_async(unread_message_count)(user_id)
+
+        async def events():
+            try:
+                yield format_event({'type': 'unread', 'count': unread_count})
+                while True:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), self.KEEPALIVE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+                    else:
+                        yield format_event(event)
+            finally:
+                broker.unsubscribe(channel, queue)
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class MessageUnreadCountView(View):
+    """
+    View returning the unread message count of the current user as JSON, polled by the pages
+    when notifications aren't streamed, see MessageEventsView.
+
+    GET request answers at once with the current count: under WSGI, a request waiting for the
+    count to change would hold a worker for every open page.
+    """
+
+    def get(self, request):
+        """
+        Returns the unread message count of the current user.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            JsonResponse: The 'count' of unread messages.
+        """
+
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden("You must be logged in to receive notifications.")
+        return JsonResponse({'count': unread_message_count(request.user.id)})
+
+
 class MessageStatusUpdateView(LoginRequiredMixin, View):
     """
     View for updating the status of a message.
@@ -1088,11 +1476,17 @@ class SendMessageView(LoginRequiredMixin, View):
         message_title = current_message.title
 
         if current_message.from_user:
+            # Replying to the latest message of a conversation started by the user goes to the other side.
+            if current_message.from_user_id == user.id:
+                recipient = current_message.to_user
+            else:
+                recipient = current_message.from_user
             send_message = Messages.objects.create(
                 title=title,
                 message=message_text,
-                to_user=current_message.from_user,
+                to_user=recipient,
                 from_user=user,
+                thread_id=current_message.thread_id,
             )
             send_message.save()
             success_message = 'Message sent successfully'
@@ -1144,7 +1538,7 @@ class SendNewMessage(LoginRequiredMixin, View):
             HttpResponse: Renders the 'send_new_message.html' template.
         """
 
-        listing = get_object_or_404(Listings, id=listing_id)
+        listing = get_cached_object_or_404(Listings, listing_id)
         return render(request, 'sell_it_app/send_new_message.html', {'listing': listing})
 
     def post(self, request, listing_id):
@@ -1160,18 +1554,22 @@ class SendNewMessage(LoginRequiredMixin, View):
             HttpResponseRedirect: Redirects to the listing details page.
         """
 
-        listing = get_object_or_404(Listings, id=listing_id)
+        listing = get_cached_object_or_404(Listings, listing_id)
         sender = request.user.id
         recipient = listing.user_id.id
         message = request.POST.get('message')
 
         if sender != recipient:
+            thread = find_listing_thread(listing, sender, recipient)
+            if thread is None:
+                thread = Thread.objects.create(title=listing.title[:60], listing=listing)
             send_message = Messages.objects.create(
                 title=listing.title,
                 message=message,
                 from_user_id=sender,
                 to_user_id=recipient,
                 status='Unread',
+                thread=thread,
             )
             messages.success(request, 'Your message has been sent successfully!')
             return redirect('listing-details', listing_id=listing_id)
@@ -1232,7 +1630,7 @@ class FavouritesView(LoginRequiredMixin, View):
 
     Only accessible for authenticated users.
 
-    GET request renders the 'favourites.html' template.
+    GET request renders the 'favourites.html' template with the favourited listings, most recently favourited first.
     """
 
     def get(self, request):
@@ -1246,7 +1644,48 @@ class FavouritesView(LoginRequiredMixin, View):
             HttpResponse: Renders the 'favourites.html' template.
         """
 
-        return render(request, 'sell_it_app/favourites.html')
+        listings = (
+            Listings.objects.filter(favourites__user=request.user)
+            .select_related('category_id')
+            .order_by('-favourites__created_at')
+        )
+        paginator = Paginator(listings, 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        return render(request, 'sell_it_app/favourites.html', {'listings': page_obj})
+
+
+class FavouriteToggleView(LoginRequiredMixin, View):
+    """
+    View for adding a listing to the user's favourites, or removing it from them.
+
+    POST request toggles the favourite and redirects back to the page of the button, or returns
+    the new state as JSON for AJAX requests.
+    """
+
+    def post(self, request, listing_id):
+        """
+        Toggles the favourite of a listing.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+            listing_id (int): ID of the listing.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the 'next' URL, or to the listing page.
+            JsonResponse: The favourite state and the favourite count of the listing, for AJAX requests.
+        """
+
+        listing = get_cached_object_or_404(Listings, listing_id)
+        favourited = toggle_favourite(request.user, listing)
+
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            favourite_count = Listings.objects.filter(id=listing_id).values_list('favourite_count', flat=True).first()
+            return JsonResponse({'favourited': favourited, 'favourite_count': favourite_count or 0})
+
+        next_url = request.POST.get('next')
+        if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+            return redirect(next_url)
+        return redirect('listing-details', listing_id=listing_id)
 
 
 class SavedSearchesView(LoginRequiredMixin, View):
@@ -1256,6 +1695,7 @@ class SavedSearchesView(LoginRequiredMixin, View):
     Only accessible for authenticated users.
 
     GET request renders the 'saved_searches.html' template.
+    POST request saves a search, the user is notified of the new listings matching it.
     """
 
     def get(self, request):
@@ -1269,10 +1709,63 @@ class SavedSearchesView(LoginRequiredMixin, View):
             HttpResponse: Renders the 'saved_searches.html' template.
         """
 
-        return render(request, 'sell_it_app/saved_searches.html')
+        saved_searches = (
+            SavedSearch.objects.filter(user=request.user).select_related('category').order_by('-created_at')
+        )
+        return render(request, 'sell_it_app/saved_searches.html', {
+            'saved_searches': [(saved_search, saved_search_url(saved_search)) for saved_search in saved_searches],
+        })
 
+    def post(self, request):
+        """
+        Saves a search with the criteria of the form, at most SAVED_SEARCHES_PER_USER searches per user.
 
-class AboutUsView(View):
+        Args:
+            request (HttpRequest): HTTP request object.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the saved searches page.
+        """
+
+        form = SavedSearchForm(request.POST)
+        if SavedSearch.objects.filter(user=request.user).count() >= settings.SAVED_SEARCHES_PER_USER:
+            messages.error(request, f'You can save at most {settings.SAVED_SEARCHES_PER_USER} searches!')
+        elif form.is_valid():
+            saved_search = form.save(commit=False)
+            saved_search.user = request.user
+            saved_search.name = describe_search(saved_search)
+            saved_search.save()
+            messages.success(request, 'Search saved! You will be notified of new listings.')
+        else:
+            messages.error(request, 'Error! Please check and try again!')
+        return redirect('saved-searches')
+
+
+class DeleteSavedSearchView(LoginRequiredMixin, View):
+    """
+    View for deleting a saved search.
+
+    POST request deletes the saved search of the user.
+    """
+
+    def post(self, request, saved_search_id):
+        """
+        Deletes a saved search.
+
+        Args:
+            request (HttpRequest): HTTP request object.
+            saved_search_id (int): ID of the saved search.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the saved searches page.
+        """
+
+        saved_search = get_object_or_404(SavedSearch, id=saved_search_id, user=request.user)
+        saved_search.delete()
+        return redirect('saved-searches')
+
+
+class AboutUsView(PageCacheMixin, View):
     """
     View for displaying information about the website.
 
@@ -1293,7 +1786,7 @@ class AboutUsView(View):
         return render(request, 'sell_it_app/about_us.html')
 
 
-class FaqView(View):
+class FaqView(PageCacheMixin, View):
     """
     View for displaying Frequently Asked Questions (FAQ).
 
@@ -1323,6 +1816,7 @@ class ContactUsView(View):
 
     If the user is authenticated, the message is sent from the user to the admin.
     If the user is not authenticated, the message is sent from an unregistered email address to the admin.
+    The message is delivered by a background job.
     """
 
     def get(self, request):
@@ -1355,7 +1849,7 @@ class ContactUsView(View):
         unregistered_email = request.POST.get('email')
 
         user = request.user
-        admin = User.objects.get(username='Admin')
+        admin = User.objects.cached().get(username='Admin')
 
         if user.is_authenticated:
             sender = user.id
@@ -1365,13 +1859,12 @@ class ContactUsView(View):
                 return render(request, 'sell_it_app/contact_us.html', {'error_message': error_message})
 
             else:
-                email_to_send = Messages.objects.create(
+                deliver_contact_message.enqueue(
                     title=title,
                     message=message,
                     from_user_id=sender,
                     to_user_id=admin.id,
                 )
-                email_to_send.save()
 
                 success_message = "Message is successfully sent!"
                 return render(request, 'sell_it_app/contact_us.html', {'success_message': success_message})
@@ -1382,13 +1875,12 @@ class ContactUsView(View):
                 return render(request, 'sell_it_app/contact_us.html', {'error_message': error_message})
 
             else:
-                email_to_send = Messages.objects.create(
+                deliver_contact_message.enqueue(
                     title=title,
                     message=message,
                     to_user_id=admin.id,
                     from_unregistered_user=unregistered_email,
                 )
-                email_to_send.save()
 
                 success_message = "Message is successfully sent!"
                 return render(request, 'sell_it_app/contact_us.html', {'success_message': success_message})
@@ -1426,13 +1918,10 @@ class NewsletterView(View):
             HttpResponseRedirect: Redirects to the newsletter page after subscription.
         """
 
-        email = request.POST.get('email')
-        registered_email = Newsletter.objects.filter(email=email).last()
+        email = request.POST.get('email', '')
 
-        if registered_email:
+        if not subscribe(email):
             messages.error(request, 'Email already registered!')
             return redirect('newsletter')
-        else:
-            subscribe = Newsletter.objects.create(email=email)
 
         return redirect('newsletter')